@@ -0,0 +1,141 @@
+"""Check: shared conversation stores under concurrent writers from several processes.
+
+Runs ``--processes`` processes with ``--threads`` threads each against one
+store (the Redis stand-in, or a SQLite file in a temporary directory). Every
+thread repeatedly pins the same conversations, increments a counter in their
+state and saves it twice inside a nested ``with`` block, like the bot does
+around a draft. Lost updates show up as a short count, unbuffered writes as
+more writes than increments. A last step lets a lock lease expire, takes the
+lock over from a second store and checks that the previous owner's release
+leaves the new owner's lock alone.
+
+    PYTHONPATH=src python benchmarks/bench_conversation_store.py [--store redis|sqlite]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from threading import Thread
+from typing import Any, Dict, List
+
+import stand_ins
+
+from conduction_content_bot.conversation_backends import create_conversation_store
+
+
+def _new_state() -> Dict[str, Any]:
+    return {"count": 0, "writers": []}
+
+
+def _increment(url: str, conversations: int, threads: int, increments: int, results) -> None:
+    """Process body: ``threads`` threads incrementing every conversation."""
+    store = create_conversation_store(url)
+
+    def run(writer: str) -> None:
+        for i in range(increments):
+            conversation_id = f"bench-{i % conversations}"
+            lock = store.pin(conversation_id, _new_state)
+            try:
+                with lock:
+                    state = store.get(conversation_id, _new_state)
+                    state["count"] += 1
+                    store.put(conversation_id, state)
+                    with lock:
+                        state["writers"] = (state["writers"] + [writer])[-5:]
+                        store.put(conversation_id, state)
+            finally:
+                store.unpin(conversation_id)
+
+    workers = [Thread(target=run, args=(f"{os.getpid()}-{n}",)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put(store.metrics())
+
+
+def _check_takeover(url: str) -> List[str]:
+    """Let a lease expire, take the lock over and release it as the stale owner."""
+    stale = create_conversation_store(url)
+    current = create_conversation_store(url)
+    stale.lock_lease_seconds = current.lock_lease_seconds = 0.2
+    current.lock_timeout_seconds = 2
+    problems = []
+    stale_token = stale._acquire_remote("bench-takeover")
+    started = time.monotonic()
+    current_token = current._acquire_remote("bench-takeover")
+    if time.monotonic() - started < 0.15:
+        problems.append("lock taken over before its lease expired")
+    stale._release_remote("bench-takeover", stale_token)
+    if stale._try_acquire("bench-takeover", "intruder"):
+        problems.append("stale owner released the lock of its successor")
+    current._release_remote("bench-takeover", current_token)
+    if not stale._try_acquire("bench-takeover", "next"):
+        problems.append("lock not released by its owner")
+    stale._release_remote("bench-takeover", "next")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", choices=("redis", "sqlite"), default="redis")
+    parser.add_argument("--processes", type=int, default=2, help="processes sharing the store")
+    parser.add_argument("--threads", type=int, default=4, help="threads per process")
+    parser.add_argument("--increments", type=int, default=25, help="increments per thread")
+    parser.add_argument("--conversations", type=int, default=1, help="conversations written")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.store == "redis":
+            url = f"redis://127.0.0.1:{stand_ins.start()['redis']}/0"
+        else:
+            url = "sqlite:///" + os.path.join(tmp, "conversations.db")
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=_increment,
+                args=(url, args.conversations, args.threads, args.increments, results),
+            )
+            for _ in range(args.processes)
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        metrics = [results.get(timeout=300) for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        store = create_conversation_store(url)
+        counted = sum(
+            store.get(f"bench-{c}", _new_state)["count"]
+            for c in range(min(args.conversations, args.increments))
+        )
+        expected = args.processes * args.threads * args.increments
+        writes = sum(m["writes"] for m in metrics)
+        problems = _check_takeover(url)
+
+    print(f"store: {args.store}, {args.processes} processes x {args.threads} threads")
+    print(f"count: {counted} (expected {expected}), writes: {writes}")
+    print(
+        f"lock waits: {sum(m['lock_waits'] for m in metrics)},"
+        f" timeouts: {sum(m['lock_timeouts'] for m in metrics)}"
+    )
+    print(f"elapsed: {elapsed:.2f} s ({expected / elapsed:.0f} increments/s)")
+    if counted != expected:
+        problems.append(f"lost {expected - counted} update(s)")
+    if writes != expected:
+        problems.append(f"{writes} writes for {expected} locked blocks; puts were not buffered")
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("OK")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
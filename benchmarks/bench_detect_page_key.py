@@ -0,0 +1,97 @@
+"""Benchmark: precompiled keyword matcher vs. the previous sort-and-scan one.
+
+Runs ``detect_page_key`` over a corpus of realistic Dutch DM messages, reports
+the time per message for both implementations and lists every message on
+which they disagree (the old matcher also matched inside words, e.g. 'post'
+in 'postcode').
+
+    PYTHONPATH=src python benchmarks/bench_detect_page_key.py [--repeat N]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from typing import Callable, List, Optional
+
+from conduction_content_bot.prompts import KEYWORD_TO_PAGE, detect_page_key
+
+CORPUS: List[str] = [
+    "projecten",
+    "Hoi! Kun je iets schrijven voor de projecten pagina over OpenWoo.app?",
+    "linkedin post over ons nieuwe project met de gemeente Utrecht",
+    "Ik wil een LinkedIn-bericht over de Common Ground fieldlab van volgende week",
+    "over ons",
+    "Kun je de tekst op de over ons pagina wat menselijker maken?",
+    "beheer",
+    "We bieden nu ook managed hosting aan, kan dat op de beheer pagina?",
+    "trainingen: nieuwe training Nextcloud voor functioneel beheerders",
+    "common ground",
+    "commonground componenten uitleg voor de homepage",
+    "home",
+    "Schrijf een intro voor de home pagina, nuchter en kort",
+    "Wat is de postcode van het kantoor in Amsterdam?",
+    "We zoeken een projectmanager, kun je een vacaturetekst maken?",
+    "Kun je een posting maken voor onze nieuwe collega?",
+    "Graag een stukje over de homepagina-redesign",
+    "Ik heb een trainingsvoorstel nodig voor de gemeente Den Haag",
+    "Kun je helpen met een persbericht?",
+    "Help me met een nieuwsbrief over OpenCatalogi",
+    "Doelgroep: gemeenten. Doel: aankondigen. Toon: vriendelijk. Lengte: 5 zinnen.",
+    "Schrijf 3 varianten van een LinkedIn post over OpenRegisters en Nextcloud",
+    "Wat vind je van deze tekst? Conduction is een idealistisch IT-bedrijf dat helpt "
+    "bij het tot stand brengen van goede ideeën en mooie initiatieven.",
+    "korter",
+    "formeler graag, en voeg een CTA toe naar de contactpagina",
+    "Project update: de VNG Softwarecatalogus is live!",
+    "Over ons team: Ruben en Marleen geven een training op 12 maart",
+    "Managed services en beheer van Common Ground componenten in de cloud",
+    "reset",
+    "Kan je een blogpost schrijven over open source bij de overheid?",
+]
+
+
+def legacy_detect_page_key(user_text: str) -> Optional[str]:
+    """Previous matcher: sort keywords by length on every call, substring scan."""
+    text = (user_text or "").strip().lower()
+    if not text:
+        return None
+    candidates: List[str] = sorted(KEYWORD_TO_PAGE.keys(), key=lambda k: -len(k))
+    for keyword in candidates:
+        if keyword in text:
+            return KEYWORD_TO_PAGE[keyword]
+    return None
+
+
+def _time_corpus(func: Callable[[str], Optional[str]], repeat: int) -> float:
+    """Median seconds per message over ``repeat`` passes of the corpus."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in CORPUS:
+            func(message)
+        timings.append((time.perf_counter() - started) / len(CORPUS))
+    return statistics.median(timings)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000, help="passes over the corpus")
+    args = parser.parse_args()
+
+    legacy_us = _time_corpus(legacy_detect_page_key, args.repeat) * 1e6
+    new_us = _time_corpus(detect_page_key, args.repeat) * 1e6
+    print(f"messages: {len(CORPUS)}, keywords: {len(KEYWORD_TO_PAGE)}")
+    print(f"legacy: {legacy_us:.2f} us/message")
+    print(f"new:    {new_us:.2f} us/message ({legacy_us / new_us:.2f}x)")
+
+    print("\nDifferences (legacy -> new):")
+    for message in CORPUS:
+        old, new = legacy_detect_page_key(message), detect_page_key(message)
+        if old != new:
+            print(f"  {old!s:>13} -> {new!s:<13} {message[:70]!r}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
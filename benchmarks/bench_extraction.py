@@ -0,0 +1,187 @@
+"""Micro-benchmark: single-parse extraction vs. the previous triple-parse one.
+
+Runs both implementations over the saved pages in ``benchmarks/fixtures``,
+checks that they produce identical output and reports the time per page.
+
+    PYTHONPATH=src python benchmarks/bench_extraction.py [--repeat N]
+
+``legacy_extract`` is a verbatim copy of ``_extract_text_from_html`` before it
+moved to lxml; it needs ``beautifulsoup4`` (installed with the ``dev`` extra).
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+import trafilatura
+from bs4 import BeautifulSoup
+
+from conduction_content_bot.content_fetcher import _extract_text_from_html
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def legacy_extract(html_str: str) -> str:
+    """Previous extraction: trafilatura plus two BeautifulSoup parses.
+
+    Enriches the extracted HTML with header text (title, paragraphs, primary
+    links) from the original page when available, then keeps only basic
+    content tags and minimal attributes.
+
+    @param html_str: Raw HTML document string.
+    @return: Sanitized, minimal HTML string.
+    @rtype: str
+    """
+    # extract main article HTML
+    extracted = trafilatura.extract(
+        html_str,
+        output_format="html",
+        favor_precision=True,
+        include_tables=False,
+        include_comments=False,
+    )
+    # If nothing was extracted, continue so we can append the header text from the original HTML.
+    if not extracted:
+        extracted = ""
+
+    # Build a soup from the extracted content
+    soup = BeautifulSoup(extracted, "html.parser")
+
+    # add the header text to the content
+    try:
+        original = BeautifulSoup(html_str, "html.parser")
+        hero = original.select_one(
+            "header.hero, .heroBanner_qdFl, .hero, .heroContainer_i2aB, [class*='hero'], header"
+        )
+        if hero:
+            header_tag = soup.new_tag("header")
+
+            title_node = hero.find(["h1", "h2", "h3"])
+            if title_node and title_node.get_text(strip=True):
+                title_tag = soup.new_tag("h1")
+                title_tag.string = title_node.get_text(strip=True)
+                header_tag.append(title_tag)
+            for p_node in hero.find_all("p"):
+                text = p_node.get_text(strip=True)
+                if text:
+                    p_tag = soup.new_tag("p")
+                    p_tag.string = text
+                    header_tag.append(p_tag)
+            for a_node in hero.select(".buttons_AeoN a, a.primaryHeroLink_NsbJ"):
+                link_text = a_node.get_text(strip=True)
+                if link_text:
+                    a_tag = soup.new_tag("a")
+                    href_val = a_node.get("href")
+                    if href_val:
+                        a_tag["href"] = href_val
+                    a_tag.string = link_text
+                    header_tag.append(a_tag)
+            if header_tag.contents:
+                # Insert header children directly at the top without the <header> wrapper
+                children = list(header_tag.contents)
+                for child in children:
+                    child.extract()
+                for child in reversed(children):
+                    soup.insert(0, child)
+        else:
+            # Fallback: if no hero found, include the first heading on the page
+            fallback_heading = original.find(["h1", "h2", "h3"])
+            if fallback_heading and fallback_heading.get_text(strip=True):
+                title_tag = soup.new_tag("h1")
+                title_tag.string = fallback_heading.get_text(strip=True)
+                soup.insert(0, title_tag)
+
+    except Exception:
+        # Best-effort enrichment; ignore failures and fall back to extracted content only
+        pass
+
+    # keep just basic content tags
+    allowed = {
+        "header",
+        "p",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "ul",
+        "ol",
+        "li",
+        "strong",
+        "em",
+        "a",
+        "blockquote",
+        "pre",
+        "code",
+        "br",
+    }
+    for tag in list(soup.find_all(True)):
+        if tag.name not in allowed:
+            tag.unwrap()
+        else:
+            tag.attrs = (
+                {"href": tag.get("href")} if tag.name == "a" and tag.has_attr("href") else {}
+            )
+
+    # Remove everything from the Contact section onward (this is our footer)
+    try:
+        contact_header = soup.find(
+            lambda t: t.name == "h2" and t.get_text(strip=True).lower() == "contact"
+        )
+        if contact_header:
+            # remove all siblings after the Contact header at the same level
+            for sibling in list(contact_header.next_siblings):
+                sibling.extract()
+            # remove the Contact header itself
+            contact_header.extract()
+    except Exception:
+        # Be permissive on failures; better to return content than crash
+        pass
+
+    return str(soup)
+
+
+def _time_per_call(func: Callable[[str], str], html_str: str, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(html_str)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="runs per page and implementation")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html")))
+    if not paths:
+        print(f"No fixtures found in {FIXTURES_DIR}", file=sys.stderr)
+        return 1
+
+    mismatches = 0
+    print(f"{'page':<16}{'bytes':>8}{'legacy ms':>12}{'new ms':>10}{'speedup':>10}  output")
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            html_str = f.read()
+        same = legacy_extract(html_str) == _extract_text_from_html(html_str)
+        mismatches += not same
+        legacy_ms = statistics.median(_time_per_call(legacy_extract, html_str, args.repeat)) * 1000
+        new_ms = statistics.median(_time_per_call(_extract_text_from_html, html_str, args.repeat))
+        new_ms *= 1000
+        name = os.path.splitext(os.path.basename(path))[0]
+        print(
+            f"{name:<16}{len(html_str):>8}{legacy_ms:>12.2f}{new_ms:>10.2f}"
+            f"{legacy_ms / new_ms:>9.2f}x  {'identical' if same else 'DIFFERENT'}"
+        )
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
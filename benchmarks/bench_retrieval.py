@@ -0,0 +1,95 @@
+"""Benchmark: shared system prompt vs. the per-thread section message.
+
+Extracts every page in ``fixtures/``, splits and indexes it like the bot does,
+and for a few realistic descriptions reports which sections are selected, the
+tokens of the page's system prompt (the same for every thread, so cacheable
+once it passes the provider's 1024-token minimum) and of the message naming
+the selected sections, plus the time to index a page and to rank its sections.
+
+    PYTHONPATH=src python benchmarks/bench_retrieval.py [--top-k K] [--repeat N]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+from conduction_content_bot.content_fetcher import _extract_text_from_html
+from conduction_content_bot.prompt_registry import PromptRegistry
+from conduction_content_bot.prompts import render_focus_prompt, render_system_prompt
+from conduction_content_bot.token_budget import count_tokens
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+FIXTURE_TO_PAGE = {
+    "beheer.html": "BEHEER",
+    "common-ground.html": "COMMON_GROUND",
+    "home.html": "HOME",
+    "over-ons.html": "OVER_ONS",
+    "projecten.html": "PROJECTEN",
+    "trainingen.html": "TRAININGEN",
+}
+DESCRIPTIONS: List[str] = [
+    "Een stukje over OpenCatalogi en federatief delen van applicatie-informatie",
+    "Nieuwe training voor functioneel beheerders van Nextcloud",
+    "Aankondiging: we bieden nu managed hosting en 24/7 monitoring",
+    "Doelgroep gemeenten, toon nuchter, over open source en Common Ground",
+]
+# Smallest prompt prefix OpenAI caches
+CACHE_MIN_TOKENS = 1024
+
+
+def _median_us(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top-k", type=int, default=3, help="sections besides the hero")
+    parser.add_argument("--repeat", type=int, default=200, help="timing repetitions")
+    args = parser.parse_args()
+
+    pages: Dict[str, str] = {}
+    for name, page_key in FIXTURE_TO_PAGE.items():
+        with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+            pages[page_key] = _extract_text_from_html(f.read())
+    registry = PromptRegistry(pages.get, render_system_prompt)
+
+    model = "gpt-5-mini"
+    for page_key in pages:
+        version = registry.resolve(page_key)
+        entry = registry.get(page_key, version)
+        shared_tokens = count_tokens(registry.render(page_key, version), model)
+        index_us = _median_us(
+            lambda: PromptRegistry(pages.get, render_system_prompt).resolve(page_key),
+            args.repeat,
+        )
+        cacheable = "cacheable" if shared_tokens >= CACHE_MIN_TOKENS else "below cache minimum"
+        print(f"\n{page_key}: {len(entry.sections)} sections")
+        print(f"  system prompt: {shared_tokens} tokens ({cacheable})")
+        print(f"  index: {index_us:.0f} us/version")
+        for description in DESCRIPTIONS:
+            sections = registry.select_sections(page_key, version, description, args.top_k)
+            headings = registry.section_headings(page_key, version, sections)
+            focus_tokens = count_tokens(render_focus_prompt(headings), model) if headings else 0
+            rank_us = _median_us(
+                lambda: registry.select_sections(page_key, version, description, args.top_k),
+                args.repeat,
+            )
+            chosen = "all" if sections is None else sections
+            shared = shared_tokens / (shared_tokens + focus_tokens)
+            print(
+                f"  +{focus_tokens:3d} tokens ({shared:4.0%} shared) sections={chosen}"
+                f" rank={rank_us:.0f}us  {description[:45]!r}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""Startup time: importing the bot, and starting it until connected and ready.
+
+Runs ``--runs`` fresh interpreters of each:
+
+- ``import conduction_content_bot.bot`` (nothing else), and
+- the bot itself (``python -m conduction_content_bot``, threaded or
+  ``--mode async``) against the local stand-ins from ``stand_ins.py``: Slack
+  Web API and Socket Mode, OpenAI and the website serving ``fixtures/``.
+
+For the bot, the phases it reports itself (``content_bot_startup_seconds``:
+app, connect, warm_up or, with ``--worker-processes``, workers, and ready) are
+read from its INFO log, and the time from
+starting the process until its readiness file appears is measured from outside
+(this includes interpreter start-up). ``--extraction-cache`` keeps a shared
+``EXTRACTION_CACHE_DIR`` across runs, like a restart with a persistent volume.
+
+    PYTHONPATH=src python benchmarks/bench_startup.py [--runs 5] [--mode async]
+        [--worker-processes 2] [--json]
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import stand_ins
+
+_IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import conduction_content_bot.bot;"
+    " print(time.perf_counter() - started)"
+)
+_STARTUP_LOG_RE = re.compile(r"Startup: (.*)")
+_PHASE_RE = re.compile(r"(\w+) ([\d.]+)s")
+
+
+def _time_import(env: Dict[str, str]) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", _IMPORT_SNIPPET], env=env, capture_output=True, check=True
+    )
+    return float(out.stdout.decode().strip())
+
+
+def _time_start(env: Dict[str, str], readiness_file: str, timeout: float) -> Dict[str, float]:
+    """Start the bot, wait for its readiness file and return the phase durations."""
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "conduction_content_bot"],
+        env={**env, "READINESS_FILE": readiness_file},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        while not os.path.exists(readiness_file):
+            if proc.poll() is not None or time.perf_counter() - started > timeout:
+                raise RuntimeError("bot exited or did not become ready")
+            time.sleep(0.005)
+        process_to_ready = time.perf_counter() - started
+        # The startup log line follows the readiness file closely
+        time.sleep(0.2)
+    finally:
+        proc.terminate()
+        _, stderr = proc.communicate(timeout=10)
+    os.remove(readiness_file)
+    match = _STARTUP_LOG_RE.search(stderr.decode(errors="replace"))
+    if match is None:
+        raise RuntimeError(f"no startup log line in:\n{stderr.decode(errors='replace')}")
+    phases = {phase: float(seconds) for phase, seconds in _PHASE_RE.findall(match.group(1))}
+    phases["process_to_ready"] = process_to_ready
+    return phases
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "median": round(statistics.median(values), 3),
+        "min": round(min(values), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--mode", choices=["threaded", "async"], default="threaded")
+    parser.add_argument(
+        "--worker-processes", type=int, default=0, help="WORKER_PROCESSES (sharded mode)"
+    )
+    parser.add_argument(
+        "--extraction-cache", action="store_true", help="share EXTRACTION_CACHE_DIR across runs"
+    )
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for ready")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    ports = stand_ins.start({"slack_latency_ms": 30})
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    env = {
+        **os.environ,
+        **stand_ins.environment(ports),
+        "BOT_MODE": args.mode,
+        "WORKER_PROCESSES": str(args.worker_processes),
+        "LOG_LEVEL": "INFO",
+        "METRICS_PORT": "0",
+        "EXTRACTION_CACHE_DIR": (
+            os.path.join(workdir, "extraction") if args.extraction_cache else ""
+        ),
+    }
+
+    imports = [_time_import(env) for _ in range(args.runs)]
+    starts = [
+        _time_start(env, os.path.join(workdir, "ready"), args.timeout) for _ in range(args.runs)
+    ]
+    phases = list(starts[0])
+    results = {
+        "runs": args.runs,
+        "mode": args.mode,
+        "worker_processes": args.worker_processes,
+        "extraction_cache": args.extraction_cache,
+        "import_seconds": _summary(imports),
+        "startup_seconds": {phase: _summary([run[phase] for run in starts]) for phase in phases},
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    cache = ", shared extraction cache" if args.extraction_cache else ""
+    workers = f", WORKER_PROCESSES={args.worker_processes}" if args.worker_processes else ""
+    print(f"{args.runs} runs, BOT_MODE={args.mode}{workers}{cache} (seconds: median [min-max])")
+    rows = [("import bot", results["import_seconds"])]
+    rows += [(f"start: {phase}", summary) for phase, summary in results["startup_seconds"].items()]
+    for label, summary in rows:
+        print(f"{label:<26} {summary['median']:>6.3f}  [{summary['min']:.3f}-{summary['max']:.3f}]")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
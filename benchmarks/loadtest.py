@@ -0,0 +1,394 @@
+"""Load test: drive the DM handler with synthetic traffic against local stand-ins.
+
+Starts the stand-ins from ``stand_ins.py`` in a separate process (so they do
+not compete with the bot for the GIL): an OpenAI-compatible stub with
+lognormal latency and configurable 500 / 429 rates, the Slack Web API with a
+fixed latency, and the website serving the pages in ``fixtures/``.
+
+The bot's app is created against them and the pages are warmed up like
+``main()`` does. Then
+``--users`` users each run ``--threads`` conversations at once: a page
+keyword, a description and ``--follow-ups`` follow-ups, some sent as a quick
+burst of messages (which the bot coalesces into one turn). Events are handled
+by a pool of ``--handler-threads`` workers, like Socket Mode's ``concurrency``.
+
+Reported: end-to-end latency from sending a message to its draft being posted
+(p50/p95/p99), throughput, peak RSS of the bot process, conversation lock
+wait and time spent queued for an LLM slot.
+
+    PYTHONPATH=src python benchmarks/loadtest.py [--users 20] [--threads 2] [--streaming]
+    PYTHONPATH=src python benchmarks/loadtest.py --json > loadtest.json
+
+Bot settings come from the environment as usual (e.g. ``LLM_MAX_CONCURRENCY``,
+``COALESCE_WINDOW_SECONDS``); the Slack and OpenAI credentials are fake.
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Lock, Thread
+from typing import Any, Dict, List, Optional, Tuple
+
+import stand_ins
+from stand_ins import DRAFT_MARKER
+
+KEYWORDS = ["beheer", "projecten", "over ons", "common ground", "trainingen", "linkedin"]
+DESCRIPTIONS = [
+    "Een LinkedIn-post over ons nieuwe managed hosting aanbod voor gemeenten, nuchter, met CTA",
+    "Aankondiging van de training functioneel beheer Nextcloud in maart, 5 zinnen",
+    "Stukje over OpenCatalogi en federatief delen van applicatie-informatie voor de website",
+    "Doelgroep: informatiemanagers bij gemeenten. Doel: uitnodigen voor een demo van Common Ground",
+]
+FOLLOW_UPS = [
+    "korter",
+    "formeler",
+    "voeg een CTA toe",
+    "minder jargon",
+    "noem Nextcloud",
+    "3 zinnen",
+]
+
+
+def _serve_stand_ins(config: Dict[str, Any], ready: Any) -> None:
+    """Child process: start the stand-ins and report their ports."""
+    ready.put(stand_ins.start(config))
+    while True:
+        time.sleep(3600)
+
+
+# --- Driver (bot process) ---
+
+
+class _Thread:
+    """Posts the bot made in one Slack thread: ``(time, kind)``."""
+
+    def __init__(self) -> None:
+        self.posts: List[Tuple[float, str]] = []
+        self.cond = Condition()
+
+    def wait_for(self, kinds: Tuple[str, ...], after: int, timeout: float) -> Optional[str]:
+        """Wait for a post of one of ``kinds`` after the first ``after`` posts."""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                for _, kind in self.posts[after:]:
+                    if kind in kinds:
+                        return kind
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+
+class _RecordingSlack:
+    """Passed to the handler as ``say`` and ``client``: forwards to the Slack
+    stand-in and records when each thread gets a draft or an error."""
+
+    def __init__(self, client: Any, failure_texts: List[str]) -> None:
+        self.client = client
+        self.failure_texts = set(failure_texts)
+        self.threads: Dict[str, _Thread] = {}
+        self._lock = Lock()
+        # Streamed replies are edited by message ts; map it back to the thread
+        self._message_thread: Dict[str, str] = {}
+
+    def thread(self, thread_ts: str) -> _Thread:
+        with self._lock:
+            return self.threads.setdefault(thread_ts, _Thread())
+
+    def say(self, **kwargs: Any) -> Any:
+        resp = self.client.chat_postMessage(**kwargs)
+        thread_ts = kwargs.get("thread_ts") or ""
+        with self._lock:
+            self._message_thread[resp["ts"]] = thread_ts
+        self._record(thread_ts, kwargs.get("text") or "")
+        return resp
+
+    def chat_update(self, **kwargs: Any) -> Any:
+        resp = self.client.chat_update(**kwargs)
+        with self._lock:
+            thread_ts = self._message_thread.get(kwargs.get("ts") or "", "")
+        self._record(thread_ts, kwargs.get("text") or "")
+        return resp
+
+    def _record(self, thread_ts: str, text: str) -> None:
+        if DRAFT_MARKER in text:
+            kind = "draft"
+        elif text in self.failure_texts:
+            kind = "failed"
+        else:
+            kind = "reply"
+        thread = self.thread(thread_ts)
+        with thread.cond:
+            thread.posts.append((time.monotonic(), kind))
+            thread.cond.notify_all()
+
+
+class _Results:
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.latencies: Dict[str, List[float]] = {"command": [], "draft": []}
+        self.counts = {"events": 0, "drafts": 0, "failed": 0, "timeouts": 0}
+
+    def add(self, key: str, amount: int = 1) -> None:
+        with self.lock:
+            self.counts[key] += amount
+
+    def latency(self, kind: str, seconds: float) -> None:
+        with self.lock:
+            self.latencies[kind].append(seconds)
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    ordered = sorted(values)
+
+    def pick(fraction: float) -> float:
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def _peak_rss_mib() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_conversation(
+    args: argparse.Namespace,
+    index: int,
+    handle: Any,
+    slack: _RecordingSlack,
+    results: _Results,
+    next_ts: Any,
+) -> None:
+    rng = random.Random(index)
+    user = f"U{index % args.users:04d}"
+    time.sleep(rng.uniform(0, args.ramp_up))
+
+    def send(text: str, thread_ts: Optional[str]) -> str:
+        ts = next_ts()
+        event = {
+            "type": "message",
+            "channel_type": "im",
+            "channel": f"D{user}",
+            "user": user,
+            "text": text,
+            "ts": ts,
+        }
+        if thread_ts:
+            event["thread_ts"] = thread_ts
+        results.add("events")
+        handle(event)
+        return ts
+
+    def think() -> None:
+        time.sleep(rng.expovariate(1000 / args.think_ms) if args.think_ms > 0 else 0)
+
+    def turn(texts: List[str], thread_ts: str, kinds: Tuple[str, ...], latency_kind: str) -> bool:
+        thread = slack.thread(thread_ts)
+        with thread.cond:
+            after = len(thread.posts)
+        sent_at = time.monotonic()
+        for position, text in enumerate(texts):
+            if position:
+                time.sleep(args.burst_gap_ms / 1000)
+            send(text, thread_ts)
+        outcome = thread.wait_for(kinds + ("failed",), after, args.timeout)
+        if outcome is None:
+            results.add("timeouts")
+            return False
+        if outcome == "failed":
+            results.add("failed")
+            return False
+        if outcome == "draft":
+            results.add("drafts")
+        results.latency(latency_kind, time.monotonic() - sent_at)
+        return True
+
+    # The keyword message starts the thread (its ts becomes the thread ts)
+    thread_ts = next_ts()
+    slack.thread(thread_ts)
+    event = {
+        "type": "message",
+        "channel_type": "im",
+        "channel": f"D{user}",
+        "user": user,
+        "text": rng.choice(KEYWORDS),
+        "ts": thread_ts,
+    }
+    sent_at = time.monotonic()
+    results.add("events")
+    handle(event)
+    if slack.thread(thread_ts).wait_for(("reply",), 0, args.timeout) is None:
+        results.add("timeouts")
+        return
+    results.latency("command", time.monotonic() - sent_at)
+    think()
+    if not turn([rng.choice(DESCRIPTIONS)], thread_ts, ("draft",), "draft"):
+        return
+    for _ in range(args.follow_ups):
+        think()
+        burst = args.burst_size if rng.random() < args.burst_rate else 1
+        if not turn(rng.sample(FOLLOW_UPS, burst), thread_ts, ("draft",), "draft"):
+            return
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="simulated users")
+    parser.add_argument("--threads", type=int, default=2, help="conversations per user, at once")
+    parser.add_argument("--follow-ups", type=int, default=3, help="follow-up turns per thread")
+    parser.add_argument("--burst-rate", type=float, default=0.3, help="share of bursty turns")
+    parser.add_argument("--burst-size", type=int, default=3, help="messages in a burst")
+    parser.add_argument("--burst-gap-ms", type=float, default=200, help="gap within a burst")
+    parser.add_argument("--think-ms", type=float, default=500, help="mean pause between turns")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="seconds to start all threads")
+    parser.add_argument(
+        "--handler-threads", type=int, default=10, help="like Socket Mode concurrency"
+    )
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="median LLM latency")
+    parser.add_argument("--llm-sigma", type=float, default=0.4, help="lognormal sigma (0 = fixed)")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="share of HTTP 500s")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.01, help="share of HTTP 429s")
+    parser.add_argument("--completion-words", type=int, default=120, help="words per draft")
+    parser.add_argument("--stream-chunks", type=int, default=20, help="chunks per streamed draft")
+    parser.add_argument("--streaming", action="store_true", help="set LLM_STREAMING=true")
+    parser.add_argument("--slack-latency-ms", type=float, default=30, help="Slack API latency")
+    parser.add_argument("--timeout", type=float, default=180, help="give up on a turn after this")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    servers = ctx.Process(target=_serve_stand_ins, args=(vars(args), ready), daemon=True)
+    servers.start()
+    ports = ready.get(timeout=30)
+    os.environ.update(stand_ins.environment(ports))
+    os.environ["LLM_STREAMING"] = "true" if args.streaming else "false"
+
+    import_started = time.perf_counter()
+    from conduction_content_bot import bot, content_fetcher
+    from conduction_content_bot.metrics import STAGE_SECONDS
+
+    import_seconds = time.perf_counter() - import_started
+    warmed = content_fetcher.warm_up()
+    baseline_rss = _peak_rss_mib()
+
+    app = bot.create_app()
+    slack = _RecordingSlack(app.client, [bot.ERROR_TEXT, bot.BUSY_TEXT, bot.OUTAGE_TEXT])
+    results = _Results()
+    ts_counter = itertools.count(1)
+    ts_lock = Lock()
+
+    def next_ts() -> str:
+        with ts_lock:
+            return f"{1700000000 + next(ts_counter)}.000100"
+
+    pool = ThreadPoolExecutor(max_workers=args.handler_threads, thread_name_prefix="handler")
+
+    def handle(event: Dict[str, Any]) -> None:
+        pool.submit(bot.on_dm_events, event, slack.say, slack)
+
+    conversations = args.users * args.threads
+    started = time.monotonic()
+    drivers = [
+        Thread(
+            target=_run_conversation,
+            args=(args, index, handle, slack, results, next_ts),
+            daemon=True,
+        )
+        for index in range(conversations)
+    ]
+    for driver in drivers:
+        driver.start()
+    for driver in drivers:
+        driver.join()
+    elapsed = time.monotonic() - started
+    pool.shutdown(wait=True)
+
+    lock_waits, lock_wait_total = STAGE_SECONDS.totals(stage="lock_wait")
+    scheduler = bot.SCHEDULER.metrics()
+    draft_latency = _percentiles(results.latencies["draft"])
+    report = {
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("json", "timeout")
+        },
+        "conversations": conversations,
+        "elapsed_seconds": round(elapsed, 2),
+        **results.counts,
+        "events_per_second": round(results.counts["events"] / elapsed, 2),
+        "drafts_per_second": round(results.counts["drafts"] / elapsed, 2),
+        "draft_latency_seconds": {k: v and round(v, 3) for k, v in draft_latency.items()},
+        "command_latency_seconds": {
+            k: v and round(v, 3) for k, v in _percentiles(results.latencies["command"]).items()
+        },
+        "lock_wait": {
+            "acquisitions": lock_waits,
+            "total_seconds": round(lock_wait_total, 4),
+            "p99_seconds": round(STAGE_SECONDS.quantile(0.99, stage="lock_wait") or 0.0, 4),
+        },
+        "llm_queue": {
+            "queued": scheduler["queued"],
+            "rejected": scheduler["rejected"],
+            "wait_seconds": scheduler["wait_seconds"],
+        },
+        "llm_requests": bot.LLM_USAGE["requests"],
+        "llm_retries": {key[0]: int(value) for key, value in bot.LLM_RETRIES.by_labels().items()},
+        "coalescer": bot.COALESCER.metrics(),
+        "import_seconds": round(import_seconds, 3),
+        "pages_warmed": sum(warmed.values()),
+        "rss_mib": {"after_warm_up": round(baseline_rss, 1), "peak": round(_peak_rss_mib(), 1)},
+    }
+    servers.terminate()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    mean_draft = statistics.mean(results.latencies["draft"]) if results.latencies["draft"] else 0
+    print(
+        f"{conversations} conversations ({args.users} users x {args.threads}),"
+        f" {args.follow_ups} follow-ups, LLM {args.llm_latency_ms:.0f} ms median"
+        f" (sigma {args.llm_sigma}), {args.error_rate:.0%} errors,"
+        f" {args.rate_limit_rate:.0%} rate limits, streaming={args.streaming},"
+        f" {args.handler_threads} handler threads"
+    )
+    print(
+        f"throughput   {report['events_per_second']} events/s,"
+        f" {report['drafts_per_second']} drafts/s over {report['elapsed_seconds']} s"
+        f" ({results.counts['events']} events, {results.counts['drafts']} drafts,"
+        f" {results.counts['failed']} failed, {results.counts['timeouts']} timed out)"
+    )
+    print(
+        "draft e2e    "
+        + "  ".join(f"{k} {v:.2f}s" for k, v in draft_latency.items() if v is not None)
+        + f"  mean {mean_draft:.2f}s"
+    )
+    print(
+        f"lock wait    {lock_waits} acquisitions, {lock_wait_total * 1000:.1f} ms total,"
+        f" p99 ~{report['lock_wait']['p99_seconds'] * 1000:.2f} ms (bucket estimate)"
+    )
+    print(
+        f"LLM queue    {scheduler['queued']} calls queued, {scheduler['wait_seconds']:.1f} s"
+        f" waiting, {scheduler['rejected']} rejected; {report['llm_requests']} requests,"
+        f" retries {report['llm_retries'] or 'none'}"
+    )
+    print(
+        f"memory       peak RSS {report['rss_mib']['peak']} MiB"
+        f" ({report['rss_mib']['after_warm_up']} MiB after import and warm-up)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,425 @@
+"""Local stand-ins for the services the bot talks to, for the benchmarks.
+
+- ``OpenAIStub``: an OpenAI-compatible ``/v1/chat/completions``;
+- ``SlackStub`` and ``WebSocketStub``: the Slack Web API and a Socket Mode
+  endpoint that says ``hello`` and answers pings (no events);
+- ``SiteStub``: the website, serving the pages in ``fixtures/``;
+- ``RedisStub``: a Redis-protocol server with just the commands the
+  conversation store uses.
+
+``start(config)`` runs all of them on free ports in daemon threads; point the
+bot at them with ``OPENAI_BASE_URL``, ``SLACK_API_URL``, ``WEBSITE_BASE_URL``
+and (optionally) ``CONVERSATION_STORE_URL``.
+"""
+
+import base64
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import socketserver
+import struct
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Any, Dict, List, Optional, Tuple
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# Site paths (content_fetcher.PAGE_TO_URL) -> saved page
+PATH_TO_FIXTURE = {
+    "/": "home.html",
+    "/over-ons": "over-ons.html",
+    "/beheer": "beheer.html",
+    "/projecten": "projecten.html",
+    "/common-ground": "common-ground.html",
+    "/trainingen": "trainingen.html",
+}
+# Defaults for start(); benchmarks override what they expose as options
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "llm_latency_ms": 800,
+    "llm_sigma": 0.4,
+    "error_rate": 0.0,
+    "rate_limit_rate": 0.0,
+    "completion_words": 120,
+    "stream_chunks": 20,
+    "slack_latency_ms": 30,
+}
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Ends every stub completion, so a posted draft is recognisable
+DRAFT_MARKER = "EINDE"
+WORDS = "open source common ground gemeenten hosting beheer samenwerken veilig transparant".split()
+
+
+class OpenAIStub(BaseHTTPRequestHandler):
+    """``/v1/chat/completions`` with lognormal latency, HTTP 500s and 429s, ``n``
+    and streaming (chunked server-sent events)."""
+
+    protocol_version = "HTTP/1.1"
+    config: Dict[str, Any] = {}
+    rng = random.Random(1)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        cfg = self.config
+        latency = cfg["llm_latency_ms"] / 1000 * math.exp(self.rng.gauss(0, cfg["llm_sigma"]))
+        roll = self.rng.random()
+        if roll < cfg["rate_limit_rate"]:
+            self._json(429, {"error": {"message": "rate limited", "type": "requests"}}, 200)
+            return
+        if roll < cfg["rate_limit_rate"] + cfg["error_rate"]:
+            time.sleep(latency)
+            self._json(500, {"error": {"message": "stub failure", "type": "server_error"}})
+            return
+        words = [WORDS[i % len(WORDS)] for i in range(cfg["completion_words"])]
+        text = " ".join(words + [DRAFT_MARKER])
+        if body.get("stream"):
+            self._stream(body["model"], text, latency)
+            return
+        time.sleep(latency)
+        n = body.get("n") or 1
+        self._json(
+            200,
+            {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": i,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "stop",
+                    }
+                    for i in range(n)
+                ],
+                "usage": {
+                    "prompt_tokens": 1500,
+                    "completion_tokens": len(words) * n,
+                    "total_tokens": 1500 + len(words) * n,
+                    "prompt_tokens_details": {"cached_tokens": 1024},
+                },
+            },
+        )
+
+    def _json(self, status: int, payload: Dict[str, Any], retry_after_ms: int = 0) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if retry_after_ms:
+            self.send_header("retry-after-ms", str(retry_after_ms))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, model: str, text: str, latency: float) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = text.split(" ")
+        chunks = max(1, min(self.config["stream_chunks"], len(words)))
+        per_chunk = math.ceil(len(words) / chunks)
+        # A fifth of the latency before the first token, the rest spread over the chunks
+        time.sleep(latency * 0.2)
+        for start in range(0, len(words), per_chunk):
+            delta = " ".join(words[start : start + per_chunk]) + " "
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+            }
+            self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            time.sleep(latency * 0.8 / chunks)
+        usage = {
+            "id": "stub",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": model,
+            "choices": [],
+            "usage": {"prompt_tokens": 1500, "completion_tokens": len(words), "total_tokens": 0},
+        }
+        self._send_chunk(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode())
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class SlackStub(BaseHTTPRequestHandler):
+    """Slack Web API methods the bot calls; ``apps.connections.open`` points
+    Socket Mode at ``WebSocketStub``."""
+
+    protocol_version = "HTTP/1.1"
+    config: Dict[str, Any] = {}
+    ts_counter = itertools.count(1)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        method = self.path.rsplit("/", 1)[-1]
+        time.sleep(self.config["slack_latency_ms"] / 1000)
+        payload: Dict[str, Any] = {"ok": True}
+        if method == "auth.test":
+            payload.update(user_id="UBOT", bot_id="BBOT", team_id="T0", user="bot", team="t")
+        elif method == "apps.connections.open":
+            payload.update(url=self.config["socket_url"])
+        elif method in ("chat.postMessage", "chat.update"):
+            body = json.loads(raw or b"{}") if raw.startswith(b"{") else {}
+            ts = body.get("ts") or f"{1800000000 + next(self.ts_counter)}.000000"
+            payload.update(channel=body.get("channel", "D0"), ts=ts)
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class SiteStub(BaseHTTPRequestHandler):
+    """The saved pages at their site paths, with ETags (304 on revalidation)."""
+
+    protocol_version = "HTTP/1.1"
+    pages: Dict[str, Tuple[bytes, str]] = {}
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        page = self.pages.get(self.path.split("?")[0].rstrip("/") or "/")
+        if page is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body, etag = page
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class WebSocketStub(socketserver.StreamRequestHandler):
+    """Socket Mode endpoint: completes the WebSocket handshake, sends ``hello``
+    and answers pings until the client closes the connection."""
+
+    def handle(self) -> None:
+        self.rfile.readline()
+        headers = {}
+        while True:
+            line = self.rfile.readline().decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key", "") + _WEBSOCKET_GUID
+        accept = base64.b64encode(hashlib.sha1(key.encode()).digest()).decode()
+        self.wfile.write(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                f"Connection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n"
+            ).encode()
+        )
+        hello = {"type": "hello", "num_connections": 1, "debug_info": {"host": "stand-in"}}
+        self._send(0x1, json.dumps(hello).encode())
+        while True:
+            frame = self._receive()
+            if frame is None:
+                return
+            opcode, payload = frame
+            if opcode == 0x8:
+                self._send(0x8, payload[:2])
+                return
+            if opcode == 0x9:
+                self._send(0xA, payload)
+
+    def _send(self, opcode: int, payload: bytes) -> None:
+        if len(payload) < 126:
+            header = struct.pack("!BB", 0x80 | opcode, len(payload))
+        elif len(payload) < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, len(payload))
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, len(payload))
+        self.wfile.write(header + payload)
+        self.wfile.flush()
+
+    def _receive(self) -> Optional[Tuple[int, bytes]]:
+        head = self.rfile.read(2)
+        if len(head) < 2:
+            return None
+        length = head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if head[1] & 0x80 else b"\0\0\0\0"
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self.rfile.read(length)))
+        return head[0] & 0x0F, payload
+
+
+class RedisStub(socketserver.StreamRequestHandler):
+    """Redis server for ``RedisConversationStore``: ``GET``, ``SET`` (with ``NX``
+    and ``PX``), ``DEL``, the compare-and-delete ``EVAL`` script, the sorted-set
+    commands of its entry cap, plus ``HELLO`` (RESP2 or RESP3), ``PING``,
+    ``AUTH`` and ``SELECT`` (accepted and ignored). One keyspace, shared by all
+    connections."""
+
+    # Like Redis: pipelined replies are separate writes and must not wait for ACKs
+    disable_nagle_algorithm = True
+    data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+    sorted_sets: Dict[bytes, Dict[bytes, float]] = {}
+    lock = Lock()
+
+    def handle(self) -> None:
+        # Protocol chosen with HELLO; RESP3 sends nulls as "_"
+        self.protocol = 2
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args: List[bytes] = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            with self.lock:
+                reply = self._execute(args[0].upper(), args[1:])
+            self.wfile.write(reply)
+
+    def _execute(self, command: bytes, args: List[bytes]) -> bytes:
+        if command == b"GET":
+            return self._bulk(self._get(args[0]))
+        if command == b"SET":
+            options = [a.upper() for a in args[2:]]
+            expires_at = None
+            if b"PX" in options:
+                expires_at = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000
+            if b"NX" in options and self._get(args[0]) is not None:
+                return self._bulk(None)
+            self.data[args[0]] = (args[1], expires_at)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            return b":%d\r\n" % sum(self.data.pop(key, None) is not None for key in args)
+        if command.startswith(b"Z"):
+            return self._sorted_set(command, self.sorted_sets.setdefault(args[0], {}), args[1:])
+        if command == b"EVAL":
+            # Only the store's release script: delete KEYS[1] if it holds ARGV[1]
+            key, token = args[2], args[3]
+            if self._get(key) == token:
+                del self.data[key]
+                return b":1\r\n"
+            return b":0\r\n"
+        if command == b"HELLO":
+            # redis-py negotiates RESP3 on connect
+            self.protocol = int(args[0]) if args else self.protocol
+            fields = [
+                b"$6\r\nserver\r\n$5\r\nredis\r\n",
+                b"$5\r\nproto\r\n:%d\r\n" % self.protocol,
+            ]
+            if self.protocol == 3:
+                return b"%%%d\r\n" % len(fields) + b"".join(fields)
+            return b"*%d\r\n" % (2 * len(fields)) + b"".join(fields)
+        if command in (b"PING", b"AUTH", b"SELECT"):
+            return b"+OK\r\n"
+        return b"-ERR unknown command '" + command + b"'\r\n"
+
+    def _sorted_set(self, command: bytes, members: Dict[bytes, float], args: List[bytes]) -> bytes:
+        """The sorted-set commands the store's entry cap uses, without options."""
+        if command == b"ZADD":
+            for score, member in zip(args[::2], args[1::2]):
+                members[member] = float(score)
+            return b":%d\r\n" % (len(args) // 2)
+        if command == b"ZCARD":
+            return b":%d\r\n" % len(members)
+        if command == b"ZREM":
+            return b":%d\r\n" % sum(members.pop(member, None) is not None for member in args)
+        ranked = sorted(members, key=lambda member: (members[member], member))
+        if command == b"ZRANGE":
+            start, stop = int(args[0]), int(args[1])
+            chosen = ranked[start : (stop + 1) or None]
+            return b"*%d\r\n" % len(chosen) + b"".join(self._bulk(m) for m in chosen)
+        if command == b"ZREMRANGEBYSCORE":
+            low, high = float(args[0]), float(args[1])
+            removed = [m for m in ranked if low <= members[m] <= high]
+            for member in removed:
+                del members[member]
+            return b":%d\r\n" % len(removed)
+        return b"-ERR unknown command '" + command + b"'\r\n"
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _bulk(self, value: Optional[bytes]) -> bytes:
+        if value is None:
+            return b"_\r\n" if self.protocol == 3 else b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+
+def start(config: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """Start every stand-in on 127.0.0.1 and return their ports.
+
+    @param config: Overrides of ``DEFAULT_CONFIG`` (latencies, error rates, draft size).
+    @return: Ports by name: ``openai``, ``slack``, ``socket``, ``site`` and ``redis``.
+    @rtype: Dict[str, int]
+    """
+    settings = {**DEFAULT_CONFIG, **(config or {})}
+    for path, name in PATH_TO_FIXTURE.items():
+        with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+            body = f.read()
+        SiteStub.pages[path] = (body, '"' + hashlib.sha256(body).hexdigest()[:16] + '"')
+    socket_server = _ThreadingTCPServer(("127.0.0.1", 0), WebSocketStub)
+    Thread(target=socket_server.serve_forever, daemon=True).start()
+    settings["socket_url"] = f"ws://127.0.0.1:{socket_server.server_address[1]}/link"
+    OpenAIStub.config = settings
+    SlackStub.config = settings
+    redis_server = _ThreadingTCPServer(("127.0.0.1", 0), RedisStub)
+    Thread(target=redis_server.serve_forever, daemon=True).start()
+    ports = {"socket": socket_server.server_address[1], "redis": redis_server.server_address[1]}
+    for name, handler in (("openai", OpenAIStub), ("slack", SlackStub), ("site", SiteStub)):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        Thread(target=server.serve_forever, daemon=True).start()
+        ports[name] = server.server_port
+    return ports
+
+
+def environment(ports: Dict[str, int]) -> Dict[str, str]:
+    """Environment variables pointing the bot (with fake credentials) at the stand-ins.
+
+    @param ports: From ``start``.
+    @rtype: Dict[str, str]
+    """
+    return {
+        "SLACK_APP_TOKEN": "xapp-stand-in",
+        "SLACK_BOT_TOKEN": "xoxb-stand-in",
+        "OPENAI_API_KEY": "sk-stand-in",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{ports['openai']}/v1",
+        "SLACK_API_URL": f"http://127.0.0.1:{ports['slack']}/api/",
+        "WEBSITE_BASE_URL": f"http://127.0.0.1:{ports['site']}",
+    }
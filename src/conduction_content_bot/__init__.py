@@ -1,5 +1,20 @@
 __all__ = [
     "bot",
+    "async_bot",
     "prompts",
+    "prompt_registry",
+    "retrieval",
     "content_fetcher",
+    "token_budget",
+    "scheduler",
+    "coalescer",
+    "resilience",
+    "router",
+    "variants",
+    "response_cache",
+    "metrics",
+    "conversation_store",
+    "conversation_backends",
+    "extraction_cache",
+    "workers",
 ]
@@ -0,0 +1,874 @@
+"""Async execution mode: the same bot on slack_bolt's ``AsyncApp``.
+
+Selected with ``BOT_MODE=async``. Events are handled as tasks on a single
+event loop instead of a thread each, the model is called with ``AsyncOpenAI``
+and retry backoff is ``asyncio.sleep``, so waiting on Slack, OpenAI or the
+website costs no thread. Conversation state, prompts and reply texts are
+shared with ``bot``; the conversation store and prompt registry block (locks,
+SQLite, Redis), so those sections run in worker threads via
+``asyncio.to_thread``.
+
+Needs the ``async`` extra (aiohttp) for the socket-mode adapter.
+"""
+
+import asyncio
+import importlib
+import itertools
+import logging
+import signal
+import sys
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from slack_bolt.util.utils import get_boot_message
+from slack_sdk.errors import SlackApiError
+
+from . import content_fetcher
+from .bot import (
+    APP_TOKEN,
+    BOT_TOKEN,
+    BUSY_TEXT,
+    CACHED_NOTE,
+    COALESCER,
+    CONVERSATIONS,
+    ERROR_TEXT,
+    HELP_COMMANDS,
+    LLM_IN_FLIGHT,
+    LLM_MAX_VARIANTS,
+    LLM_MODELS,
+    LLM_STREAMING,
+    MESSAGE_OVERHEAD_TOKENS,
+    NOTHING_TO_REGENERATE_TEXT,
+    OPENAI_API_KEY,
+    OPENAI_MODEL,
+    OPENAI_TIMEOUT_SECONDS,
+    OUTAGE_TEXT,
+    REGENERATE_COMMANDS,
+    RESPONSE_CACHE,
+    RETRY_POLICY,
+    ROUTER,
+    SCHEDULER,
+    SLACK_API_URL,
+    STREAM_UPDATE_INTERVAL_SECONDS,
+    _apply_compaction,
+    _cached_reply,
+    _commit_turn,
+    _estimate_call_tokens,
+    _format_code_block,
+    _format_variant,
+    _help_text,
+    _is_user_message,
+    _last_user_turn,
+    _mark_ready,
+    _new_conversation_state,
+    _observe_attempt,
+    _plan_compaction,
+    _queued_text,
+    _record_startup,
+    _record_usage,
+    _request_messages,
+    _response_cache_key,
+    _retry_delay,
+    _route_message,
+    _StreamingReply,
+    _timed,
+    _use_description,
+    _use_variant,
+    _variant_messages,
+    _without_last_turn,
+    missing_settings,
+)
+from .coalescer import Superseded
+from .metrics import STAGE_SECONDS, TimedLock
+from .resilience import CircuitOpenError
+from .router import COMPLETION, FIRST_TOKEN, Endpoint
+from .scheduler import SchedulerBusy, Ticket
+from .token_budget import count_tokens, load_tokenizers, summary_request
+from .variants import format_variants, parse_variant_request
+
+try:
+    from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+    from slack_bolt.async_app import AsyncApp
+    from slack_sdk.web.async_client import AsyncWebClient
+except ImportError:
+    print(
+        "BOT_MODE=async needs aiohttp: pip install 'conduction-content-bot[async]'",
+        file=sys.stderr,
+    )
+    raise
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# Clients per endpoint in LLM_MODELS (None = the default endpoint), created on
+# first use by _aclient (on the event loop, so no lock is needed)
+_ACLIENTS: Dict[Optional[str], "AsyncOpenAI"] = {}
+
+
+def _aclient(base_url: Optional[str]) -> "AsyncOpenAI":
+    """
+    Return the async OpenAI client for an endpoint, creating it on first use.
+    @param base_url: Endpoint base URL, or ``None`` for the default (OPENAI_BASE_URL).
+    @returns: The client.
+    """
+    if base_url not in _ACLIENTS:
+        # Imported in a worker thread during startup (see _awarm_up), so this is cheap
+        from openai import AsyncOpenAI
+
+        # Use client without internal retries; rely on our own retry wrapper for full control
+        _ACLIENTS[base_url] = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=base_url,
+            timeout=OPENAI_TIMEOUT_SECONDS,
+            max_retries=0,
+        )
+    return _ACLIENTS[base_url]
+
+
+async def _acompact_history(
+    conversation_id: str, conv_lock, user_id: str = "", pending_tokens: int = 0
+) -> None:
+    """
+    Async ``bot._compact_history``: the summary is generated on the event loop.
+
+    @param conversation_id: Thread to compact.
+    @param conv_lock: The thread's lock.
+    @param user_id: Slack user the summary is made for (for fair queueing).
+    @param pending_tokens: Tokens of the new user turn (not in the history yet).
+    @returns: None
+    """
+    plan = await asyncio.to_thread(_plan_compaction, conversation_id, conv_lock, pending_tokens)
+    if plan is None:
+        return
+    older, previous_summary = plan
+    try:
+        summary = await _acall_llm_with_retry(summary_request(previous_summary, older), user_id)
+    except (SchedulerBusy, CircuitOpenError) as e:
+        # Too busy (or OpenAI is down) to summarise now; keep the turns and try again next time
+        logging.info(f"Skipped compacting conversation {conversation_id}: {e}")
+        return
+    except Exception as e:
+        logging.exception(f"Error summarising history, dropping {len(older)} turns: {e}")
+        summary = previous_summary
+    await asyncio.to_thread(_apply_compaction, conversation_id, conv_lock, older, summary)
+
+
+async def _areply_in_thread(
+    conversation_id: str,
+    conv_lock,
+    user_text: str,
+    channel: str,
+    say,
+    client,
+    user_id: str = "",
+) -> None:
+    """
+    Async ``bot._reply_in_thread``, with the same message coalescing.
+
+    @param conversation_id: Thread to reply in (page key already chosen).
+    @param conv_lock: The thread's lock.
+    @param user_text: The user's message.
+    @param channel: Slack channel id of the DM.
+    @param say: Async callable to send a message back to Slack.
+    @param client: Slack AsyncWebClient (used to edit streamed replies).
+    @param user_id: Slack user who sent the message (for fair queueing).
+    @returns: None
+    """
+    seq = COALESCER.add(conversation_id, user_text)
+    if not await COALESCER.wait_async(conversation_id, seq):
+        logging.info(f"Message merged into a newer turn of conversation {conversation_id}")
+        return
+    texts = COALESCER.texts(conversation_id)
+    merged = "\n".join(texts)
+    regenerate = merged.strip().lower() in REGENERATE_COMMANDS
+    if regenerate:
+        previous = await asyncio.to_thread(_last_user_turn, conversation_id, conv_lock)
+        if previous is None:
+            COALESCER.discard(conversation_id, seq)
+            await say(channel=channel, thread_ts=conversation_id, text=NOTHING_TO_REGENERATE_TEXT)
+            return
+        merged = previous
+    variant_count = parse_variant_request(merged, LLM_MAX_VARIANTS)
+
+    async def commit(draft: str, variants: Optional[List[str]] = None) -> bool:
+        return await asyncio.to_thread(
+            _commit_turn,
+            conversation_id,
+            conv_lock,
+            seq,
+            len(texts),
+            merged,
+            draft,
+            variants,
+            regenerate,
+        )
+
+    try:
+        await asyncio.to_thread(_use_description, conversation_id, conv_lock, merged)
+        if not regenerate:
+            await asyncio.to_thread(_use_variant, conversation_id, conv_lock, merged)
+        pending_tokens = count_tokens(merged, OPENAI_MODEL) + MESSAGE_OVERHEAD_TOKENS
+        await _acompact_history(conversation_id, conv_lock, user_id, pending_tokens)
+        messages = await asyncio.to_thread(_request_messages, conversation_id, conv_lock, merged)
+        if regenerate:
+            messages = _without_last_turn(messages)
+        if variant_count > 1:
+            draft = await _agenerate_variants(
+                messages,
+                variant_count,
+                channel,
+                conversation_id,
+                say,
+                user_id,
+                commit=lambda variants: commit(format_variants(variants), variants),
+            )
+        else:
+            draft = await _agenerate_cached_reply(
+                messages,
+                channel,
+                conversation_id,
+                say,
+                client,
+                user_id,
+                is_current=lambda: COALESCER.is_current(conversation_id, seq),
+                commit=commit,
+                refresh=regenerate,
+            )
+    except Exception:
+        COALESCER.discard(conversation_id, seq)
+        raise
+    if draft is None:
+        COALESCER.record_superseded()
+        logging.info(f"Discarded a superseded draft in conversation {conversation_id}")
+
+
+async def _acomplete(endpoint: Endpoint, messages: List[dict], n: int = 1) -> Any:
+    """
+    Async ``bot._complete``.
+
+    @param endpoint: Model and endpoint to call.
+    @param messages: Chat messages to send.
+    @param n: Completions to ask for.
+    @returns: The completion; its latency (or failure) is recorded for routing.
+    """
+    extra = {"n": n} if n > 1 else {}
+    started = time.monotonic()
+    LLM_IN_FLIGHT.inc(model=endpoint.label)
+    try:
+        resp = await _aclient(endpoint.base_url).chat.completions.create(
+            model=endpoint.model,
+            messages=messages,
+            timeout=OPENAI_TIMEOUT_SECONDS,
+            **extra,
+        )
+    except Exception as err:
+        ROUTER.record_error(endpoint, err, COMPLETION)
+        _observe_attempt(endpoint, COMPLETION, started, ok=False)
+        raise
+    finally:
+        LLM_IN_FLIGHT.dec(model=endpoint.label)
+    ROUTER.record(endpoint, time.monotonic() - started, True, COMPLETION)
+    _observe_attempt(endpoint, COMPLETION, started, ok=True)
+    return resp
+
+
+async def _acomplete_hedged(
+    endpoint: Endpoint, messages: List[dict], ticket: Ticket, n: int = 1
+) -> Tuple[Any, Endpoint]:
+    """
+    Async ``bot._complete_hedged``; the slower request is cancelled.
+
+    @param endpoint: Model and endpoint to call first.
+    @param messages: Chat messages to send.
+    @param ticket: Scheduler ticket of the call; a hedge is charged to it.
+    @param n: Completions to ask for.
+    @returns: The first successful completion and the endpoint that gave it.
+    @raises: The original request's error if both requests fail.
+    """
+    delay = ROUTER.hedge_delay(endpoint)
+    if delay is None:
+        return await _acomplete(endpoint, messages, n), endpoint
+    first = asyncio.ensure_future(_acomplete(endpoint, messages, n))
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    backup = None if done else ROUTER.start_hedge(endpoint)
+    if backup is None:
+        return await first, endpoint
+    logging.info(f"Hedging a call to {endpoint.label} slower than {delay:.1f}s with {backup.label}")
+    SCHEDULER.charge(ticket)
+    second = asyncio.ensure_future(_acomplete(backup, messages, n))
+    pending = {first, second}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        ROUTER.record_hedge_win()
+                    return task.result(), backup if task is second else endpoint
+        raise first.exception() or second.exception()
+    finally:
+        for task in (first, second):
+            task.cancel()
+
+
+async def _acomplete_choices(
+    endpoint: Endpoint, messages: List[dict], ticket: Ticket, n: int
+) -> Tuple[List[Any], Endpoint]:
+    """
+    Async ``bot._complete_choices``.
+
+    @param endpoint: Model and endpoint to call first.
+    @param messages: Chat messages to send.
+    @param ticket: Scheduler ticket of the call; extra requests are charged to it.
+    @param n: Completions wanted.
+    @returns: The responses (together holding at least ``n`` choices) and the
+    endpoint that answered.
+    """
+    responses: List[Any] = []
+    answered_by = endpoint
+    missing = n
+    if n == 1 or ROUTER.supports_n(endpoint):
+        resp, answered_by = await _acomplete_hedged(endpoint, messages, ticket, n)
+        responses.append(resp)
+        missing = n - len(resp.choices)
+        if missing > 0:
+            ROUTER.record_without_n(answered_by)
+    if missing > 0:
+        # Admission paid for one request; charge the others
+        for _ in range(missing if responses else missing - 1):
+            SCHEDULER.charge(ticket)
+        responses.extend(
+            await asyncio.gather(*(_acomplete(answered_by, messages) for _ in range(missing)))
+        )
+    return responses, answered_by
+
+
+async def _acall_llm_choices(
+    full_messages: List[dict],
+    n: int,
+    user_id: str = "",
+    on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+) -> List[str]:
+    """
+    Async ``bot._call_llm_choices``; backs off without blocking the loop.
+
+    @param full_messages: Complete list of chat messages to send to the model.
+    @param n: Completions wanted (variants of the same request).
+    @param user_id: Slack user the call is made for (for fair queueing).
+    @param on_queued: Awaited with the queue position if the call has to wait.
+    @returns: ``n`` assistant responses as stripped strings.
+    @raises: APIError, APIConnectionError, RateLimitError, APITimeoutError on
+    terminal failures after retries; SchedulerBusy if the LLM queue is full
+    or the call waited too long in it;
+    CircuitOpenError while the provider is considered down.
+    """
+    async with SCHEDULER.slot_async(
+        user_id, _estimate_call_tokens(full_messages, n), on_queued
+    ) as ticket:
+        for attempt_index in itertools.count():
+            if attempt_index:
+                # Retries count against the rate limits too
+                SCHEDULER.charge(ticket)
+            endpoint = ROUTER.endpoint_for(attempt_index)
+            RETRY_POLICY.before_attempt(attempt_index, endpoint.label)
+            try:
+                responses, answered_by = await _acomplete_choices(
+                    endpoint, full_messages, ticket, n
+                )
+                RETRY_POLICY.on_success(answered_by.label)
+                used = [_record_usage(resp.usage) for resp in responses]
+                ticket.used_tokens = sum(u or 0 for u in used) if any(used) else None
+                choices = [choice for resp in responses for choice in resp.choices]
+                return [(choice.message.content or "").strip() for choice in choices[:n]]
+            except Exception as err:
+                delay = _retry_delay(err, attempt_index, endpoint)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+
+async def _acall_llm_with_retry(
+    full_messages: List[dict],
+    user_id: str = "",
+    on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+) -> str:
+    """
+    Async ``bot._call_llm_with_retry``.
+
+    @param full_messages: Complete list of chat messages to send to the model.
+    @param user_id: Slack user the call is made for (for fair queueing).
+    @param on_queued: Awaited with the queue position if the call has to wait.
+    @returns: Assistant response content as a stripped string.
+    @raises: See ``_acall_llm_choices``.
+    """
+    return (await _acall_llm_choices(full_messages, 1, user_id, on_queued))[0]
+
+
+async def _acall_llm_streaming(
+    full_messages: List[dict],
+    on_update: Callable[[str], Awaitable[None]],
+    user_id: str = "",
+    on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+    on_admitted: Optional[Callable[[], Awaitable[None]]] = None,
+) -> str:
+    """
+    Async ``bot._call_llm_streaming``, with the same retry semantics.
+
+    @param full_messages: Complete list of chat messages to send to the model.
+    @param on_update: Awaited with the accumulated text whenever it grows.
+    @param user_id: Slack user the call is made for (for fair queueing).
+    @param on_queued: Awaited with the queue position if the call has to wait.
+    @param on_admitted: Awaited once the scheduler has admitted the call.
+    @returns: Assistant response content as a stripped string.
+    @raises: APIError, APIConnectionError, RateLimitError, APITimeoutError on
+    terminal failures after retries; SchedulerBusy if the LLM queue is full
+    or the call waited too long in it;
+    CircuitOpenError while the provider is considered down.
+    """
+    async with SCHEDULER.slot_async(
+        user_id, _estimate_call_tokens(full_messages), on_queued
+    ) as ticket:
+        if on_admitted is not None:
+            await on_admitted()
+        for attempt_index in itertools.count():
+            if attempt_index:
+                # Retries count against the rate limits too
+                SCHEDULER.charge(ticket)
+            endpoint = ROUTER.endpoint_for(attempt_index)
+            RETRY_POLICY.before_attempt(attempt_index, endpoint.label)
+            parts: List[str] = []
+            started = time.monotonic()
+            LLM_IN_FLIGHT.inc(model=endpoint.label)
+            try:
+                stream = await _aclient(endpoint.base_url).chat.completions.create(
+                    model=endpoint.model,
+                    messages=full_messages,
+                    timeout=OPENAI_TIMEOUT_SECONDS,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                # Closing the stream ends the response, also when the draft is
+                # superseded or fails midway, so the provider stops generating
+                async with stream:
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            # The final chunk carries only the usage
+                            ticket.used_tokens = _record_usage(chunk.usage)
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if not delta:
+                            continue
+                        if not parts:
+                            first_token_seconds = time.monotonic() - started
+                            ROUTER.record(endpoint, first_token_seconds, True, FIRST_TOKEN)
+                            logging.info(
+                                f"LLM time to first token: {first_token_seconds:.2f}s"
+                                f" ({endpoint.label}, attempt {attempt_index + 1})"
+                            )
+                        parts.append(delta)
+                        await on_update("".join(parts))
+                RETRY_POLICY.on_success(endpoint.label)
+                _observe_attempt(endpoint, FIRST_TOKEN, started, ok=True)
+                logging.info(f"LLM stream completed in {time.monotonic() - started:.2f}s")
+                return "".join(parts).strip()
+            except Superseded:
+                # Not a failure: tokens were arriving, the draft is just no longer wanted
+                RETRY_POLICY.on_success(endpoint.label)
+                raise
+            except Exception as err:
+                # Includes httpx errors from a connection dropped mid-stream
+                ROUTER.record_error(endpoint, err, FIRST_TOKEN)
+                _observe_attempt(endpoint, FIRST_TOKEN, started, ok=False)
+                delay = _retry_delay(err, attempt_index, endpoint)
+                if delay is None:
+                    raise
+                if parts:
+                    logging.warning(
+                        f"LLM stream failed after {len(''.join(parts))} chars; restarting: {err}"
+                    )
+                    await on_update("")
+            finally:
+                LLM_IN_FLIGHT.dec(model=endpoint.label)
+            await asyncio.sleep(delay)
+
+
+class _AsyncStreamingReply:
+    """
+    Async ``bot._StreamingReply``: a Slack message edited in place as a
+    streamed draft grows, with the same throttling and rate-limit handling.
+    Create it with ``await _AsyncStreamingReply.start(...)``.
+    """
+
+    PLACEHOLDER = _StreamingReply.PLACEHOLDER
+    SUPERSEDED = _StreamingReply.SUPERSEDED
+
+    def __init__(self, client, channel: str, thread_ts: str, say, ts: Optional[str]) -> None:
+        self.client = client
+        self.channel = channel
+        self.say = say
+        self.thread_ts = thread_ts
+        self.ts = ts
+        self._next_update_at = 0.0
+        self._last_text: Optional[str] = None
+
+    @classmethod
+    async def start(cls, client, channel: str, thread_ts: str, say) -> "_AsyncStreamingReply":
+        """
+        Post the placeholder message.
+        @param client: Slack AsyncWebClient.
+        @param channel: Slack channel id of the DM.
+        @param thread_ts: Thread to reply in.
+        @param say: Async callable to send a message back to Slack.
+        @returns: The reply, ready for updates.
+        """
+        resp = await say(channel=channel, thread_ts=thread_ts, text=cls.PLACEHOLDER)
+        ts = resp.get("ts") if resp is not None else None
+        return cls(client, channel, thread_ts, say, ts)
+
+    async def update(self, text: str) -> None:
+        """
+        @param text: Draft generated so far; an empty string resets the placeholder.
+        @returns: None
+        """
+        if time.monotonic() >= self._next_update_at:
+            await self._send(text)
+
+    async def finish(self, text: str) -> None:
+        """
+        Show the final draft, posting a new message if editing fails.
+        @param text: Complete draft.
+        @returns: None
+        """
+        if await self._send(text, final=True):
+            return
+        # Rate limited or failed: wait out the back-off once before posting anew
+        await asyncio.sleep(min(max(self._next_update_at - time.monotonic(), 0.0), 5.0))
+        if await self._send(text, final=True):
+            return
+        await self.say(
+            channel=self.channel, thread_ts=self.thread_ts, text=_format_code_block(text)
+        )
+
+    async def supersede(self) -> None:
+        """
+        Replace the partial draft by a note that a newer draft follows.
+        @returns: None
+        """
+        if self.ts is None:
+            return
+        try:
+            await self.client.chat_update(channel=self.channel, ts=self.ts, text=self.SUPERSEDED)
+        except SlackApiError as e:
+            logging.warning(f"Error updating streamed message: {e}")
+
+    async def discard(self) -> None:
+        """
+        Delete the placeholder or partial draft; see ``bot._StreamingReply.discard``.
+        @returns: None
+        """
+        if self.ts is None:
+            return
+        try:
+            await self.client.chat_delete(channel=self.channel, ts=self.ts)
+        except SlackApiError as e:
+            logging.warning(f"Error deleting streamed message: {e}")
+
+    async def _send(self, text: str, final: bool = False) -> bool:
+        body = _format_code_block(text) if text else self.PLACEHOLDER
+        if not final and body == self._last_text:
+            return True
+        if self.ts is None:
+            return False
+        try:
+            await self.client.chat_update(channel=self.channel, ts=self.ts, text=body)
+        except SlackApiError as e:
+            retry_after = 0.0
+            if e.response is not None and e.response.get("error") == "ratelimited":
+                retry_after = float(e.response.headers.get("Retry-After", 1))
+            self._next_update_at = time.monotonic() + max(
+                retry_after, STREAM_UPDATE_INTERVAL_SECONDS
+            )
+            logging.warning(f"Error updating streamed message: {e}")
+            return False
+        self._last_text = body
+        self._next_update_at = time.monotonic() + STREAM_UPDATE_INTERVAL_SECONDS
+        return True
+
+
+async def _accept(draft: Any) -> bool:
+    """
+    Default ``commit`` of the generators: keep every draft.
+    @param draft: Draft or variants that were generated.
+    @returns: True
+    """
+    return True
+
+
+async def _agenerate_variants(
+    history: List[dict],
+    count: int,
+    channel: str,
+    thread_ts: str,
+    say,
+    user_id: str = "",
+    commit: Callable[[List[str]], Awaitable[bool]] = _accept,
+) -> Optional[str]:
+    """
+    Async ``bot._generate_variants``.
+
+    @param history: Complete list of chat messages to send to the model.
+    @param count: Number of variants.
+    @param channel: Slack channel id of the DM.
+    @param thread_ts: Thread to reply in.
+    @param say: Async callable to send a message back to Slack.
+    @param user_id: Slack user the variants are for (for fair queueing).
+    @param commit: Saves the variants to the history; resolves to ``False`` if superseded.
+    @returns: The variants as one numbered text, or ``None`` if superseded.
+    """
+
+    async def on_queued(position: int) -> None:
+        await say(channel=channel, thread_ts=thread_ts, text=_queued_text(position))
+
+    variants = await _acall_llm_choices(_variant_messages(history), count, user_id, on_queued)
+    if not await commit(variants):
+        return None
+    for number, text in enumerate(variants, 1):
+        await say(channel=channel, thread_ts=thread_ts, text=_format_variant(number, text))
+    return format_variants(variants)
+
+
+async def _agenerate_reply(
+    history: List[dict],
+    channel: str,
+    thread_ts: str,
+    say,
+    client,
+    user_id: str = "",
+    is_current: Callable[[], bool] = lambda: True,
+    commit: Callable[[str], Awaitable[bool]] = _accept,
+) -> Optional[str]:
+    """
+    Async ``bot._generate_reply``.
+
+    @param history: Complete list of chat messages to send to the model.
+    @param channel: Slack channel id of the DM.
+    @param thread_ts: Thread to reply in.
+    @param say: Async callable to send a message back to Slack.
+    @param client: Slack AsyncWebClient used to edit the streamed message.
+    @param user_id: Slack user the draft is for (for fair queueing).
+    @param is_current: Whether the draft is still wanted (no newer message).
+    @param commit: Saves the draft to the history; resolves to ``False`` if it was superseded.
+    @returns: The posted draft, or ``None`` if it was superseded.
+    """
+
+    async def on_queued(position: int) -> None:
+        await say(channel=channel, thread_ts=thread_ts, text=_queued_text(position))
+
+    if not LLM_STREAMING:
+        draft = await _acall_llm_with_retry(history, user_id, on_queued)
+        if not await commit(draft):
+            return None
+        # Send as a code block so formatting is preserved, in thread
+        await say(channel=channel, thread_ts=thread_ts, text=_format_code_block(draft))
+        return draft
+
+    reply: Optional[_AsyncStreamingReply] = None
+
+    async def on_admitted() -> None:
+        nonlocal reply
+        reply = await _AsyncStreamingReply.start(client, channel, thread_ts, say)
+
+    async def on_update(text: str) -> None:
+        if not is_current():
+            raise Superseded()
+        await reply.update(text)
+
+    try:
+        draft = await _acall_llm_streaming(history, on_update, user_id, on_queued, on_admitted)
+    except Superseded:
+        await reply.supersede()
+        return None
+    except Exception:
+        # Not admitted (no placeholder yet) or failed: leave no placeholder behind
+        if reply is not None:
+            await reply.discard()
+        raise
+    if not await commit(draft):
+        await reply.supersede()
+        return None
+    await reply.finish(draft)
+    return draft
+
+
+async def _agenerate_cached_reply(
+    history: List[dict],
+    channel: str,
+    thread_ts: str,
+    say,
+    client,
+    user_id: str = "",
+    is_current: Callable[[], bool] = lambda: True,
+    commit: Callable[[str], Awaitable[bool]] = _accept,
+    refresh: bool = False,
+) -> Optional[str]:
+    """
+    Async ``bot._generate_cached_reply``.
+
+    @param history: Complete list of chat messages to send to the model.
+    @param channel: Slack channel id of the DM.
+    @param thread_ts: Thread to reply in.
+    @param say: Async callable to send a message back to Slack.
+    @param client: Slack AsyncWebClient used to edit the streamed message.
+    @param user_id: Slack user the draft is for (for fair queueing).
+    @param is_current: Whether the draft is still wanted (no newer message).
+    @param commit: Saves the draft to the history; resolves to ``False`` if it was superseded.
+    @param refresh: Skip the cache lookup ("genereer opnieuw") and replace the cached draft.
+    @returns: The posted draft, or ``None`` if it was superseded.
+    """
+    key = _response_cache_key(history)
+    draft = None if refresh else _cached_reply(key)
+    if draft is not None:
+        if not await commit(draft):
+            return None
+        await say(
+            channel=channel, thread_ts=thread_ts, text=_format_code_block(draft) + CACHED_NOTE
+        )
+        return draft
+    draft = await _agenerate_reply(
+        history, channel, thread_ts, say, client, user_id, is_current, commit
+    )
+    if draft is not None and key is not None:
+        RESPONSE_CACHE.put(key, draft)
+    return draft
+
+
+async def on_dm_events(event, say, client):
+    """
+    Slack DM message event handler (async mode); see ``bot.on_dm_events``.
+    @param event: Slack event payload dict for the message.
+    @param say: Async callable to send a message back to Slack.
+    @param client: Slack AsyncWebClient (used to edit streamed replies).
+    @returns: None
+    """
+    if not _is_user_message(event):
+        return
+    user_text = event["text"].strip()
+    conversation_id = event.get("thread_ts") or event.get("ts")
+    conv_lock = None
+    started = time.perf_counter()
+    try:
+        if user_text.lower() in HELP_COMMANDS:
+            await say(channel=event["channel"], thread_ts=conversation_id, text=_help_text())
+            return
+
+        # Keep this conversation (and its lock) from being evicted while we work on it
+        conv_lock = TimedLock(
+            await asyncio.to_thread(CONVERSATIONS.pin, conversation_id, _new_conversation_state),
+            STAGE_SECONDS,
+            stage="lock_wait",
+        )
+        text = await asyncio.to_thread(_route_message, conversation_id, conv_lock, user_text)
+        if text is not None:
+            await say(channel=event["channel"], thread_ts=conversation_id, text=text)
+            return
+        await _areply_in_thread(
+            conversation_id,
+            conv_lock,
+            user_text,
+            event["channel"],
+            say,
+            client,
+            event.get("user") or "",
+        )
+    except SchedulerBusy as e:
+        await say(channel=event["channel"], thread_ts=conversation_id, text=BUSY_TEXT)
+        logging.warning(f"Rejected message in conversation {conversation_id}: {e}")
+    except CircuitOpenError as e:
+        await say(channel=event["channel"], thread_ts=conversation_id, text=OUTAGE_TEXT)
+        logging.warning(f"Failed fast in conversation {conversation_id}: {e}")
+    except Exception as e:
+        await say(channel=event["channel"], thread_ts=conversation_id, text=ERROR_TEXT)
+        logging.exception(f"Error generating content: {e}")
+    finally:
+        if conv_lock is not None:
+            await asyncio.to_thread(CONVERSATIONS.unpin, conversation_id)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="handler")
+
+
+def create_app(client: Optional[AsyncWebClient] = None) -> AsyncApp:
+    """
+    Build the async Slack app with the bot's event handlers; see ``bot.create_app``.
+    @param client: Slack AsyncWebClient to use; defaults to one for SLACK_BOT_TOKEN
+    (at SLACK_API_URL if set).
+    @returns: The slack_bolt ``AsyncApp``.
+    @raises: RuntimeError if a required environment variable is missing.
+    """
+    missing = missing_settings()
+    if missing:
+        raise RuntimeError(f"Missing {', '.join(missing)} in environment")
+    if client is None and SLACK_API_URL:
+        client = AsyncWebClient(token=BOT_TOKEN, base_url=SLACK_API_URL)
+    app = AsyncApp(client=client) if client is not None else AsyncApp(token=BOT_TOKEN)
+    app.event("message")(on_dm_events)
+    return app
+
+
+async def _atimed(awaitable: Awaitable[Any]) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    return await awaitable, time.perf_counter() - started
+
+
+async def _awarm_up() -> Dict[str, bool]:
+    """
+    Import the OpenAI SDK and load the tokenizers (in a worker thread), and
+    warm the page cache.
+    @returns: Mapping of page key to whether it was cached within the timeout.
+    """
+    await asyncio.to_thread(importlib.import_module, "openai")
+    await asyncio.to_thread(load_tokenizers, [endpoint.model for endpoint in LLM_MODELS])
+    return await content_fetcher.async_warm_up()
+
+
+async def _amain(started: float) -> None:
+    # A container restart keeps /tmp, so drop a readiness marker from a previous run
+    _mark_ready(False)
+    app, app_seconds = _timed(create_app)
+    handler = AsyncSocketModeHandler(app, APP_TOKEN, ping_interval=10)
+    # Warm the page cache while connecting to Slack, and only report ready once
+    # both are done; a message arriving before that fetches its page itself.
+    # Pages that fail here fall back to reference_content.json until a refresh succeeds.
+    (warmed, warm_up_seconds), (_, connect_seconds) = await asyncio.gather(
+        _atimed(_awarm_up()), _atimed(handler.connect_async())
+    )
+    print(get_boot_message())
+    failed = sorted(key for key, ok in warmed.items() if not ok)
+    if failed:
+        logging.warning(f"Warm-up failed for pages {failed}; using bundled reference content")
+    refresher = asyncio.create_task(content_fetcher.async_refresh_loop())
+    _mark_ready()
+    _record_startup(
+        {
+            "app": app_seconds,
+            "connect": connect_seconds,
+            "warm_up": warm_up_seconds,
+            "ready": time.perf_counter() - started,
+        }
+    )
+    stop = asyncio.Event()
+    # Run the shutdown below on SIGTERM (e.g. a pod shutdown) too
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        refresher.cancel()
+        await handler.close_async()
+        await content_fetcher.aclose_async_client()
+        content_fetcher.shutdown_extraction_pool()
+
+
+def main(started: Optional[float] = None) -> None:
+    """Run the bot on an asyncio event loop (``BOT_MODE=async``).
+
+    @param started: ``time.perf_counter()`` when startup began, for the startup metrics.
+    """
+    asyncio.run(_amain(time.perf_counter() if started is None else started))
@@ -1,107 +1,729 @@
-import json
+import itertools
 import logging
 import os
-import random
+import signal
 import sys
 import time
-from threading import Lock, RLock
-from typing import Any, Dict, List
-
-from slack_bolt import App
-from slack_bolt.adapter.socket_mode import SocketModeHandler
-
-from .prompts import PAGE_TO_DISPLAY_KEY, build_system_prompt, detect_page_key
-
-# --- Model wiring (OpenAI) ---
-try:
-    from openai import (
-        APIConnectionError,
-        APIError,
-        APITimeoutError,
-        OpenAI,
-        RateLimitError,
-    )
-except Exception:
-    print("Install the OpenAI SDK: pip install openai", file=sys.stderr)
-    raise
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from threading import Event, Lock
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from slack_sdk.errors import SlackApiError
+
+from . import content_fetcher
+from .coalescer import MessageCoalescer, Superseded
+from .conversation_backends import create_conversation_store
+from .metrics import CACHE_LOOKUPS, REGISTRY, STAGE_SECONDS, TimedLock, start_http_server
+from .prompt_registry import PromptRegistry
+from .prompts import (
+    PAGE_TO_DISPLAY_KEY,
+    detect_page_key,
+    load_reference,
+    render_focus_prompt,
+    render_system_prompt,
+)
+from .resilience import CircuitBreaker, CircuitOpenError, RetryBudget, RetryPolicy
+from .response_cache import ResponseCache, first_turn_key
+from .router import COMPLETION, FIRST_TOKEN, Endpoint, ModelRouter, parse_endpoints
+from .scheduler import LLMScheduler, SchedulerBusy, Ticket
+from .token_budget import (
+    MESSAGE_OVERHEAD_TOKENS,
+    count_tokens,
+    counted_message,
+    load_tokenizers,
+    parse_budgets,
+    split_for_compaction,
+    strip_token_counts,
+    summary_request,
+)
+from .variants import (
+    VARIANT_INSTRUCTION,
+    format_variants,
+    parse_variant_request,
+    parse_variant_selection,
+)
+from .workers import WorkerPool, serve_worker
 
+# The OpenAI SDK, slack_bolt and trafilatura take seconds to import; they are
+# imported when first needed (see create_app, _client and content_fetcher), so
+# importing this module is cheap and needs no settings, e.g. in tests
+if TYPE_CHECKING:
+    from openai import OpenAI
+    from slack_bolt import App
+    from slack_sdk import WebClient
 
 APP_TOKEN = os.getenv("SLACK_APP_TOKEN")  # xapp-...
 BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")  # xoxb-...
+# Slack Web API base URL (empty = https://slack.com/api/), e.g. for a proxy or a
+# local stand-in; Socket Mode asks this API for its WebSocket URL too
+SLACK_API_URL = os.getenv("SLACK_API_URL", "")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-5-mini")
+# Models to use, best first (default: OPENAI_MODEL); "model@base_url" sends one to
+# another OpenAI-compatible endpoint. Retries fall back to the next model; see router.py
+LLM_MODELS = parse_endpoints(os.getenv("LLM_MODELS", ""), OPENAI_MODEL)
+# Token counting and PROMPT_TOKEN_BUDGETS follow the preferred model
+OPENAI_MODEL = LLM_MODELS[0].model
+# Hedging: share of calls that may get a second request when slower than the
+# model's p95 latency (the cost cap; 0 = off), and the shortest delay before one
+LLM_HEDGE_RATIO = float(os.getenv("LLM_HEDGE_RATIO", "0"))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "2"))
+# Models failing more often than this (over the last 5 minutes) are tried last
+LLM_ROUTER_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
 OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "30"))
 OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
 BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1.0"))
 BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "15.0"))
-HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "10"))
+# Give up instead of waiting when OpenAI asks for a longer Retry-After than this
+LLM_RETRY_AFTER_MAX_SECONDS = float(os.getenv("LLM_RETRY_AFTER_MAX_SECONDS", "60"))
+# Process-wide retry budget: retries per request in the last minute, plus a
+# reserve of retries per minute that is always allowed
+LLM_RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.1"))
+LLM_RETRY_BUDGET_MIN = int(os.getenv("LLM_RETRY_BUDGET_MIN", "3"))
+# Circuit breaker: consecutive provider failures (5xx, timeouts, connection
+# errors) before failing fast (0 = off), and how long before probing again
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RECOVERY_SECONDS = float(os.getenv("LLM_CIRCUIT_RECOVERY_SECONDS", "30"))
+# Admission control for model calls: calls running at once, the organisation's
+# requests/tokens per minute (0 = no limit), calls allowed to wait (served
+# round-robin per user) and how long one may wait
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", "50"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "120"))
+# Completion tokens assumed per call when charging the token budget up front
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "1000"))
+# Quiet period after a message before drafting, so quick follow-ups in the same
+# thread are merged into one turn (0 only merges messages sent mid-generation)
+COALESCE_WINDOW_SECONDS = float(os.getenv("COALESCE_WINDOW_SECONDS", "1.0"))
+# Most variants generated for a request like "3 varianten" (one call with n=k)
+LLM_MAX_VARIANTS = int(os.getenv("LLM_MAX_VARIANTS", "5"))
+# Drafts of identical first requests served from memory (0 = off) and for how long
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "0"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+# Optional cap on messages sent per request (0 = no cap; the token budget applies)
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "0"))
+# Prompt tokens per request (system prompt + summary + recent turns); older turns
+# are folded into a rolling summary. PROMPT_TOKEN_BUDGETS overrides it per model
+# as JSON, e.g. {"gpt-5-mini": 16000}.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+PROMPT_TOKEN_BUDGETS = parse_budgets(os.getenv("PROMPT_TOKEN_BUDGETS", ""))
+# Most recent turns always sent verbatim (the new request and the draft it refers to)
+HISTORY_MIN_RECENT_TURNS = 2
+# Versions of each page's system prompt kept for threads that still use them
+PROMPT_VERSIONS_PER_PAGE = int(os.getenv("PROMPT_VERSIONS_PER_PAGE", "4"))
+# Reference sections (besides the page title/hero) the model is pointed at, picked
+# by relevance to the user's description; 0 points at none (the whole page)
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+# Stream completions into a placeholder message that is edited in place
+LLM_STREAMING = os.getenv("LLM_STREAMING", "false").lower() in {"1", "true", "yes"}
+# Minimum seconds between chat.update calls per message (Slack allows ~1/s sustained)
+STREAM_UPDATE_INTERVAL_SECONDS = float(os.getenv("STREAM_UPDATE_INTERVAL_SECONDS", "1.5"))
+# Conversation store bounds: idle threads and the least recently used ones
+# beyond the entry/byte cap are forgotten (0 disables the TTL or byte cap)
+CONVERSATION_MAX_ENTRIES = int(os.getenv("CONVERSATION_MAX_ENTRIES", "1000"))
+CONVERSATION_IDLE_TTL_SECONDS = float(os.getenv("CONVERSATION_IDLE_TTL_SECONDS", "86400"))
+CONVERSATION_MAX_BYTES = int(os.getenv("CONVERSATION_MAX_BYTES", "0"))
+# Where conversation state lives: empty (in-process), sqlite:///path or redis://host:port/db.
+# A shared store lets several replicas serve the same threads and survives restarts.
+CONVERSATION_STORE_URL = os.getenv("CONVERSATION_STORE_URL", "")
+# "threaded" (slack_bolt App, a thread per event) or "async" (AsyncApp on one event
+# loop; needs the ``async`` extra, i.e. aiohttp)
+BOT_MODE = os.getenv("BOT_MODE", "threaded").lower()
+# Touched once the bot is warmed up and connected; point a readiness probe at it
+READINESS_FILE = os.getenv("READINESS_FILE", "")
+# Serve Prometheus metrics on this port at /metrics (0 = off)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Sharded mode (threaded only): this many worker processes handle the messages,
+# each conversation always in the same one, while this process keeps the Socket
+# Mode connection (0 = handle them here); see workers.py. Limits such as
+# LLM_MAX_CONCURRENCY and the caches apply per worker. Worker i serves its
+# metrics on 127.0.0.1:METRICS_PORT + 1 + i; METRICS_PORT includes them all
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "0"))
+# Messages each worker handles at once, messages queued per worker, and how long
+# a message may wait for room in a full queue before the bot answers "busy"
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "10"))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "100"))
+WORKER_QUEUE_TIMEOUT_SECONDS = float(os.getenv("WORKER_QUEUE_TIMEOUT_SECONDS", "5"))
+
+
+# OpenAI clients per endpoint in LLM_MODELS (None = the default endpoint),
+# created on first use by _client
+_CLIENTS: Dict[Optional[str], "OpenAI"] = {}
+_CLIENTS_LOCK = Lock()
+
+# Per-thread state: page_key + prompt_version + user/assistant turns + summary of
+# older turns + waiting_for_content_description, each with its own lock to prevent race
+# conditions on shared state. State is read, modified and written back (put)
+# while holding that lock.
+CONVERSATIONS = create_conversation_store(
+    CONVERSATION_STORE_URL,
+    max_entries=CONVERSATION_MAX_ENTRIES,
+    idle_ttl_seconds=CONVERSATION_IDLE_TTL_SECONDS,
+    max_bytes=CONVERSATION_MAX_BYTES,
+)
+
+
+# System prompts are shared by all threads on the same page version; threads only
+# store (page_key, prompt_version, sections) and the prompt is added at call time
+PROMPTS = PromptRegistry(
+    load_reference, render_system_prompt, max_versions_per_page=PROMPT_VERSIONS_PER_PAGE
+)
+
+
+# Every model call (drafts and summaries) waits here for a slot; see scheduler.py
+SCHEDULER = LLMScheduler(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+    max_queue=LLM_QUEUE_MAX,
+    queue_timeout_seconds=LLM_QUEUE_TIMEOUT_SECONDS,
+)
+
+
+# Messages waiting for a draft per thread; see coalescer.py
+COALESCER = MessageCoalescer(COALESCE_WINDOW_SECONDS)
 
 
-if not APP_TOKEN or not BOT_TOKEN:
-    print("Missing SLACK_APP_TOKEN or SLACK_BOT_TOKEN in environment", file=sys.stderr)
-    sys.exit(1)
-if not OPENAI_API_KEY:
-    print("Missing OPENAI_API_KEY in environment", file=sys.stderr)
-    sys.exit(1)
+# Retry delays, retry budget and circuit breaker shared by all model calls; see resilience.py
+RETRY_POLICY = RetryPolicy(
+    max_retries=OPENAI_MAX_RETRIES,
+    backoff_base_seconds=BACKOFF_BASE_SECONDS,
+    backoff_max_seconds=BACKOFF_MAX_SECONDS,
+    retry_after_max_seconds=LLM_RETRY_AFTER_MAX_SECONDS,
+    budget=RetryBudget(LLM_RETRY_BUDGET_RATIO, LLM_RETRY_BUDGET_MIN),
+    failure_threshold=LLM_CIRCUIT_FAILURE_THRESHOLD,
+    recovery_seconds=LLM_CIRCUIT_RECOVERY_SECONDS,
+)
 
-# Use client without internal retries; rely on our own retry wrapper for full control
-oai = OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT_SECONDS, max_retries=0)
-app = App(token=BOT_TOKEN)
 
-# Load Slack App Home tab Block Kit view from home.json.
-HOME_VIEW_PATH = os.path.join(os.path.dirname(__file__), "home.json")
-with open(HOME_VIEW_PATH, "r", encoding="utf-8") as f:
-    HOME_VIEW = json.load(f)
+# Model order, per-model latency/error statistics and hedging; see router.py
+ROUTER = ModelRouter(
+    LLM_MODELS,
+    hedge_ratio=LLM_HEDGE_RATIO,
+    hedge_min_delay_seconds=LLM_HEDGE_MIN_DELAY_SECONDS,
+    max_error_rate=LLM_ROUTER_MAX_ERROR_RATE,
+    is_available=lambda endpoint: RETRY_POLICY.available(endpoint.label),
+)
+# Runs the concurrent requests of one call: a hedge and the original, or
+# parallel variants for endpoints that ignore n
+_LLM_POOL = ThreadPoolExecutor(
+    max_workers=max(LLM_MAX_VARIANTS, 2) * (LLM_MAX_CONCURRENCY if LLM_MAX_CONCURRENCY > 0 else 16),
+    thread_name_prefix="llm",
+)
 
-# In-memory per-thread state: page_key + conversation history + waiting_for_content_description
-THREADS: Dict[str, Dict[str, Any]] = {}
 
-# Per-conversation locks to prevent race conditions on shared state
-CONV_LOCKS: Dict[str, RLock] = {}
-CONV_LOCKS_MASTER: Lock = Lock()
+# Drafts of first turns, keyed by their exact messages; see response_cache.py
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS)
 
 
-def _get_conv_lock(conversation_id: str) -> RLock:
-    with CONV_LOCKS_MASTER:
-        lock = CONV_LOCKS.get(conversation_id)
-        if lock is None:
-            lock = RLock()
-            CONV_LOCKS[conversation_id] = lock
-        return lock
+# Metrics served on METRICS_PORT; stage timings and cache lookups live in metrics.py
+LLM_ATTEMPT_SECONDS = REGISTRY.histogram(
+    "content_bot_llm_attempt_seconds",
+    "Duration of each model request (every attempt, hedge and stream)",
+    ["model", "kind", "outcome"],
+)
+LLM_IN_FLIGHT = REGISTRY.gauge(
+    "content_bot_llm_requests_in_flight", "Model requests currently running", ["model"]
+)
+LLM_RETRIES = REGISTRY.counter(
+    "content_bot_llm_retries_total", "Model calls retried, by error class", ["error"]
+)
+PAGE_SELECTIONS = REGISTRY.counter(
+    "content_bot_page_selections_total", "Threads started per page key", ["page"]
+)
+STARTUP_SECONDS = REGISTRY.gauge(
+    "content_bot_startup_seconds",
+    "Duration of each startup phase (app, connect, warm_up; the latter two overlap)"
+    " and from main() until ready",
+    ["phase"],
+)
+REGISTRY.callback(
+    "content_bot_conversations",
+    "Conversations held (stored) and being handled now (active)",
+    lambda: {
+        (state,): CONVERSATIONS.metrics().get(key, 0)
+        for state, key in (("stored", "conversations"), ("active", "pinned"))
+    },
+    ["state"],
+)
+REGISTRY.callback(
+    "content_bot_prompts",
+    "Page versions interned and system prompts rendered by the prompt registry",
+    lambda: {(kind,): PROMPTS.stats()[kind] for kind in ("versions", "rendered")},
+    ["kind"],
+)
+REGISTRY.callback(
+    "content_bot_prompts_bytes",
+    "Approximate size of the interned page versions and rendered system prompts",
+    lambda: PROMPTS.stats()["bytes"],
+)
+REGISTRY.callback(
+    "content_bot_llm_calls",
+    "Model calls holding a scheduler slot (active) or queued for one (waiting)",
+    lambda: {(state,): SCHEDULER.metrics()[state] for state in ("active", "waiting")},
+    ["state"],
+)
+REGISTRY.callback(
+    "content_bot_llm_admissions_total",
+    "Model calls admitted, queued, rejected or timed out by the scheduler",
+    lambda: {
+        (event,): SCHEDULER.metrics()[event]
+        for event in ("admitted", "queued", "rejected", "timeouts")
+    },
+    ["event"],
+    kind="counter",
+)
+REGISTRY.callback(
+    "content_bot_llm_circuit_open",
+    "1 while a model's circuit breaker is open or half-open",
+    lambda: {
+        (model,): int(state != CircuitBreaker.CLOSED)
+        for model, state in RETRY_POLICY.metrics()["circuits"].items()
+    },
+    ["model"],
+)
+REGISTRY.callback(
+    "content_bot_llm_retries_refused_total",
+    "Retries refused by the retry budget",
+    lambda: RETRY_POLICY.metrics()["retries_refused"],
+    kind="counter",
+)
+REGISTRY.callback(
+    "content_bot_llm_hedges_total",
+    "Hedged model requests sent and won",
+    lambda: {
+        ("sent",): ROUTER.metrics()["hedging"]["hedged"],
+        ("won",): ROUTER.metrics()["hedging"]["hedge_wins"],
+    },
+    ["result"],
+    kind="counter",
+)
+REGISTRY.callback(
+    "content_bot_coalesced_messages_total",
+    "Messages received in threads, merged into another turn, or whose draft was superseded",
+    lambda: {
+        (event,): COALESCER.metrics()[event] for event in ("messages", "coalesced", "superseded")
+    },
+    ["event"],
+    kind="counter",
+)
 
 
-def _sleep_with_backoff(attempt_index: int) -> None:
+def _new_conversation_state() -> Dict[str, Any]:
+    return {
+        "page_key": None,
+        "prompt_version": None,
+        "sections": None,
+        "retrieval_query": None,
+        "history": [],
+        "summary": "",
+        "summary_tokens": 0,
+        "waiting_for_content_description": False,
+    }
+
+
+def _use_prompt_version(state: Dict[str, Any], version: str) -> None:
     """
-    @param attempt_index: Zero-based retry attempt index used to compute
-    exponential backoff.
+    Point a thread at a reference version, re-selecting its sections for the
+    description it was given (sections are numbered per version).
+
+    @param state: Conversation state with ``page_key`` set.
+    @param version: Version returned by ``PROMPTS.resolve``.
     @returns: None
     """
-    delay = min(
-        BACKOFF_BASE_SECONDS * (2**attempt_index) + random.uniform(0, 0.5),
-        BACKOFF_MAX_SECONDS,
+    state["prompt_version"] = version
+    query = state.get("retrieval_query")
+    state["sections"] = (
+        PROMPTS.select_sections(state["page_key"], version, query, RETRIEVAL_TOP_K)
+        if query
+        else None
     )
-    time.sleep(delay)
 
 
-def _cap_history(history: List[dict], max_messages: int | None = None) -> List[dict]:
+def _system_messages(state: Dict[str, Any]) -> List[dict]:
+    """
+    Build the thread's system messages: the page's system prompt with the
+    full reference, which is the same for every thread on that page version
+    (so the provider can serve it from its prompt cache), followed by the
+    sections selected for this thread's description, if any.
+
+    If the thread's prompt version is no longer known (e.g. after a restart),
+    the thread moves to the current version and ``state`` is updated; the
+    caller saves it.
+
+    @param state: Conversation state with ``page_key`` set.
+    @returns: One or two system messages.
+    @raises: RuntimeError if no system prompt can be built for the page.
+    """
+    page_key = state["page_key"]
+    version = state.get("prompt_version") or ""
+    prompt = PROMPTS.render(page_key, version)
+    if prompt is None:
+        version = PROMPTS.resolve(page_key)
+        if version is None:
+            raise RuntimeError(f"No system prompt available for page {page_key}")
+        logging.info(
+            f"Prompt version {state.get('prompt_version')} of {page_key} is no longer"
+            f" available; using {version}"
+        )
+        _use_prompt_version(state, version)
+        prompt = PROMPTS.render(page_key, version)
+        if prompt is None:
+            raise RuntimeError(f"No system prompt available for page {page_key}")
+    messages = [{"role": "system", "content": prompt}]
+    headings = PROMPTS.section_headings(page_key, version, state.get("sections"))
+    if headings:
+        messages.append({"role": "system", "content": render_focus_prompt(headings)})
+    return messages
+
+
+def _materialize_messages(state: Dict[str, Any]) -> List[dict]:
+    """
+    Build the message list for the model: the thread's system messages (see
+    ``_system_messages``), the summary of older turns (if any) and its recent
+    user/assistant turns.
+
+    @param state: Conversation state with ``page_key`` set.
+    @returns: Messages to send to the model.
+    @raises: RuntimeError if no system prompt can be built for the page.
+    """
+    messages = _system_messages(state)
+    if state.get("summary"):
+        summary = f"Samenvatting van het eerdere gesprek:\n{state['summary']}"
+        messages.append({"role": "system", "content": summary})
+    # Threads saved before prompts were shared still carry their own system message
+    turns = [m for m in state.get("history", []) if m.get("role") != "system"]
+    return messages + strip_token_counts(turns)
+
+
+def _prompt_token_budget() -> int:
+    return PROMPT_TOKEN_BUDGETS.get(OPENAI_MODEL, PROMPT_TOKEN_BUDGET)
+
+
+def _plan_compaction(
+    conversation_id: str, conv_lock, pending_tokens: int = 0
+) -> Optional[Tuple[List[dict], str]]:
+    """
+    Decide which of a thread's oldest turns no longer fit the prompt-token
+    budget (and ``HISTORY_MAX_MESSAGES``) next to the new user turn.
+
+    @param conversation_id: Thread to compact.
+    @param conv_lock: The thread's lock.
+    @param pending_tokens: Tokens of the new user turn (not in the history yet).
+    @returns: ``(older turns, previous summary)``, or ``None`` if everything fits.
+    """
+    with conv_lock:
+        state = CONVERSATIONS.get(conversation_id, _new_conversation_state)
+        fixed_tokens = (
+            sum(
+                count_tokens(m["content"], OPENAI_MODEL) + MESSAGE_OVERHEAD_TOKENS
+                for m in _system_messages(state)
+            )
+            + state.get("summary_tokens", 0)
+            + pending_tokens
+        )
+        # The new user turn counts as one of the recent turns and messages
+        older, _ = split_for_compaction(
+            state.get("history", []),
+            fixed_tokens,
+            _prompt_token_budget(),
+            OPENAI_MODEL,
+            keep_last=HISTORY_MIN_RECENT_TURNS - 1,
+            max_turns=max(HISTORY_MAX_MESSAGES - 2, 1) if HISTORY_MAX_MESSAGES > 0 else 0,
+        )
+        return (older, state.get("summary", "")) if older else None
+
+
+def _apply_compaction(conversation_id: str, conv_lock, older: List[dict], summary: str) -> None:
+    """
+    Replace a thread's oldest turns by their summary, unless the thread no
+    longer starts with them (e.g. it was reset meanwhile).
+
+    @param conversation_id: Thread to compact.
+    @param conv_lock: The thread's lock.
+    @param older: Turns returned by ``_plan_compaction``.
+    @param summary: The new rolling summary.
+    @returns: None
+    """
+    with conv_lock:
+        state = CONVERSATIONS.get(conversation_id, _new_conversation_state)
+        history = state.get("history", [])
+        if history[: len(older)] != older:
+            return
+        state["history"] = history[len(older) :]
+        state["summary"] = summary
+        state["summary_tokens"] = (
+            count_tokens(summary, OPENAI_MODEL) + MESSAGE_OVERHEAD_TOKENS if summary else 0
+        )
+        CONVERSATIONS.put(conversation_id, state)
+    logging.info(f"Compacted {len(older)} turns of conversation {conversation_id}")
+
+
+def _compact_history(
+    conversation_id: str, conv_lock, user_id: str = "", pending_tokens: int = 0
+) -> None:
+    """
+    Fold the oldest turns of a thread into its rolling summary until the
+    request fits the prompt-token budget (and ``HISTORY_MAX_MESSAGES``).
+
+    The summary is generated without holding the lock; the turns are only
+    removed if the thread still starts with them afterwards. If summarising
+    fails they are dropped, keeping the previous summary.
+
+    @param conversation_id: Thread to compact.
+    @param conv_lock: The thread's lock.
+    @param user_id: Slack user the summary is made for (for fair queueing).
+    @param pending_tokens: Tokens of the new user turn (not in the history yet).
+    @returns: None
+    """
+    plan = _plan_compaction(conversation_id, conv_lock, pending_tokens)
+    if plan is None:
+        return
+    older, previous_summary = plan
+    try:
+        summary = _call_llm_with_retry(summary_request(previous_summary, older), user_id)
+    except (SchedulerBusy, CircuitOpenError) as e:
+        # Too busy (or OpenAI is down) to summarise now; keep the turns and try again next time
+        logging.info(f"Skipped compacting conversation {conversation_id}: {e}")
+        return
+    except Exception as e:
+        logging.exception(f"Error summarising history, dropping {len(older)} turns: {e}")
+        summary = previous_summary
+    _apply_compaction(conversation_id, conv_lock, older, summary)
+
+
+def _use_description(conversation_id: str, conv_lock, user_text: str) -> None:
+    """
+    On the description turn, select the reference sections that match it.
+
+    @param conversation_id: Thread to reply in (page key already chosen).
+    @param conv_lock: The thread's lock.
+    @param user_text: The user's (merged) message.
+    @returns: None
+    """
+    with conv_lock:
+        state = CONVERSATIONS.get(conversation_id, _new_conversation_state)
+        if state.get("waiting_for_content_description") and state.get("prompt_version"):
+            # The description decides which reference sections this thread uses
+            state["retrieval_query"] = user_text
+            _use_prompt_version(state, state["prompt_version"])
+            CONVERSATIONS.put(conversation_id, state)
+
+
+def _use_variant(conversation_id: str, conv_lock, user_text: str) -> None:
+    """
+    On a follow-up like "neem variant 2", keep only that variant of the last
+    draft in the history, so the other variants are no longer sent.
+
+    @param conversation_id: Thread to reply in.
+    @param conv_lock: The thread's lock.
+    @param user_text: The user's (merged) message.
+    @returns: None
+    """
+    number = parse_variant_selection(user_text)
+    if number is None:
+        return
+    with conv_lock:
+        state = CONVERSATIONS.get(conversation_id, _new_conversation_state)
+        history = state.get("history", [])
+        index = next(
+            (i for i in range(len(history) - 1, -1, -1) if history[i].get("role") == "assistant"),
+            None,
+        )
+        variants = history[index].get("variants") if index is not None else None
+        if not variants or not 1 <= number <= len(variants):
+            return
+        history[index] = counted_message("assistant", variants[number - 1], OPENAI_MODEL)
+        CONVERSATIONS.put(conversation_id, state)
+    logging.info(f"Kept variant {number} of {len(variants)} in conversation {conversation_id}")
+
+
+def _request_messages(conversation_id: str, conv_lock, user_text: str) -> List[dict]:
+    """
+    @param conversation_id: Thread to reply in.
+    @param conv_lock: The thread's lock.
+    @param user_text: The new user turn (not in the history until committed).
+    @returns: Messages to send to the model for the thread's next draft.
+    """
+    with conv_lock:
+        state = CONVERSATIONS.get(conversation_id, _new_conversation_state)
+        messages = _materialize_messages(state)
+        CONVERSATIONS.put(conversation_id, state)
+    return messages + [{"role": "user", "content": user_text}]
+
+
+def _last_user_turn(conversation_id: str, conv_lock) -> Optional[str]:
+    """
+    @param conversation_id: Thread to regenerate a draft in.
+    @param conv_lock: The thread's lock.
+    @returns: The user turn of the thread's last draft, or ``None`` if there is none.
+    """
+    with conv_lock:
+        state = CONVERSATIONS.get(conversation_id, _new_conversation_state)
+        history = state.get("history", [])
+    if [message.get("role") for message in history[-2:]] != ["user", "assistant"]:
+        return None
+    return history[-2]["content"]
+
+
+def _without_last_turn(messages: List[dict]) -> List[dict]:
+    """
+    @param messages: Request messages ending with the last user/assistant turn
+    and the repeated user turn.
+    @returns: The messages without that last turn, so the draft is written afresh.
+    """
+    if [message.get("role") for message in messages[-3:-1]] != ["user", "assistant"]:
+        return messages
+    return messages[:-3] + messages[-1:]
+
+
+def _commit_turn(
+    conversation_id: str,
+    conv_lock,
+    seq: int,
+    count: int,
+    user_text: str,
+    draft: str,
+    variants: Optional[List[str]] = None,
+    replace_last: bool = False,
+) -> bool:
+    """
+    Write a user turn and its draft to the history, unless a newer message
+    arrived in the thread meanwhile.
+
+    @param conversation_id: Thread the draft was generated for.
+    @param conv_lock: The thread's lock.
+    @param seq: Coalescer sequence number of the generating message.
+    @param count: Number of pending messages merged into ``user_text``.
+    @param user_text: The (merged) user turn.
+    @param draft: The generated draft (all variants, numbered, for a variant request).
+    @param variants: The separate variants, kept so a follow-up can pick one.
+    @param replace_last: Replace the last user/assistant turn ("genereer opnieuw").
+    @returns: ``True`` if committed; ``False`` if superseded (discard the draft).
+    """
+    with conv_lock:
+        if not COALESCER.commit(conversation_id, seq, count):
+            return False
+        state = CONVERSATIONS.get(conversation_id, _new_conversation_state)
+        history = state.get("history", [])
+        if replace_last and [m.get("role") for m in history[-2:]] == ["user", "assistant"]:
+            del history[-2:]
+        history.append(counted_message("user", user_text, OPENAI_MODEL))
+        assistant = counted_message("assistant", draft, OPENAI_MODEL)
+        if variants:
+            assistant["variants"] = variants
+        history.append(assistant)
+        state["history"] = history
+        state["waiting_for_content_description"] = False
+        CONVERSATIONS.put(conversation_id, state)
+    if count > 1:
+        logging.info(f"Coalesced {count} messages into one turn in conversation {conversation_id}")
+    return True
+
+
+def _reply_in_thread(
+    conversation_id: str,
+    conv_lock,
+    user_text: str,
+    channel: str,
+    say: Callable,
+    client,
+    user_id: str = "",
+) -> None:
+    """
+    Queue the user's message for the thread's next turn and, unless a newer
+    message takes over within ``COALESCE_WINDOW_SECONDS``, post a draft for
+    all pending messages (compacting the history first if needed), or
+    numbered variants when the message asks for several.
+
+    @param conversation_id: Thread to reply in (page key already chosen).
+    @param conv_lock: The thread's lock.
+    @param user_text: The user's message.
+    @param channel: Slack channel id of the DM.
+    @param say: Callable to send a message back to Slack.
+    @param client: Slack WebClient (used to edit streamed replies).
+    @param user_id: Slack user who sent the message (for fair queueing).
+    @returns: None
+    """
+    seq = COALESCER.add(conversation_id, user_text)
+    if not COALESCER.wait(conversation_id, seq):
+        logging.info(f"Message merged into a newer turn of conversation {conversation_id}")
+        return
+    texts = COALESCER.texts(conversation_id)
+    merged = "\n".join(texts)
+    regenerate = merged.strip().lower() in REGENERATE_COMMANDS
+    if regenerate:
+        previous = _last_user_turn(conversation_id, conv_lock)
+        if previous is None:
+            COALESCER.discard(conversation_id, seq)
+            say(channel=channel, thread_ts=conversation_id, text=NOTHING_TO_REGENERATE_TEXT)
+            return
+        # Answer the last request again, replacing its draft
+        merged = previous
+    variant_count = parse_variant_request(merged, LLM_MAX_VARIANTS)
+
+    def commit(draft: str, variants: Optional[List[str]] = None) -> bool:
+        return _commit_turn(
+            conversation_id, conv_lock, seq, len(texts), merged, draft, variants, regenerate
+        )
+
+    try:
+        _use_description(conversation_id, conv_lock, merged)
+        if not regenerate:
+            _use_variant(conversation_id, conv_lock, merged)
+        pending_tokens = count_tokens(merged, OPENAI_MODEL) + MESSAGE_OVERHEAD_TOKENS
+        _compact_history(conversation_id, conv_lock, user_id, pending_tokens)
+        messages = _request_messages(conversation_id, conv_lock, merged)
+        if regenerate:
+            messages = _without_last_turn(messages)
+        if variant_count > 1:
+            draft = _generate_variants(
+                messages,
+                variant_count,
+                channel,
+                conversation_id,
+                say,
+                user_id,
+                commit=lambda variants: commit(format_variants(variants), variants),
+            )
+        else:
+            draft = _generate_cached_reply(
+                messages,
+                channel,
+                conversation_id,
+                say,
+                client,
+                user_id,
+                is_current=lambda: COALESCER.is_current(conversation_id, seq),
+                commit=commit,
+                refresh=regenerate,
+            )
+    except Exception:
+        COALESCER.discard(conversation_id, seq)
+        raise
+    if draft is None:
+        COALESCER.record_superseded()
+        logging.info(f"Discarded a superseded draft in conversation {conversation_id}")
+
+
+def _estimate_call_tokens(messages: List[dict], n: int = 1) -> int:
     """
-    Enforce a maximum number of messages in the conversation history.
-    Preserves the initial system message if present and keeps the most recent
-    messages after that, so the total length is at most ``max_messages``.
+    @param messages: Chat messages of a model call.
+    @param n: Completions requested.
+    @returns: Tokens the call is expected to use, charged to the scheduler up front.
     """
-    if max_messages is None:
-        max_messages = HISTORY_MAX_MESSAGES
-    if not history or max_messages <= 0:
-        return []
-    if history[0].get("role") == "system":
-        system_msg = history[0]
-        tail = history[1:]
-        keep = max_messages - 1
-        if keep <= 0:
-            return [system_msg]
-        return [system_msg] + tail[-keep:]
-    # No system message at index 0; just keep the last max_messages
-    return history[-max_messages:]
+    prompt_tokens = sum(
+        count_tokens(m.get("content") or "", OPENAI_MODEL) + MESSAGE_OVERHEAD_TOKENS
+        for m in messages
+    )
+    return prompt_tokens + n * LLM_EXPECTED_COMPLETION_TOKENS
+
+
+def _queued_text(position: int) -> str:
+    return "Het is even druk, even geduld: je verzoek staat op plek" f" {position} in de wachtrij."
 
 
 def _format_code_block(text: str) -> str:
@@ -114,272 +736,1035 @@ def _format_code_block(text: str) -> str:
     return f"```{safe_text}```"
 
 
-def _call_llm_with_retry(full_messages: List[dict]) -> str:
+# Prompt tokens sent and served from the provider's prompt cache, since start-up
+LLM_USAGE: Dict[str, int] = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+LLM_USAGE_LOCK = Lock()
+REGISTRY.callback(
+    "content_bot_llm_prompt_tokens_total",
+    "Prompt tokens sent (all) and served from the provider's prompt cache (cached)",
+    lambda: {("all",): LLM_USAGE["prompt_tokens"], ("cached",): LLM_USAGE["cached_tokens"]},
+    ["type"],
+    kind="counter",
+)
+
+
+def _record_usage(usage: Any) -> Optional[int]:
+    """
+    Log and accumulate the token usage of one completion, including the
+    prompt tokens the provider served from its prompt cache.
+
+    @param usage: ``usage`` object of a completion (or final stream chunk).
+    @returns: Total tokens of the completion, if reported.
+    """
+    if usage is None:
+        return None
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+    with LLM_USAGE_LOCK:
+        LLM_USAGE["requests"] += 1
+        LLM_USAGE["prompt_tokens"] += prompt_tokens
+        LLM_USAGE["cached_tokens"] += cached_tokens
+        total_prompt, total_cached = LLM_USAGE["prompt_tokens"], LLM_USAGE["cached_tokens"]
+    logging.info(
+        f"LLM usage: {prompt_tokens} prompt tokens, {cached_tokens} cached;"
+        f" cache hit rate since start {total_cached / max(total_prompt, 1):.0%}"
+    )
+    return getattr(usage, "total_tokens", None)
+
+
+def _client(base_url: Optional[str]) -> "OpenAI":
+    """
+    Return the OpenAI client for an endpoint, creating it on first use.
+    @param base_url: Endpoint base URL, or ``None`` for the default (OPENAI_BASE_URL).
+    @returns: The client (shared by all threads).
+    """
+    client = _CLIENTS.get(base_url)
+    if client is not None:
+        return client
+    with _CLIENTS_LOCK:
+        if base_url not in _CLIENTS:
+            from openai import OpenAI
+
+            # Use client without internal retries; rely on our own retry wrapper for full control
+            _CLIENTS[base_url] = OpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=base_url,
+                timeout=OPENAI_TIMEOUT_SECONDS,
+                max_retries=0,
+            )
+        return _CLIENTS[base_url]
+
+
+def _observe_attempt(endpoint: Endpoint, kind: str, started: float, ok: bool) -> None:
+    LLM_ATTEMPT_SECONDS.observe(
+        time.monotonic() - started,
+        model=endpoint.label,
+        kind="stream" if kind == FIRST_TOKEN else "completion",
+        outcome="ok" if ok else "error",
+    )
+
+
+def _retry_delay(err: Exception, attempt_index: int, endpoint: Endpoint) -> Optional[float]:
+    """
+    @param err: Error of attempt ``attempt_index``.
+    @param attempt_index: 0 for the first attempt.
+    @param endpoint: Where the attempt went.
+    @returns: Seconds to wait before retrying (the retry is counted by error
+    class), or ``None`` to give up; see ``RetryPolicy.retry_delay``.
+    """
+    delay = RETRY_POLICY.retry_delay(err, attempt_index, endpoint.label)
+    if delay is not None:
+        LLM_RETRIES.inc(error=type(err).__name__)
+    return delay
+
+
+def _complete(endpoint: Endpoint, messages: List[dict], n: int = 1) -> Any:
+    """
+    @param endpoint: Model and endpoint to call.
+    @param messages: Chat messages to send.
+    @param n: Completions to ask for.
+    @returns: The completion; its latency (or failure) is recorded for routing.
+    """
+    # Only send n when asking for several, so ordinary requests stay unchanged
+    extra = {"n": n} if n > 1 else {}
+    started = time.monotonic()
+    LLM_IN_FLIGHT.inc(model=endpoint.label)
+    try:
+        resp = _client(endpoint.base_url).chat.completions.create(
+            model=endpoint.model,
+            messages=messages,
+            timeout=OPENAI_TIMEOUT_SECONDS,
+            **extra,
+        )
+    except Exception as err:
+        ROUTER.record_error(endpoint, err, COMPLETION)
+        _observe_attempt(endpoint, COMPLETION, started, ok=False)
+        raise
+    finally:
+        LLM_IN_FLIGHT.dec(model=endpoint.label)
+    ROUTER.record(endpoint, time.monotonic() - started, True, COMPLETION)
+    _observe_attempt(endpoint, COMPLETION, started, ok=True)
+    return resp
+
+
+def _record_hedge_loser(future: Future) -> None:
+    # The slower request of a hedged call still costs tokens
+    if not future.cancelled() and future.exception() is None:
+        _record_usage(future.result().usage)
+
+
+def _complete_hedged(
+    endpoint: Endpoint, messages: List[dict], ticket: Ticket, n: int = 1
+) -> Tuple[Any, Endpoint]:
+    """
+    Call ``endpoint``; if it takes longer than its p95 latency, send the call to
+    the next endpoint as well (within the hedge budget) and return the first
+    answer. Without enough latency samples the call is not hedged.
+
+    @param endpoint: Model and endpoint to call first.
+    @param messages: Chat messages to send.
+    @param ticket: Scheduler ticket of the call; a hedge is charged to it.
+    @param n: Completions to ask for.
+    @returns: The first successful completion and the endpoint that gave it.
+    @raises: The original request's error if both requests fail.
+    """
+    delay = ROUTER.hedge_delay(endpoint)
+    if delay is None:
+        return _complete(endpoint, messages, n), endpoint
+    first = _LLM_POOL.submit(_complete, endpoint, messages, n)
+    try:
+        return first.result(timeout=delay), endpoint
+    except FuturesTimeoutError:
+        pass
+    backup = ROUTER.start_hedge(endpoint)
+    if backup is None:
+        return first.result(), endpoint
+    logging.info(f"Hedging a call to {endpoint.label} slower than {delay:.1f}s with {backup.label}")
+    SCHEDULER.charge(ticket)
+    second = _LLM_POOL.submit(_complete, backup, messages, n)
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    ROUTER.record_hedge_win()
+                for other in pending:
+                    other.add_done_callback(_record_hedge_loser)
+                return future.result(), backup if future is second else endpoint
+    raise first.exception() or second.exception()
+
+
+def _complete_choices(
+    endpoint: Endpoint, messages: List[dict], ticket: Ticket, n: int
+) -> Tuple[List[Any], Endpoint]:
+    """
+    Get ``n`` completions: one request with ``n`` if the endpoint honours it,
+    topped up with parallel single requests if it does not.
+
+    @param endpoint: Model and endpoint to call first.
+    @param messages: Chat messages to send.
+    @param ticket: Scheduler ticket of the call; extra requests are charged to it.
+    @param n: Completions wanted.
+    @returns: The responses (together holding at least ``n`` choices) and the
+    endpoint that answered.
+    """
+    responses: List[Any] = []
+    answered_by = endpoint
+    missing = n
+    if n == 1 or ROUTER.supports_n(endpoint):
+        resp, answered_by = _complete_hedged(endpoint, messages, ticket, n)
+        responses.append(resp)
+        missing = n - len(resp.choices)
+        if missing > 0:
+            ROUTER.record_without_n(answered_by)
+    if missing > 0:
+        # Admission paid for one request; charge the others
+        for _ in range(missing if responses else missing - 1):
+            SCHEDULER.charge(ticket)
+        futures = [_LLM_POOL.submit(_complete, answered_by, messages) for _ in range(missing)]
+        responses.extend(future.result() for future in futures)
+    return responses, answered_by
+
+
+def _call_llm_choices(
+    full_messages: List[dict],
+    n: int,
+    user_id: str = "",
+    on_queued: Optional[Callable[[int], None]] = None,
+) -> List[str]:
     """
     @param full_messages: Complete list of chat messages to send to the model,
     including system and conversation history.
+    @param n: Completions wanted (variants of the same request).
+    @param user_id: Slack user the call is made for; waiting calls are
+    served round-robin per user.
+    @param on_queued: Called with the queue position if the call has to wait.
+    @returns: ``n`` assistant responses as stripped strings.
+    @raises: APIError, APIConnectionError, RateLimitError, APITimeoutError on
+    terminal failures after retries; SchedulerBusy if the LLM queue is full
+    or the call waited too long in it;
+    CircuitOpenError while the provider is considered down.
+    """
+    with SCHEDULER.slot(user_id, _estimate_call_tokens(full_messages, n), on_queued) as ticket:
+        for attempt_index in itertools.count():
+            if attempt_index:
+                # Retries count against the rate limits too
+                SCHEDULER.charge(ticket)
+            endpoint = ROUTER.endpoint_for(attempt_index)
+            RETRY_POLICY.before_attempt(attempt_index, endpoint.label)
+            try:
+                responses, answered_by = _complete_choices(endpoint, full_messages, ticket, n)
+                RETRY_POLICY.on_success(answered_by.label)
+                used = [_record_usage(resp.usage) for resp in responses]
+                ticket.used_tokens = sum(u or 0 for u in used) if any(used) else None
+                choices = [choice for resp in responses for choice in resp.choices]
+                return [(choice.message.content or "").strip() for choice in choices[:n]]
+            except Exception as err:
+                delay = _retry_delay(err, attempt_index, endpoint)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+
+def _call_llm_with_retry(
+    full_messages: List[dict],
+    user_id: str = "",
+    on_queued: Optional[Callable[[int], None]] = None,
+) -> str:
+    """
+    @param full_messages: Complete list of chat messages to send to the model,
+    including system and conversation history.
+    @param user_id: Slack user the call is made for; waiting calls are
+    served round-robin per user.
+    @param on_queued: Called with the queue position if the call has to wait.
+    @returns: Assistant response content as a stripped string.
+    @raises: See ``_call_llm_choices``.
+    """
+    return _call_llm_choices(full_messages, 1, user_id, on_queued)[0]
+
+
+def _call_llm_streaming(
+    full_messages: List[dict],
+    on_update: Callable[[str], None],
+    user_id: str = "",
+    on_queued: Optional[Callable[[int], None]] = None,
+    on_admitted: Optional[Callable[[], None]] = None,
+) -> str:
+    """
+    Stream a completion, reporting the text generated so far after each chunk.
+
+    Retries go through the same ``RETRY_POLICY`` as ``_call_llm_with_retry``.
+    A stream that fails midway is restarted from scratch; its partial text is
+    discarded (``on_update`` is called with an empty string) and never reaches
+    the history.
+
+    @param full_messages: Complete list of chat messages to send to the model.
+    @param on_update: Called with the accumulated text whenever it grows.
+    @param user_id: Slack user the call is made for; waiting calls are
+    served round-robin per user.
+    @param on_queued: Called with the queue position if the call has to wait.
+    @param on_admitted: Called once the scheduler has admitted the call.
     @returns: Assistant response content as a stripped string.
     @raises: APIError, APIConnectionError, RateLimitError, APITimeoutError on
-    terminal failures after retries.
+    terminal failures after retries; SchedulerBusy if the LLM queue is full
+    or the call waited too long in it;
+    CircuitOpenError while the provider is considered down.
+    """
+    with SCHEDULER.slot(user_id, _estimate_call_tokens(full_messages), on_queued) as ticket:
+        if on_admitted is not None:
+            on_admitted()
+        for attempt_index in itertools.count():
+            if attempt_index:
+                # Retries count against the rate limits too
+                SCHEDULER.charge(ticket)
+            endpoint = ROUTER.endpoint_for(attempt_index)
+            RETRY_POLICY.before_attempt(attempt_index, endpoint.label)
+            parts: List[str] = []
+            started = time.monotonic()
+            LLM_IN_FLIGHT.inc(model=endpoint.label)
+            try:
+                stream = _client(endpoint.base_url).chat.completions.create(
+                    model=endpoint.model,
+                    messages=full_messages,
+                    timeout=OPENAI_TIMEOUT_SECONDS,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                # Closing the stream ends the response, also when the draft is
+                # superseded or fails midway, so the provider stops generating
+                with stream:
+                    for chunk in stream:
+                        if not chunk.choices:
+                            # The final chunk carries only the usage
+                            ticket.used_tokens = _record_usage(chunk.usage)
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if not delta:
+                            continue
+                        if not parts:
+                            first_token_seconds = time.monotonic() - started
+                            ROUTER.record(endpoint, first_token_seconds, True, FIRST_TOKEN)
+                            logging.info(
+                                f"LLM time to first token: {first_token_seconds:.2f}s"
+                                f" ({endpoint.label}, attempt {attempt_index + 1})"
+                            )
+                        parts.append(delta)
+                        on_update("".join(parts))
+                RETRY_POLICY.on_success(endpoint.label)
+                _observe_attempt(endpoint, FIRST_TOKEN, started, ok=True)
+                logging.info(f"LLM stream completed in {time.monotonic() - started:.2f}s")
+                return "".join(parts).strip()
+            except Superseded:
+                # Not a failure: tokens were arriving, the draft is just no longer wanted
+                RETRY_POLICY.on_success(endpoint.label)
+                raise
+            except Exception as err:
+                # Includes httpx errors from a connection dropped mid-stream
+                ROUTER.record_error(endpoint, err, FIRST_TOKEN)
+                _observe_attempt(endpoint, FIRST_TOKEN, started, ok=False)
+                delay = _retry_delay(err, attempt_index, endpoint)
+                if delay is None:
+                    raise
+                if parts:
+                    logging.warning(
+                        f"LLM stream failed after {len(''.join(parts))} chars; restarting: {err}"
+                    )
+                    on_update("")
+            finally:
+                LLM_IN_FLIGHT.dec(model=endpoint.label)
+            time.sleep(delay)
+
+
+class _StreamingReply:
+    """
+    A Slack message that is edited in place as a streamed draft grows.
+
+    Updates are throttled to one per ``STREAM_UPDATE_INTERVAL_SECONDS``; when
+    Slack answers ``ratelimited`` no updates are sent until its Retry-After
+    has passed. Every update goes through ``_format_code_block``.
     """
-    last_error: Exception | None = None
-    for attempt_index in range(OPENAI_MAX_RETRIES + 1):
+
+    PLACEHOLDER = "_Bezig met schrijven…_"
+    SUPERSEDED = "_Vervangen door een nieuwe versie die ook je laatste bericht meeneemt._"
+
+    def __init__(self, client, channel: str, thread_ts: str, say: Callable) -> None:
+        self.client = client
+        self.channel = channel
+        self.say = say
+        self.thread_ts = thread_ts
+        resp = say(channel=channel, thread_ts=thread_ts, text=self.PLACEHOLDER)
+        self.ts: Optional[str] = resp.get("ts") if resp is not None else None
+        self._next_update_at = 0.0
+        self._last_text: Optional[str] = None
+
+    def update(self, text: str) -> None:
+        """
+        @param text: Draft generated so far; an empty string resets the placeholder.
+        @returns: None
+        """
+        if time.monotonic() >= self._next_update_at:
+            self._send(text)
+
+    def finish(self, text: str) -> None:
+        """
+        Show the final draft, posting a new message if editing fails.
+        @param text: Complete draft.
+        @returns: None
+        """
+        if self._send(text, final=True):
+            return
+        # Rate limited or failed: wait out the back-off once before posting anew
+        time.sleep(min(max(self._next_update_at - time.monotonic(), 0.0), 5.0))
+        if self._send(text, final=True):
+            return
+        self.say(channel=self.channel, thread_ts=self.thread_ts, text=_format_code_block(text))
+
+    def supersede(self) -> None:
+        """
+        Replace the partial draft by a note that a newer draft follows.
+        @returns: None
+        """
+        if self.ts is None:
+            return
         try:
-            resp = oai.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=full_messages,
-                timeout=OPENAI_TIMEOUT_SECONDS,
+            self.client.chat_update(channel=self.channel, ts=self.ts, text=self.SUPERSEDED)
+        except SlackApiError as e:
+            logging.warning(f"Error updating streamed message: {e}")
+
+    def discard(self) -> None:
+        """
+        Delete the placeholder or partial draft (the call failed; the caller
+        posts the error reply).
+        @returns: None
+        """
+        if self.ts is None:
+            return
+        try:
+            self.client.chat_delete(channel=self.channel, ts=self.ts)
+        except SlackApiError as e:
+            logging.warning(f"Error deleting streamed message: {e}")
+
+    def _send(self, text: str, final: bool = False) -> bool:
+        body = _format_code_block(text) if text else self.PLACEHOLDER
+        if not final and body == self._last_text:
+            return True
+        if self.ts is None:
+            return False
+        try:
+            self.client.chat_update(channel=self.channel, ts=self.ts, text=body)
+        except SlackApiError as e:
+            retry_after = 0.0
+            if e.response is not None and e.response.get("error") == "ratelimited":
+                retry_after = float(e.response.headers.get("Retry-After", 1))
+            self._next_update_at = time.monotonic() + max(
+                retry_after, STREAM_UPDATE_INTERVAL_SECONDS
             )
-            content = resp.choices[0].message.content or ""
-            return content.strip()
-        except (APITimeoutError, APIConnectionError, RateLimitError) as err:
-            last_error = err
-        except APIError as err:
-            # Retry on 5xx only
-            status = getattr(err, "status_code", None)
-            if status is not None and 500 <= int(status) < 600:
-                last_error = err
-            else:
-                raise
+            logging.warning(f"Error updating streamed message: {e}")
+            return False
+        self._last_text = body
+        self._next_update_at = time.monotonic() + STREAM_UPDATE_INTERVAL_SECONDS
+        return True
+
+
+def _generate_reply(
+    history: List[dict],
+    channel: str,
+    thread_ts: str,
+    say: Callable,
+    client,
+    user_id: str = "",
+    is_current: Callable[[], bool] = lambda: True,
+    commit: Callable[[str], bool] = lambda draft: True,
+) -> Optional[str]:
+    """
+    Generate a draft for ``history`` and post it in the thread as a code block.
+
+    With ``LLM_STREAMING`` the draft appears in a placeholder message, posted
+    once the call is admitted, that is updated while tokens arrive; otherwise
+    it is posted once complete. A
+    stream is abandoned as soon as ``is_current`` turns false; a finished
+    draft is only posted if ``commit`` accepts it.
+
+    @param history: Complete list of chat messages to send to the model.
+    @param channel: Slack channel id of the DM.
+    @param thread_ts: Thread to reply in.
+    @param say: Callable to send a message back to Slack.
+    @param client: Slack WebClient used to edit the streamed message.
+    @param user_id: Slack user the draft is for (for fair queueing).
+    @param is_current: Whether the draft is still wanted (no newer message).
+    @param commit: Saves the draft to the history; returns ``False`` if it was superseded.
+    @returns: The posted draft, or ``None`` if it was superseded.
+    """
+
+    def on_queued(position: int) -> None:
+        say(channel=channel, thread_ts=thread_ts, text=_queued_text(position))
+
+    if not LLM_STREAMING:
+        draft = _call_llm_with_retry(history, user_id, on_queued)
+        if not commit(draft):
+            return None
+        # Send as a code block so formatting is preserved, in thread
+        say(channel=channel, thread_ts=thread_ts, text=_format_code_block(draft))
+        return draft
+
+    reply: Optional[_StreamingReply] = None
+
+    def on_admitted() -> None:
+        nonlocal reply
+        reply = _StreamingReply(client, channel, thread_ts, say)
+
+    def on_update(text: str) -> None:
+        if not is_current():
+            raise Superseded()
+        reply.update(text)
+
+    try:
+        draft = _call_llm_streaming(history, on_update, user_id, on_queued, on_admitted)
+    except Superseded:
+        reply.supersede()
+        return None
+    except Exception:
+        # Not admitted (no placeholder yet) or failed: leave no placeholder behind
+        if reply is not None:
+            reply.discard()
+        raise
+    if not commit(draft):
+        reply.supersede()
+        return None
+    reply.finish(draft)
+    return draft
+
+
+def _response_cache_key(messages: List[dict]) -> Optional[str]:
+    """
+    @param messages: Complete list of chat messages of a draft request.
+    @returns: The response cache key if the request is a first turn and the
+    cache is on, otherwise ``None``.
+    """
+    if not RESPONSE_CACHE.enabled:
+        return None
+    return first_turn_key(messages, [endpoint.label for endpoint in LLM_MODELS])
+
+
+def _cached_reply(key: Optional[str]) -> Optional[str]:
+    """
+    @param key: From ``_response_cache_key``.
+    @returns: The cached draft for ``key``, or ``None`` on a miss.
+    """
+    if key is None:
+        return None
+    draft = RESPONSE_CACHE.get(key)
+    CACHE_LOOKUPS.inc(cache="response", result="miss" if draft is None else "hit")
+    if draft is not None:
+        logging.info(
+            f"Served a draft from the response cache (hit rate {RESPONSE_CACHE.hit_rate():.0%})"
+        )
+    return draft
+
+
+def _generate_cached_reply(
+    history: List[dict],
+    channel: str,
+    thread_ts: str,
+    say: Callable,
+    client,
+    user_id: str = "",
+    is_current: Callable[[], bool] = lambda: True,
+    commit: Callable[[str], bool] = lambda draft: True,
+    refresh: bool = False,
+) -> Optional[str]:
+    """
+    Like ``_generate_reply``, but answer a first turn that was asked before
+    from the response cache, marked as such, and cache new first-turn drafts.
+
+    @param history: Complete list of chat messages to send to the model.
+    @param channel: Slack channel id of the DM.
+    @param thread_ts: Thread to reply in.
+    @param say: Callable to send a message back to Slack.
+    @param client: Slack WebClient used to edit the streamed message.
+    @param user_id: Slack user the draft is for (for fair queueing).
+    @param is_current: Whether the draft is still wanted (no newer message).
+    @param commit: Saves the draft to the history; returns ``False`` if it was superseded.
+    @param refresh: Skip the cache lookup ("genereer opnieuw") and replace the cached draft.
+    @returns: The posted draft, or ``None`` if it was superseded.
+    """
+    key = _response_cache_key(history)
+    draft = None if refresh else _cached_reply(key)
+    if draft is not None:
+        if not commit(draft):
+            return None
+        say(channel=channel, thread_ts=thread_ts, text=_format_code_block(draft) + CACHED_NOTE)
+        return draft
+    draft = _generate_reply(history, channel, thread_ts, say, client, user_id, is_current, commit)
+    if draft is not None and key is not None:
+        RESPONSE_CACHE.put(key, draft)
+    return draft
+
+
+def _format_variant(number: int, text: str) -> str:
+    return f"*Variant {number}*\n{_format_code_block(text)}"
+
+
+def _variant_messages(history: List[dict]) -> List[dict]:
+    # After the user's turn, so the cached prompt prefix is unchanged
+    return history + [{"role": "system", "content": VARIANT_INSTRUCTION}]
+
+
+def _generate_variants(
+    history: List[dict],
+    count: int,
+    channel: str,
+    thread_ts: str,
+    say: Callable,
+    user_id: str = "",
+    commit: Callable[[List[str]], bool] = lambda variants: True,
+) -> Optional[str]:
+    """
+    Generate ``count`` variants in one call (``n``) and post each as a
+    numbered reply in the thread. Variants are not streamed.
+
+    @param history: Complete list of chat messages to send to the model.
+    @param count: Number of variants.
+    @param channel: Slack channel id of the DM.
+    @param thread_ts: Thread to reply in.
+    @param say: Callable to send a message back to Slack.
+    @param user_id: Slack user the variants are for (for fair queueing).
+    @param commit: Saves the variants to the history; returns ``False`` if superseded.
+    @returns: The variants as one numbered text, or ``None`` if superseded.
+    """
+
+    def on_queued(position: int) -> None:
+        say(channel=channel, thread_ts=thread_ts, text=_queued_text(position))
 
-        if attempt_index < OPENAI_MAX_RETRIES:
-            _sleep_with_backoff(attempt_index)
+    variants = _call_llm_choices(_variant_messages(history), count, user_id, on_queued)
+    if not commit(variants):
+        return None
+    for number, text in enumerate(variants, 1):
+        say(channel=channel, thread_ts=thread_ts, text=_format_variant(number, text))
+    return format_variants(variants)
 
-    assert last_error is not None
-    raise last_error
 
+# Commands answered without generating a draft
+HELP_COMMANDS = {"help", "hi", "hello", "hallo", "hulp"}
+RESET_COMMANDS = {"reset", "new", "start over", "opnieuw", "nieuw"}
+REFRESH_COMMANDS = {"ververs", "refresh", "bijwerken"}
+# Write the last draft again, bypassing the response cache
+REGENERATE_COMMANDS = {"genereer opnieuw", "opnieuw genereren", "regenerate"}
+ERROR_TEXT = "Sorry, I couldn’t generate that. Please try again."
+BUSY_TEXT = (
+    "Het is op dit moment te druk om je verzoek aan te nemen. Probeer het over een"
+    " minuut opnieuw."
+)
+NOTHING_TO_REGENERATE_TEXT = "Er is in deze thread nog geen tekst om opnieuw te genereren."
+# Appended to a draft served from the response cache
+CACHED_NOTE = (
+    "\n_Dit is een eerder gegenereerd antwoord op hetzelfde verzoek. Typ"
+    " `genereer opnieuw` voor een nieuwe versie._"
+)
+OUTAGE_TEXT = (
+    "De AI-dienst is op dit moment niet bereikbaar, dus ik kan even geen tekst"
+    " schrijven. Probeer het over een paar minuten opnieuw."
+)
 
-@app.event("message")
-def on_dm_events(event, say):
+
+def _keywords_overview() -> str:
+    return ", ".join(f"`{PAGE_TO_DISPLAY_KEY[page]}`" for page in PAGE_TO_DISPLAY_KEY.keys())
+
+
+def _help_text() -> str:
+    return (
+        "Welkom! Ik genereer content voor je website en LinkedIn.\n\n"
+        "Begin door een pagina te kiezen waarvoor we content gaan"
+        " maken. Je kunt kiezen uit de volgende keywords:\n"
+        f"{_keywords_overview()}\n\n"
+        "Vertel me daarna kort wat je nodig hebt. Geef in elk geval:\n"
+        "- Doelgroep\n"
+        "- Doel\n"
+        "- Belangrijke punten (moeten erin)\n"
+        "- Toon en stijl\n"
+        "- Lengte/format (bijv. 3–7 zinnen)\n\n"
+        "Vervolgens kun je de output iteratief verbeteren door te"
+        " reageren (bijv. 'korter', 'formeler', 'voeg CTA toe', '3 varianten'). "
+        "Typ 'genereer opnieuw' voor een nieuwe versie van de laatste tekst, "
+        "'reset' om opnieuw te beginnen, of 'ververs' om de"
+        " nieuwste inhoud van de website te gebruiken."
+    )
+
+
+def _route_message(conversation_id: str, conv_lock, user_text: str) -> Optional[str]:
+    """
+    Apply a message's commands and page selection to the thread's state.
+
+    Shared by the threaded and the async handler; it blocks on the
+    conversation store, so the async handler runs it in a worker thread.
+
+    @param conversation_id: Thread the message belongs to (pinned by the caller).
+    @param conv_lock: The thread's lock.
+    @param user_text: The user's message.
+    @returns: Text to answer with, or ``None`` when a draft should be generated.
+    """
+    # Reset current thread context on demand
+    if user_text.lower() in RESET_COMMANDS:
+        with conv_lock:
+            CONVERSATIONS.put(conversation_id, _new_conversation_state())
+        COALESCER.discard(conversation_id)
+        return (
+            "Context gewist voor deze thread. Start met een nieuw"
+            " keyword om content te genereren. Kies uit:  "
+            f"{_keywords_overview()}."
+        )
+
+    # Move the thread to the latest site content on demand; threads keep the
+    # reference they started with otherwise
+    if user_text.lower() in REFRESH_COMMANDS:
+        with conv_lock:
+            state = CONVERSATIONS.get(conversation_id, _new_conversation_state)
+            page_key = state.get("page_key")
+            version = PROMPTS.resolve(page_key) if page_key else None
+            if version is not None:
+                previous_version = state.get("prompt_version")
+                _use_prompt_version(state, version)
+                CONVERSATIONS.put(conversation_id, state)
+        if not page_key:
+            return "Er is nog geen pagina gekozen in deze thread. Start met een keyword."
+        if version is None:
+            return "Ik kon de pagina-inhoud nu niet ophalen. Probeer het later opnieuw."
+        if version == previous_version:
+            return "De referentie-inhoud is al up-to-date."
+        return "Referentie-inhoud bijgewerkt naar de nieuwste versie van de pagina."
+
+    # Initialize or update thread state
+    with conv_lock:
+        state = CONVERSATIONS.get(conversation_id, _new_conversation_state)
+
+    # Check if we're waiting for content description
+    if state.get("waiting_for_content_description", False):
+        # User provided content description, now generate content
+        if state.get("page_key"):
+            return None
+        # Missing page key; reset waiting flag and prompt for a keyword again
+        with conv_lock:
+            state = CONVERSATIONS.get(conversation_id, _new_conversation_state)
+            state["waiting_for_content_description"] = False
+            CONVERSATIONS.put(conversation_id, state)
+        return (
+            "Ik kon het opgegeven keyword niet vinden. "
+            "Kies eerst een keyword en probeer het opnieuw.\n\n"
+            f"Beschikbare keywords: {_keywords_overview()}"
+        )
+
+    # Continue existing conversation (page key already set, not waiting for description)
+    if state.get("page_key"):
+        return None
+
+    detected_page = detect_page_key(user_text)
+    if not detected_page:
+        # No page key detected, ask for clarification (NL) and show
+        # available keywords
+        return (
+            "Ik kon geen keyword herkennen. Start je bericht met een"
+            " keyword om de pagina te kiezen waarvoor we content gaan"
+            " genereren.\n\n"
+            f"Herkende keywords: {_keywords_overview()}"
+        )
+
+    version = PROMPTS.resolve(detected_page)
+    # If we couldn't build content for the detected page, inform the
+    # user and ask to pick another keyword
+    if version is None:
+        return (
+            "Ik kon geen content vinden voor deze pagina. Kies"
+            " alsjeblieft een ander keyword.\n\n"
+            f"Beschikbare keywords: {_keywords_overview()}"
+        )
+    with conv_lock:
+        state = CONVERSATIONS.get(conversation_id, _new_conversation_state)
+        state["page_key"] = detected_page
+        state["prompt_version"] = version
+        state["waiting_for_content_description"] = True
+        CONVERSATIONS.put(conversation_id, state)
+    PAGE_SELECTIONS.inc(page=detected_page)
+
+    # Ask for content description (NL) with only a small title difference
+    page_name = detected_page.lower().replace("_", " ")
+    is_linkedin = detected_page == "LINKEDIN"
+    titel = "een LinkedIn-post" if is_linkedin else f"content voor de pagina `{page_name}`"
+    return (
+        f"Hoi! Ik help je met het schrijven van {titel}.\n\n"
+        "Vertel kort waar de content over moet gaan. Geef bij voorkeur:\n"
+        "- Doelgroep\n"
+        "- Doel (bijv. informeren, aankondigen, uitnodigen tot contact)\n"
+        "- Belangrijke punten/links (moeten erin)\n"
+        "- Toon en stijl (bijv. nuchter, professioneel, vriendelijk)\n"
+        "- Lengte/format (bijv. 3–7 zinnen, met CTA)\n\n"
+        "Je kunt de output daarna iteratief verbeteren door te"
+        " reageren (bijv. 'korter', 'formeler/menselijker',"
+        " 'voeg CTA toe', '3 varianten', en daarna 'variant 2 maar korter')."
+    )
+
+
+def _is_user_message(event: Dict[str, Any]) -> bool:
+    """
+    @param event: Slack message event payload.
+    @returns: Whether it is a non-empty DM from a user (not an edit or a bot).
+    """
+    if event.get("channel_type") != "im" or event.get("subtype") or event.get("bot_id"):
+        return False
+    return bool((event.get("text") or "").strip())
+
+
+def on_dm_events(event, say, client):
     """
     Slack DM message event handler.
     @param event: Slack event payload dict for the message.
     @param say: Callable to send a message back to Slack.
+    @param client: Slack WebClient (used to edit streamed replies).
     @returns: None
     """
-    if event.get("channel_type") != "im" or event.get("subtype") or event.get("bot_id"):
-        return
-    user_text = (event.get("text") or "").strip()
-    if not user_text:
+    if not _is_user_message(event):
         return
+    user_text = event["text"].strip()
+    # Determine conversation id: use the thread if present, otherwise start
+    # a new thread at this message's ts
+    conversation_id = event.get("thread_ts") or event.get("ts")
+    conv_lock = None
+    started = time.perf_counter()
     try:
-        # Determine conversation id: use the thread if present, otherwise start
-        # a new thread at this message's ts
-        conversation_id = event.get("thread_ts") or event.get("ts")
-        conv_lock = _get_conv_lock(conversation_id)
-
         # Quick help
-        if user_text.lower() in {"help", "hi", "hello", "hallo", "hulp"}:
-            keywords_overview = ", ".join(
-                f"`{PAGE_TO_DISPLAY_KEY[page]}`" for page in PAGE_TO_DISPLAY_KEY.keys()
-            )
-            say(
-                channel=event["channel"],
-                thread_ts=conversation_id,
-                text=(
-                    "Welkom! Ik genereer content voor je website en LinkedIn.\n\n"
-                    "Begin door een pagina te kiezen waarvoor we content gaan"
-                    " maken. Je kunt kiezen uit de volgende keywords:\n"
-                    f"{keywords_overview}\n\n"
-                    "Vertel me daarna kort wat je nodig hebt. Geef in elk geval:\n"
-                    "- Doelgroep\n"
-                    "- Doel\n"
-                    "- Belangrijke punten (moeten erin)\n"
-                    "- Toon en stijl\n"
-                    "- Lengte/format (bijv. 3–7 zinnen)\n\n"
-                    "Vervolgens kun je de output iteratief verbeteren door te"
-                    " reageren (bijv. 'korter', 'formeler', 'voeg CTA toe'). "
-                    "Typ 'reset' om opnieuw te beginnen."
-                ),
-            )
+        if user_text.lower() in HELP_COMMANDS:
+            say(channel=event["channel"], thread_ts=conversation_id, text=_help_text())
             return
 
-        # Reset current thread context on demand
-        if user_text.lower() in {"reset", "new", "start over", "opnieuw", "nieuw"}:
-            with conv_lock:
-                THREADS[conversation_id] = {
-                    "page_key": None,
-                    "history": [],
-                    "waiting_for_content_description": False,
-                    "page_content": None,
-                }
-            keywords_overview = ", ".join(
-                f"`{PAGE_TO_DISPLAY_KEY[page]}`" for page in PAGE_TO_DISPLAY_KEY.keys()
-            )
-            say(
-                channel=event["channel"],
-                thread_ts=conversation_id,
-                text=(
-                    "Context gewist voor deze thread. Start met een nieuw"
-                    " keyword om content te genereren. Kies uit:  "
-                    f"{keywords_overview}."
-                ),
-            )
+        # Keep this conversation (and its lock) from being evicted while we work on it
+        conv_lock = TimedLock(
+            CONVERSATIONS.pin(conversation_id, _new_conversation_state),
+            STAGE_SECONDS,
+            stage="lock_wait",
+        )
+        text = _route_message(conversation_id, conv_lock, user_text)
+        if text is not None:
+            say(channel=event["channel"], thread_ts=conversation_id, text=text)
             return
+        _reply_in_thread(
+            conversation_id,
+            conv_lock,
+            user_text,
+            event["channel"],
+            say,
+            client,
+            event.get("user") or "",
+        )
+    except SchedulerBusy as e:
+        say(channel=event["channel"], thread_ts=conversation_id, text=BUSY_TEXT)
+        logging.warning(f"Rejected message in conversation {conversation_id}: {e}")
+    except CircuitOpenError as e:
+        say(channel=event["channel"], thread_ts=conversation_id, text=OUTAGE_TEXT)
+        logging.warning(f"Failed fast in conversation {conversation_id}: {e}")
+    except Exception as e:
+        say(
+            channel=event["channel"],
+            thread_ts=event.get("thread_ts") or event.get("ts"),
+            text=ERROR_TEXT,
+        )
+        logging.exception(f"Error generating content: {e}")
+    finally:
+        if conv_lock is not None:
+            CONVERSATIONS.unpin(conversation_id)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="handler")
 
-        # Initialize or update thread state
-        with conv_lock:
-            state = THREADS.get(conversation_id)
-            if not state:
-                state = {
-                    "page_key": None,
-                    "history": [],
-                    "waiting_for_content_description": False,
-                    "page_content": None,
-                }
-                THREADS[conversation_id] = state
-
-        # Check if we're waiting for content description
-        if state.get("waiting_for_content_description", False):
-            # User provided content description, now generate content
-            page_key = state.get("page_key")
-            if page_key:
-                with conv_lock:
-                    history: List[dict] = state.get("history", [])
-                    if not history:
-                        history.append({"role": "system", "content": state["page_content"]})
-                    history.append({"role": "user", "content": user_text})
-                    history = _cap_history(history)
-                    state["history"] = history
-
-                draft = _call_llm_with_retry(history)  # generate_content(page_key, history)
-
-                with conv_lock:
-                    history.append({"role": "assistant", "content": draft})
-                    history = _cap_history(history)
-                    state["history"] = history
-                    state["waiting_for_content_description"] = False
-                    THREADS[conversation_id] = state
-
-                # Send as a code block so formatting is preserved, in thread
-                say(
-                    channel=event["channel"],
-                    thread_ts=conversation_id,
-                    text=_format_code_block(draft),
-                )
-                return
-            else:
-                # Missing page key; reset waiting flag and prompt for a keyword again
-                with conv_lock:
-                    state["waiting_for_content_description"] = False
-                    THREADS[conversation_id] = state
-                keywords_overview = ", ".join(
-                    f"`{PAGE_TO_DISPLAY_KEY[page]}`" for page in PAGE_TO_DISPLAY_KEY.keys()
-                )
-                say(
-                    channel=event["channel"],
-                    thread_ts=conversation_id,
-                    text=(
-                        "Ik kon het opgegeven keyword niet vinden. "
-                        "Kies eerst een keyword en probeer het opnieuw.\n\n"
-                        f"Beschikbare keywords: {keywords_overview}"
-                    ),
-                )
-                return
-
-        # Check if we need to detect a page key
-        if not state.get("page_key"):
-
-            detected_page = detect_page_key(user_text)
-            if detected_page:
-                page_content = build_system_prompt(detected_page)
-                # If we couldn't build content for the detected page, inform the
-                # user and ask to pick another keyword
-                if page_content is None:
-                    keywords_overview = ", ".join(
-                        f"`{PAGE_TO_DISPLAY_KEY[page]}`" for page in PAGE_TO_DISPLAY_KEY.keys()
-                    )
-                    say(
-                        channel=event["channel"],
-                        thread_ts=conversation_id,
-                        text=(
-                            "Ik kon geen content vinden voor deze pagina. Kies"
-                            " alsjeblieft een ander keyword.\n\n"
-                            f"Beschikbare keywords: {keywords_overview}"
-                        ),
-                    )
-                    return
-                with conv_lock:
-                    state["page_key"] = detected_page
-                    state["page_content"] = page_content
-                    state["waiting_for_content_description"] = True
-                    THREADS[conversation_id] = state
-
-                # Ask for content description (NL) with only a small title difference
-                page_name = detected_page.lower().replace("_", " ")
-                is_linkedin = detected_page == "LINKEDIN"
-                titel = (
-                    "een LinkedIn-post" if is_linkedin else f"content voor de pagina `{page_name}`"
-                )
-                prompt_text = (
-                    f"Hoi! Ik help je met het schrijven van {titel}.\n\n"
-                    "Vertel kort waar de content over moet gaan. Geef bij voorkeur:\n"
-                    "- Doelgroep\n"
-                    "- Doel (bijv. informeren, aankondigen, uitnodigen tot contact)\n"
-                    "- Belangrijke punten/links (moeten erin)\n"
-                    "- Toon en stijl (bijv. nuchter, professioneel, vriendelijk)\n"
-                    "- Lengte/format (bijv. 3–7 zinnen, met CTA)\n\n"
-                    "Je kunt de output daarna iteratief verbeteren door te"
-                    " reageren (bijv. 'korter', 'formeler/menselijker',"
-                    " 'voeg CTA toe', '3 varianten')."
-                )
-                say(
-                    channel=event["channel"],
-                    thread_ts=conversation_id,
-                    text=prompt_text,
-                )
-                return
-            else:
-                # No page key detected, ask for clarification (NL) and show
-                # available keywords
-                keywords_overview = ", ".join(
-                    f"`{PAGE_TO_DISPLAY_KEY[page]}`" for page in PAGE_TO_DISPLAY_KEY.keys()
-                )
-                say(
-                    channel=event["channel"],
-                    thread_ts=conversation_id,
-                    text=(
-                        "Ik kon geen keyword herkennen. Start je bericht met een"
-                        " keyword om de pagina te kiezen waarvoor we content gaan"
-                        " genereren.\n\n"
-                        f"Herkende keywords: {keywords_overview}"
-                    ),
-                )
-                return
 
-        # Continue existing conversation (page key already set, not waiting for description)
-        with conv_lock:
-            history: List[dict] = state.get("history", [])
-            if not history:
-                history.append({"role": "system", "content": state["page_content"]})
-            history.append({"role": "user", "content": user_text})
-            history = _cap_history(history)
-            state["history"] = history
+def missing_settings() -> List[str]:
+    """
+    @returns: Names of the required environment variables that are not set.
+    """
+    required = {
+        "SLACK_APP_TOKEN": APP_TOKEN,
+        "SLACK_BOT_TOKEN": BOT_TOKEN,
+        "OPENAI_API_KEY": OPENAI_API_KEY,
+    }
+    return [name for name, value in required.items() if not value]
 
-        draft = _call_llm_with_retry(history)  # generate_content(state["page_key"], history)
 
-        with conv_lock:
-            history.append({"role": "assistant", "content": draft})
-            history = _cap_history(history)
-            state["history"] = history
-            THREADS[conversation_id] = state
+def _web_client() -> "WebClient":
+    """
+    @returns: A Slack WebClient for SLACK_BOT_TOKEN (at SLACK_API_URL if set).
+    """
+    from slack_sdk import WebClient
 
-        # Send as a code block so formatting is preserved, in thread
-        say(
-            channel=event["channel"],
-            thread_ts=conversation_id,
-            text=_format_code_block(draft),
+    if SLACK_API_URL:
+        return WebClient(token=BOT_TOKEN, base_url=SLACK_API_URL)
+    return WebClient(token=BOT_TOKEN)
+
+
+def create_app(
+    client: Optional["WebClient"] = None, message_handler: Optional[Callable] = None
+) -> "App":
+    """
+    Build the Slack app with the bot's event handlers. Nothing talks to Slack
+    or OpenAI before this is called.
+    @param client: Slack WebClient to use; defaults to one for SLACK_BOT_TOKEN
+    (at SLACK_API_URL if set).
+    @param message_handler: Listener for message events; defaults to
+    ``on_dm_events`` (sharded mode passes one that hands them to a worker).
+    @returns: The slack_bolt ``App`` (creating it verifies the token with ``auth.test``).
+    @raises: RuntimeError if a required environment variable is missing.
+    """
+    missing = missing_settings()
+    if missing:
+        raise RuntimeError(f"Missing {', '.join(missing)} in environment")
+    from slack_bolt import App
+
+    if client is None and SLACK_API_URL:
+        client = _web_client()
+    app = App(client=client) if client is not None else App(token=BOT_TOKEN)
+    app.event("message")(message_handler or on_dm_events)
+    return app
+
+
+def _record_startup(phases: Dict[str, float]) -> None:
+    """
+    Publish startup phase durations as ``content_bot_startup_seconds`` and log them.
+    @param phases: Seconds per phase, in order.
+    @returns: None
+    """
+    for phase, seconds in phases.items():
+        STARTUP_SECONDS.set(seconds, phase=phase)
+    logging.info("Startup: " + ", ".join(f"{phase} {s:.2f}s" for phase, s in phases.items()))
+
+
+def _timed(function: Callable[[], Any]) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    return function(), time.perf_counter() - started
+
+
+def _warm_up() -> Dict[str, bool]:
+    """
+    Create the OpenAI clients (importing the SDK), load the tokenizers and
+    warm the page cache.
+    @returns: Mapping of page key to whether it was cached within the timeout.
+    """
+    for endpoint in LLM_MODELS:
+        _client(endpoint.base_url)
+    load_tokenizers([endpoint.model for endpoint in LLM_MODELS])
+    return content_fetcher.warm_up()
+
+
+def run_worker(index: int, events: Any, done: Any) -> None:
+    """
+    Entry point of a worker process in sharded mode: warm up like ``main``,
+    then handle the messages of this worker's conversations, replying with
+    this process's own Slack client.
+
+    With a shared ``EXTRACTION_CACHE_DIR`` only worker 0 refreshes the pages;
+    the others reload them from the disk cache. Without it every worker
+    fetches (and extracts) every page each refresh interval. Metrics are
+    served on localhost only; the main process includes them in its own.
+    @param index: This worker's shard.
+    @param events: Queue of message events for this shard.
+    @param done: This worker's pipe for progress reports to the main process.
+    @returns: None
+    """
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+        format=f"%(levelname)s:worker{index}:%(name)s:%(message)s",
+    )
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT + 1 + index, addr="127.0.0.1")
+    client = _web_client()
+    warmed = _warm_up()
+    failed = sorted(key for key, ok in warmed.items() if not ok)
+    if failed:
+        logging.warning(f"Warm-up failed for pages {failed}; using bundled reference content")
+    content_fetcher.start_background_refresh(
+        from_disk=index > 0 and bool(content_fetcher.EXTRACTION_CACHE_DIR)
+    )
+    try:
+        serve_worker(
+            index,
+            events,
+            done,
+            WORKER_THREADS,
+            lambda event: on_dm_events(event, client.chat_postMessage, client),
         )
-    except Exception as e:
-        say(
+    finally:
+        content_fetcher.stop_background_refresh()
+        content_fetcher.shutdown_extraction_pool()
+
+
+def _register_worker_metrics(pool: WorkerPool) -> None:
+    REGISTRY.callback(
+        "content_bot_worker_messages_total",
+        "Messages handed to a worker, turned away (queue full) or lost in a worker crash",
+        lambda: {
+            (result,): pool.metrics()[result] for result in ("dispatched", "rejected", "lost")
+        },
+        ["result"],
+        kind="counter",
+    )
+    REGISTRY.callback(
+        "content_bot_worker_restarts_total",
+        "Worker processes restarted after exiting",
+        lambda: pool.metrics()["restarts"],
+        kind="counter",
+    )
+    REGISTRY.callback(
+        "content_bot_worker_queue_depth",
+        "Messages waiting in each worker's queue",
+        lambda: {(str(index),): depth for index, depth in enumerate(pool.metrics()["queued"])},
+        ["worker"],
+    )
+
+
+def _run_sharded(started: float) -> None:
+    """
+    Sharded mode: keep the Socket Mode connection here and hand every message
+    to the worker process of its conversation; see workers.py.
+    @param started: ``time.perf_counter()`` at the start of ``main``.
+    @returns: None (runs until the process is stopped)
+    """
+    from slack_bolt.adapter.socket_mode import SocketModeHandler
+    from slack_bolt.util.utils import get_boot_message
+
+    client = _web_client()
+
+    def report_lost(event: Dict[str, Any]) -> None:
+        # The worker handling this message crashed; ask the user to send it again
+        client.chat_postMessage(
             channel=event["channel"],
             thread_ts=event.get("thread_ts") or event.get("ts"),
-            text="Sorry, I couldn’t generate that. Please try again.",
+            text=ERROR_TEXT,
         )
-        logging.exception(f"Error generating content: {e}")
 
+    pool = WorkerPool(
+        WORKER_PROCESSES,
+        run_worker,
+        queue_size=WORKER_QUEUE_SIZE,
+        queue_timeout_seconds=WORKER_QUEUE_TIMEOUT_SECONDS,
+        on_lost=report_lost,
+    )
 
-def main() -> None:
+    def dispatch_dm_event(event, say):
+        if not _is_user_message(event):
+            return
+        conversation_id = event.get("thread_ts") or event.get("ts")
+        if not pool.submit(conversation_id, event):
+            say(channel=event["channel"], thread_ts=conversation_id, text=BUSY_TEXT)
+            logging.warning(f"Workers busy; turned away a message in {conversation_id}")
+
+    _register_worker_metrics(pool)
+    if METRICS_PORT:
+        for index in range(WORKER_PROCESSES):
+            url = f"http://127.0.0.1:{METRICS_PORT + 1 + index}/metrics"
+            REGISTRY.add_remote(url, "worker", str(index))
+    if WORKER_PROCESSES > 1 and not content_fetcher.EXTRACTION_CACHE_DIR:
+        logging.warning(
+            "Without EXTRACTION_CACHE_DIR every worker fetches and extracts the pages itself"
+        )
+    # Workers import, warm up and start while this process connects to Slack
+    pool.start()
+    app, app_seconds = _timed(lambda: create_app(client, dispatch_dm_event))
     handler = SocketModeHandler(
         app,
         APP_TOKEN,
@@ -390,7 +1775,113 @@ def main() -> None:
         ping_interval=10,
         concurrency=10,
     )
-    handler.start()
+    _, connect_seconds = _timed(handler.connect)
+    print(get_boot_message())
+    _, workers_seconds = _timed(pool.wait_ready)
+    # Stop the workers cleanly on SIGTERM (e.g. a pod shutdown)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    _mark_ready()
+    _record_startup(
+        {
+            "app": app_seconds,
+            "connect": connect_seconds,
+            "workers": workers_seconds,
+            "ready": time.perf_counter() - started,
+        }
+    )
+    try:
+        Event().wait()
+    finally:
+        handler.close()
+        pool.stop()
+
+
+def _mark_ready(ready: bool = True) -> None:
+    """Create (or remove) ``READINESS_FILE`` to signal readiness, if configured.
+
+    @param ready: Whether the bot is ready to serve.
+    @returns: None
+    """
+    if not READINESS_FILE:
+        return
+    try:
+        if ready:
+            with open(READINESS_FILE, "w", encoding="utf-8") as f:
+                f.write("ready\n")
+        elif os.path.exists(READINESS_FILE):
+            os.remove(READINESS_FILE)
+    except OSError as e:
+        logging.exception(f"Error updating readiness file {READINESS_FILE}: {e}")
+
+
+def main() -> None:
+    started = time.perf_counter()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+    missing = missing_settings()
+    if missing:
+        print(f"Missing {', '.join(missing)} in environment", file=sys.stderr)
+        sys.exit(1)
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+    if BOT_MODE == "async" and WORKER_PROCESSES > 0:
+        print("WORKER_PROCESSES needs BOT_MODE=threaded", file=sys.stderr)
+        sys.exit(1)
+    if BOT_MODE == "async":
+        from .async_bot import main as async_main
+
+        async_main(started)
+        return
+    if BOT_MODE != "threaded":
+        print(f"Unknown BOT_MODE {BOT_MODE!r}; use 'threaded' or 'async'", file=sys.stderr)
+        sys.exit(1)
+    # A container restart keeps /tmp, so drop a readiness marker from a previous run
+    _mark_ready(False)
+    if WORKER_PROCESSES > 0:
+        _run_sharded(started)
+        return
+    from slack_bolt.adapter.socket_mode import SocketModeHandler
+    from slack_bolt.util.utils import get_boot_message
+
+    # Warm the page cache while connecting to Slack, and only report ready once
+    # both are done; a message arriving before that fetches its page itself.
+    # Pages that fail here fall back to reference_content.json until a refresh succeeds.
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm-up") as warm_up_pool:
+        warming = warm_up_pool.submit(_timed, _warm_up)
+        app, app_seconds = _timed(create_app)
+        handler = SocketModeHandler(
+            app,
+            APP_TOKEN,
+            auto_reconnect_enabled=True,
+            trace_enabled=False,
+            ping_pong_trace_enabled=False,
+            all_message_trace_enabled=False,
+            ping_interval=10,
+            concurrency=10,
+        )
+        _, connect_seconds = _timed(handler.connect)
+        print(get_boot_message())
+        warmed, warm_up_seconds = warming.result()
+    failed = sorted(key for key, ok in warmed.items() if not ok)
+    if failed:
+        logging.warning(f"Warm-up failed for pages {failed}; using bundled reference content")
+    content_fetcher.start_background_refresh()
+    # Run the shutdown below on SIGTERM (e.g. a pod shutdown) too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    _mark_ready()
+    _record_startup(
+        {
+            "app": app_seconds,
+            "connect": connect_seconds,
+            "warm_up": warm_up_seconds,
+            "ready": time.perf_counter() - started,
+        }
+    )
+    try:
+        Event().wait()
+    finally:
+        handler.close()
+        content_fetcher.stop_background_refresh()
+        content_fetcher.shutdown_extraction_pool()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,174 @@
+"""Coalesce rapid consecutive messages in a thread into one model call.
+
+Users often send a few short messages in a row ("korter", then "en voeg een
+CTA toe"). Each message is added to its thread's pending buffer and gets a
+sequence number; the handler then waits a short debounce window. Only the
+handler holding the latest sequence number generates a draft, for all pending
+messages merged into one user turn. Handlers that were superseded (while
+waiting or while generating) stand down, and a superseded draft is discarded
+instead of posted.
+
+Pending messages are only cleared when a draft for them is committed to the
+history, so nothing is lost when a generation is superseded or fails midway.
+
+The buffer is in-process: with several replicas, messages of one thread that
+reach different replicas are not merged (each still produces a correct turn).
+"""
+
+import asyncio
+import itertools
+import time
+from threading import Condition
+from typing import Dict, List, Optional
+
+
+class Superseded(Exception):
+    """Raised to abandon a generation that a newer message has taken over."""
+
+
+class _Pending:
+    __slots__ = ("texts", "seq", "last_arrival")
+
+    def __init__(self) -> None:
+        self.texts: List[str] = []
+        self.seq = 0
+        self.last_arrival = 0.0
+
+
+class MessageCoalescer:
+    """Per-conversation buffer of messages awaiting one draft.
+
+    @param window_seconds: Quiet period after the latest message before a
+    draft is generated; 0 still merges messages that arrive mid-generation.
+    """
+
+    def __init__(self, window_seconds: float = 1.0) -> None:
+        self.window_seconds = window_seconds
+        self._pending: Dict[str, _Pending] = {}
+        self._cond = Condition()
+        # Global, so a handler from before a thread's buffer was cleared never matches again
+        self._seq = itertools.count(1)
+        self._stats = {"messages": 0, "coalesced": 0, "superseded": 0}
+
+    def add(self, conversation_id: str, text: str) -> int:
+        """Buffer a message and make its handler the latest for the thread.
+
+        @param conversation_id: Thread the message belongs to.
+        @param text: The user's message.
+        @return: Sequence number of this message.
+        @rtype: int
+        """
+        with self._cond:
+            pending = self._pending.setdefault(conversation_id, _Pending())
+            pending.texts.append(text)
+            pending.seq = next(self._seq)
+            pending.last_arrival = time.monotonic()
+            self._stats["messages"] += 1
+            self._cond.notify_all()
+            return pending.seq
+
+    def wait(self, conversation_id: str, seq: int) -> bool:
+        """Block until the thread has been quiet for the debounce window.
+
+        @param conversation_id: Thread the message belongs to.
+        @param seq: Sequence number returned by ``add``.
+        @return: ``True`` if ``seq`` is still the latest message and should
+        generate the draft; ``False`` if a newer message took over.
+        @rtype: bool
+        """
+        with self._cond:
+            while True:
+                if not self.is_current(conversation_id, seq):
+                    return False
+                remaining = self._remaining(conversation_id)
+                if remaining <= 0:
+                    return True
+                self._cond.wait(remaining)
+
+    async def wait_async(self, conversation_id: str, seq: int) -> bool:
+        """Async ``wait``: sleeps on the event loop instead of blocking a thread."""
+        while True:
+            with self._cond:
+                if not self.is_current(conversation_id, seq):
+                    return False
+                remaining = self._remaining(conversation_id)
+            if remaining <= 0:
+                return True
+            await asyncio.sleep(remaining)
+
+    def is_current(self, conversation_id: str, seq: int) -> bool:
+        """Return whether ``seq`` is the thread's latest message.
+
+        @param conversation_id: Thread the message belongs to.
+        @param seq: Sequence number returned by ``add``.
+        @rtype: bool
+        """
+        with self._cond:
+            pending = self._pending.get(conversation_id)
+            return pending is not None and pending.seq == seq
+
+    def texts(self, conversation_id: str) -> List[str]:
+        """Return the thread's pending messages, oldest first.
+
+        @param conversation_id: Thread to look up.
+        @rtype: List[str]
+        """
+        with self._cond:
+            pending = self._pending.get(conversation_id)
+            return list(pending.texts) if pending is not None else []
+
+    def commit(self, conversation_id: str, seq: int, count: int) -> bool:
+        """Clear the first ``count`` pending messages if ``seq`` is still the latest.
+
+        Call it while holding the conversation lock, right before the turn
+        is written to the history.
+
+        @param conversation_id: Thread the draft was generated for.
+        @param seq: Sequence number of the generating handler.
+        @param count: Number of pending messages the draft answered.
+        @return: ``True`` if the draft may be committed; ``False`` if it was
+        superseded and must be discarded.
+        @rtype: bool
+        """
+        with self._cond:
+            pending = self._pending.get(conversation_id)
+            if pending is None or pending.seq != seq:
+                return False
+            del pending.texts[:count]
+            if count > 1:
+                self._stats["coalesced"] += count - 1
+            if not pending.texts:
+                del self._pending[conversation_id]
+            return True
+
+    def record_superseded(self) -> None:
+        """Count a draft that was discarded because a newer message took over."""
+        with self._cond:
+            self._stats["superseded"] += 1
+
+    def discard(self, conversation_id: str, seq: Optional[int] = None) -> None:
+        """Drop the thread's pending messages (on reset, or when generating failed).
+
+        @param conversation_id: Thread to clear.
+        @param seq: Only clear if this is still the latest message; ``None``
+        clears unconditionally.
+        """
+        with self._cond:
+            pending = self._pending.get(conversation_id)
+            if pending is not None and (seq is None or pending.seq == seq):
+                del self._pending[conversation_id]
+                self._cond.notify_all()
+
+    def metrics(self) -> Dict[str, int]:
+        """Return counters since start.
+
+        @return: ``messages`` buffered, messages ``coalesced`` into another
+        message's turn, ``superseded`` drafts discarded and ``pending`` threads.
+        @rtype: Dict[str, int]
+        """
+        with self._cond:
+            return {**self._stats, "pending": len(self._pending)}
+
+    def _remaining(self, conversation_id: str) -> float:
+        pending = self._pending[conversation_id]
+        return pending.last_arrival + self.window_seconds - time.monotonic()
@@ -1,20 +1,88 @@
 """Utilities to fetch website content and extract readable HTML snippets.
 
 This module provides a tiny in-memory cache and HTML extraction using
-`trafilatura` and `BeautifulSoup` to return simplified HTML suitable for
-downstream consumption.
+`trafilatura` and `lxml` to return simplified HTML suitable for downstream
+consumption.
+
+The cache holds the *extracted* HTML per page key. Entries younger than
+``WEB_FETCH_TTL_SECONDS`` are served as-is; older entries are served stale
+while a single background refresh runs (for at most ``WEB_FETCH_STALE_SECONDS``
+past the TTL). Concurrent misses for the same page share one fetch.
+
+Pages are fetched with a shared ``httpx.Client``, so connections to the
+website are kept alive and reused. Revalidation sends the cached copy's
+``ETag`` / ``Last-Modified``; a ``304 Not Modified`` reuses the cached
+extraction without downloading or parsing the page again.
+
+At startup ``warm_up`` fetches every page in ``PAGE_TO_URL`` in parallel and
+``start_background_refresh`` keeps them fresh (or, with ``from_disk``, reloads
+them from the disk cache that another process keeps fresh). Once warmed, lookups never
+block on the network: a page that is not cached yields ``None`` (so callers
+fall back to the bundled reference content) while a refresh runs in the
+background.
+
+When ``EXTRACTION_CACHE_DIR`` is set, extraction results and the
+last-known-good content per page are also persisted on disk (see
+``extraction_cache``), so restarts and replicas sharing the volume skip
+re-extraction and can serve content before the website answers.
+
+Extraction is CPU-bound pure Python and holds the GIL. With
+``EXTRACTION_WORKERS`` > 0 it runs in a process pool instead, so a slow page
+does not stall the Slack handler threads. If the pool breaks, extraction falls
+back to the calling thread; if it does not answer in time, the stale (or
+bundled) content is served and the pool's result fills the cache once it
+arrives.
+
+The async bot mode uses ``async_warm_up`` and ``async_refresh_loop``
+instead: the same cache and single-flight bookkeeping, but pages are fetched
+with ``httpx.AsyncClient`` and extracted in a worker thread, so the event
+loop never blocks on the website.
+
+trafilatura (and the date parsing it pulls in) takes most of a second to
+import; it and httpx are imported on first use so importing this module, and
+starting with cached pages, stays fast.
 """
 
+import asyncio
 import logging
+import multiprocessing
 import os
-from typing import Dict, Optional
-from urllib import request
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from threading import Event, Lock, Thread
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Optional, Tuple
 from urllib.parse import urljoin
 
-import trafilatura
-from bs4 import BeautifulSoup
+from lxml import html as lxml_html
+from lxml.html import HtmlElement
+
+from .extraction_cache import ExtractionCache
+from .metrics import CACHE_LOOKUPS, STAGE_SECONDS
+
+if TYPE_CHECKING:
+    import httpx
 
 WEBSITE_BASE_URL = os.getenv("WEBSITE_BASE_URL", "https://conduction.nl")
+WEB_FETCH_TTL_SECONDS = float(os.getenv("WEB_FETCH_TTL_SECONDS", "1800"))
+WEB_FETCH_STALE_SECONDS = float(os.getenv("WEB_FETCH_STALE_SECONDS", "86400"))
+WEB_FETCH_CACHE_MAX_ENTRIES = int(os.getenv("WEB_FETCH_CACHE_MAX_ENTRIES", "32"))
+WEB_FETCH_TIMEOUT_SECONDS = float(os.getenv("WEB_FETCH_TIMEOUT_SECONDS", "15"))
+WEB_FETCH_POOL_SIZE = int(os.getenv("WEB_FETCH_POOL_SIZE", "4"))
+WEB_FETCH_WARMUP_TIMEOUT_SECONDS = float(os.getenv("WEB_FETCH_WARMUP_TIMEOUT_SECONDS", "30"))
+WEB_FETCH_REFRESH_INTERVAL_SECONDS = float(os.getenv("WEB_FETCH_REFRESH_INTERVAL_SECONDS", "900"))
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "")
+EXTRACTION_CACHE_MAX_FILES = int(os.getenv("EXTRACTION_CACHE_MAX_FILES", "256"))
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "0"))
+EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "20"))
+
+USER_AGENT = "conduction-content-bot"
+
+# Bump whenever _extract_text_from_html output changes to invalidate the disk cache
+EXTRACTOR_VERSION = "2"
 
 PAGE_TO_URL: Dict[str, str] = {
     # Replace with your real URLs or paths
@@ -38,24 +106,638 @@ def get_reference_content(page_key: str) -> str:
     return result if result else ""
 
 
+class HttpResponse(NamedTuple):
+    """Outcome of a (conditional) GET request.
+
+    ``body`` is ``None`` for ``304 Not Modified``; ``etag`` and
+    ``last_modified`` carry the validators to send on the next request.
+    """
+
+    status: int
+    body: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+class _CacheEntry(NamedTuple):
+    fetched_at: float  # time.monotonic() of the last successful (re)validation
+    content: str  # extracted HTML
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_key: Optional[str] = None  # disk cache key of the content, if persisted
+
+
+# page_key -> entry, least recently used first
+_CACHE: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+_CACHE_LOCK: Lock = Lock()
+
+# Keep-alive clients, created on first use; the async one is bound to its event loop
+_CLIENT: Optional["httpx.Client"] = None
+_CLIENT_LOCK: Lock = Lock()
+_ASYNC_CLIENT: Optional["httpx.AsyncClient"] = None
+
+_DISK_CACHE: Optional[ExtractionCache] = (
+    ExtractionCache(EXTRACTION_CACHE_DIR, max_files=EXTRACTION_CACHE_MAX_FILES)
+    if EXTRACTION_CACHE_DIR
+    else None
+)
+
+_EXTRACTION_POOL: Optional[ProcessPoolExecutor] = None
+_EXTRACTION_POOL_LOCK: Lock = Lock()
+
+
+class _Flight:
+    """A fetch in progress for one page key that other callers can wait on."""
+
+    def __init__(self) -> None:
+        self.done = Event()
+        self.result: Optional[str] = None
+
+
+_INFLIGHT: Dict[str, _Flight] = {}
+
+# Set once warm_up() has run; from then on lookups never block on the network
+_WARMED: Event = Event()
+_REFRESH_STOP: Event = Event()
+
+
 def fetch_page_html(page_key: str) -> Optional[str]:
-    """Fetch a page by key, with simple extraction.
+    """Fetch a page by key, served from the cache when possible.
 
     Returns the extracted HTML string, or ``None`` on failure
     to resolve or fetch.
 
+    After ``warm_up`` a cache miss returns ``None`` immediately and schedules
+    a background fetch instead of waiting for it.
+
     @param page_key: Key in ``PAGE_TO_URL`` identifying which page to fetch.
     @return: Extracted HTML string on success, or ``None`` on failure.
     @rtype: Optional[str]
     """
+    if page_key not in PAGE_TO_URL:
+        return None
+    if WEB_FETCH_TTL_SECONDS <= 0:
+        fresh = _fetch_and_extract(page_key)
+        return fresh.content if fresh else None
+
+    with _CACHE_LOCK:
+        entry = _CACHE.get(page_key)
+        if entry is not None:
+            _CACHE.move_to_end(page_key)
+    if entry is not None:
+        age = time.monotonic() - entry.fetched_at
+        if age < WEB_FETCH_TTL_SECONDS:
+            CACHE_LOOKUPS.inc(cache="page", result="hit")
+            return entry.content
+        if age < WEB_FETCH_TTL_SECONDS + WEB_FETCH_STALE_SECONDS or _WARMED.is_set():
+            CACHE_LOOKUPS.inc(cache="page", result="stale")
+            _refresh_in_background(page_key)
+            return entry.content
+    CACHE_LOOKUPS.inc(cache="page", result="miss")
+    if _WARMED.is_set():
+        _refresh_in_background(page_key)
+        return None
+    return _fetch_single_flight(page_key)
+
+
+def warm_up(timeout: Optional[float] = None) -> Dict[str, bool]:
+    """Fetch and extract every page in ``PAGE_TO_URL`` in parallel.
+
+    Last-known-good content from the disk cache is loaded first, so those
+    pages are served immediately and only revalidated here. Fetches still
+    running when ``timeout`` expires keep going in the background and fill
+    the cache when they finish. Afterwards the module switches to
+    non-blocking lookups.
+
+    @param timeout: Seconds to wait for all pages; defaults to
+    ``WEB_FETCH_WARMUP_TIMEOUT_SECONDS``.
+    @return: Mapping of page key to whether it was cached within the timeout.
+    @rtype: Dict[str, bool]
+    """
+    if timeout is None:
+        timeout = WEB_FETCH_WARMUP_TIMEOUT_SECONDS
+    load_last_known_good()
+    page_keys = list(PAGE_TO_URL.keys())
+    executor = ThreadPoolExecutor(max_workers=max(len(page_keys), 1), thread_name_prefix="warmup")
+    try:
+        futures = {key: executor.submit(_fetch_single_flight, key) for key in page_keys}
+        wait(futures.values(), timeout=timeout)
+    finally:
+        executor.shutdown(wait=False)
+    with _CACHE_LOCK:
+        result = {key: key in _CACHE for key in page_keys}
+    _WARMED.set()
+    return result
+
+
+def load_last_known_good(replace_older: bool = False) -> Dict[str, bool]:
+    """Seed the in-memory cache with the last-known-good pages from disk.
+
+    Loaded entries keep their original age (and validators), so they are
+    revalidated with a conditional request on the next lookup or refresh.
+    Records extracted by another ``EXTRACTOR_VERSION`` are loaded without
+    validators, so the next fetch gets the full page and extracts it again.
+
+    @param replace_older: Also replace cached pages that were (re)validated
+    before the record on disk was saved (by another process sharing the cache).
+    @return: Mapping of page key to whether a record was loaded into the cache.
+    @rtype: Dict[str, bool]
+    """
+    loaded: Dict[str, bool] = {}
+    for page_key in PAGE_TO_URL:
+        record = _DISK_CACHE.load_page(page_key) if _DISK_CACHE else None
+        loaded[page_key] = False
+        if record is None:
+            continue
+        fetched_at = time.monotonic() - max(time.time() - float(record.get("saved_at") or 0), 0.0)
+        current = record.get("extractor_version") == EXTRACTOR_VERSION
+        with _CACHE_LOCK:
+            cached = _CACHE.get(page_key)
+        if cached is not None and not (
+            replace_older and current and fetched_at > cached.fetched_at
+        ):
+            continue
+        _store(
+            page_key,
+            _CacheEntry(
+                fetched_at=fetched_at,
+                content=record["content"],
+                etag=record.get("etag") if current else None,
+                last_modified=record.get("last_modified") if current else None,
+                content_key=record["content_key"] if current else None,
+            ),
+        )
+        loaded[page_key] = True
+    return loaded
+
+
+def start_background_refresh(
+    interval: Optional[float] = None, from_disk: bool = False
+) -> Optional[Thread]:
+    """Start a daemon thread that revalidates every page periodically.
+
+    @param interval: Seconds between refresh rounds; defaults to
+    ``WEB_FETCH_REFRESH_INTERVAL_SECONDS`` (a tenth of it with ``from_disk``:
+    reading the disk cache is cheap, and a reloaded page should not reach the
+    TTL before the next round). Non-positive disables refreshing.
+    @param from_disk: Reload the pages from the disk cache instead of fetching
+    them, for processes sharing it with one that refreshes.
+    @return: The started thread, or ``None`` when disabled.
+    @rtype: Optional[Thread]
+    """
+    if interval is None:
+        interval = WEB_FETCH_REFRESH_INTERVAL_SECONDS / (10 if from_disk else 1)
+    if interval <= 0:
+        return None
+    _REFRESH_STOP.clear()
+
+    def _loop() -> None:
+        while not _REFRESH_STOP.wait(interval):
+            if from_disk:
+                load_last_known_good(replace_older=True)
+                continue
+            for page_key in list(PAGE_TO_URL.keys()):
+                if _REFRESH_STOP.is_set():
+                    return
+                try:
+                    _fetch_single_flight(page_key)
+                except Exception as e:
+                    logging.exception(f"Error refreshing page {page_key}: {e}")
+
+    thread = Thread(target=_loop, name="page-refresher", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_background_refresh() -> None:
+    """Ask the background refresher (if any) to stop after its current fetch."""
+    _REFRESH_STOP.set()
+
+
+async def async_warm_up(timeout: Optional[float] = None) -> Dict[str, bool]:
+    """Async counterpart of ``warm_up`` for the async bot mode.
+
+    @param timeout: Seconds to wait for all pages; defaults to
+    ``WEB_FETCH_WARMUP_TIMEOUT_SECONDS``.
+    @return: Mapping of page key to whether it was cached within the timeout.
+    @rtype: Dict[str, bool]
+    """
+    if timeout is None:
+        timeout = WEB_FETCH_WARMUP_TIMEOUT_SECONDS
+    await asyncio.to_thread(load_last_known_good)
+    page_keys = list(PAGE_TO_URL.keys())
+    tasks = [asyncio.create_task(_afetch_single_flight(key)) for key in page_keys]
+    # Fetches still running after the timeout keep going and fill the cache later
+    if tasks:
+        await asyncio.wait(tasks, timeout=timeout)
+    with _CACHE_LOCK:
+        result = {key: key in _CACHE for key in page_keys}
+    _WARMED.set()
+    return result
+
+
+async def async_refresh_loop(interval: Optional[float] = None) -> None:
+    """Revalidate every page periodically; run it as a task next to the bot.
+
+    @param interval: Seconds between refresh rounds; defaults to
+    ``WEB_FETCH_REFRESH_INTERVAL_SECONDS``. Non-positive returns immediately.
+    """
+    if interval is None:
+        interval = WEB_FETCH_REFRESH_INTERVAL_SECONDS
+    if interval <= 0:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        for page_key in list(PAGE_TO_URL.keys()):
+            try:
+                await _afetch_single_flight(page_key)
+            except Exception as e:
+                logging.exception(f"Error refreshing page {page_key}: {e}")
+
+
+async def aclose_async_client() -> None:
+    """Close the async HTTP client's connections, if it was created."""
+    global _ASYNC_CLIENT
+    client, _ASYNC_CLIENT = _ASYNC_CLIENT, None
+    if client is not None:
+        await client.aclose()
+
+
+def _store(page_key: str, entry: "_CacheEntry") -> None:
+    """Insert or replace a cache entry, evicting the least recently used ones.
+
+    @param page_key: Page key the content belongs to.
+    @param entry: Extracted HTML with its validators.
+    """
+    with _CACHE_LOCK:
+        _CACHE[page_key] = entry
+        _CACHE.move_to_end(page_key)
+        while len(_CACHE) > max(WEB_FETCH_CACHE_MAX_ENTRIES, 1):
+            _CACHE.popitem(last=False)
+
+
+def _fetch_single_flight(page_key: str) -> Optional[str]:
+    """Fetch a page, sharing the result with concurrent callers for the same key.
+
+    Only the first caller performs the fetch; others block until it finishes.
+    A failed fetch leaves any existing (stale) entry untouched and returns it.
+
+    @param page_key: Key in ``PAGE_TO_URL`` identifying which page to fetch.
+    @return: Extracted HTML string on success, or the stale copy / ``None``.
+    @rtype: Optional[str]
+    """
+    with _CACHE_LOCK:
+        flight = _INFLIGHT.get(page_key)
+        leader = flight is None
+        if leader:
+            flight = _Flight()
+            _INFLIGHT[page_key] = flight
+    if not leader:
+        flight.done.wait()
+        return flight.result
+
+    try:
+        with _CACHE_LOCK:
+            previous = _CACHE.get(page_key)
+        fresh = _fetch_and_extract(page_key, previous)
+        if fresh is not None:
+            _store(page_key, fresh)
+            result = fresh.content
+        else:
+            result = previous.content if previous else None
+        flight.result = result
+        return result
+    finally:
+        with _CACHE_LOCK:
+            _INFLIGHT.pop(page_key, None)
+        flight.done.set()
+
+
+def _refresh_in_background(page_key: str) -> None:
+    """Start a daemon thread refreshing ``page_key`` unless one is already running.
+
+    @param page_key: Key in ``PAGE_TO_URL`` identifying which page to refresh.
+    """
+    with _CACHE_LOCK:
+        if page_key in _INFLIGHT:
+            return
+    Thread(
+        target=_fetch_single_flight,
+        args=(page_key,),
+        name=f"refresh-{page_key}",
+        daemon=True,
+    ).start()
+
+
+async def _afetch_single_flight(page_key: str) -> Optional[str]:
+    """Async ``_fetch_single_flight``; shares in-flight fetches with threaded callers.
+
+    @param page_key: Key in ``PAGE_TO_URL`` identifying which page to fetch.
+    @return: Extracted HTML string on success, or the stale copy / ``None``.
+    @rtype: Optional[str]
+    """
+    with _CACHE_LOCK:
+        flight = _INFLIGHT.get(page_key)
+        leader = flight is None
+        if leader:
+            flight = _Flight()
+            _INFLIGHT[page_key] = flight
+    if not leader:
+        await asyncio.to_thread(flight.done.wait)
+        return flight.result
+
+    try:
+        with _CACHE_LOCK:
+            previous = _CACHE.get(page_key)
+        fresh = await _afetch_and_extract(page_key, previous)
+        if fresh is not None:
+            _store(page_key, fresh)
+            result = fresh.content
+        else:
+            result = previous.content if previous else None
+        flight.result = result
+        return result
+    finally:
+        with _CACHE_LOCK:
+            _INFLIGHT.pop(page_key, None)
+        flight.done.set()
+
+
+def _fetch_and_extract(
+    page_key: str, previous: Optional[_CacheEntry] = None
+) -> Optional[_CacheEntry]:
+    """Fetch and extract a page, revalidating ``previous`` if given.
+
+    @param page_key: Key in ``PAGE_TO_URL`` identifying which page to fetch.
+    @param previous: Cached entry whose validators are sent with the request.
+    @return: New entry on success (``previous`` re-stamped on 304), or
+    ``None`` on failure or while the extraction pool is still busy with it.
+    @rtype: Optional[_CacheEntry]
+    """
     url = _resolve_url(page_key)
     if not url:
         return None
-    html_str = _http_get(url)
-    if html_str is None:
+    requested_at = time.monotonic()
+    resp = _http_get(
+        url,
+        etag=previous.etag if previous else None,
+        last_modified=previous.last_modified if previous else None,
+    )
+    if resp is None:
+        return None
+    if resp.status == 304 and previous is not None:
+        entry = previous._replace(
+            fetched_at=time.monotonic(), etag=resp.etag, last_modified=resp.last_modified
+        )
+        _save_page(page_key, entry)
+        return entry
+    if resp.status != 200 or resp.body is None:
+        logging.error(f"Error fetching page {url}: HTTP {resp.status}")
+        return None
+    content, content_key = _extract_with_disk_cache(
+        resp.body, _store_late(page_key, resp, requested_at)
+    )
+    if content is None:
+        return None
+    entry = _CacheEntry(
+        fetched_at=time.monotonic(),
+        content=content,
+        etag=resp.etag,
+        last_modified=resp.last_modified,
+        content_key=content_key,
+    )
+    _save_page(page_key, entry)
+    return entry
+
+
+async def _afetch_and_extract(
+    page_key: str, previous: Optional[_CacheEntry] = None
+) -> Optional[_CacheEntry]:
+    """Async ``_fetch_and_extract``: fetch on the event loop, extract in a worker thread.
+
+    @param page_key: Key in ``PAGE_TO_URL`` identifying which page to fetch.
+    @param previous: Cached entry whose validators are sent with the request.
+    @return: New entry on success (``previous`` re-stamped on 304), or
+    ``None`` on failure or while the extraction pool is still busy with it.
+    @rtype: Optional[_CacheEntry]
+    """
+    url = _resolve_url(page_key)
+    if not url:
+        return None
+    requested_at = time.monotonic()
+    resp = await _async_http_get(
+        url,
+        etag=previous.etag if previous else None,
+        last_modified=previous.last_modified if previous else None,
+    )
+    if resp is None:
+        return None
+    if resp.status == 304 and previous is not None:
+        entry = previous._replace(
+            fetched_at=time.monotonic(), etag=resp.etag, last_modified=resp.last_modified
+        )
+        await asyncio.to_thread(_save_page, page_key, entry)
+        return entry
+    if resp.status != 200 or resp.body is None:
+        logging.error(f"Error fetching page {url}: HTTP {resp.status}")
+        return None
+    # Extraction is CPU-bound (and may hand off to the process pool): keep it off the loop
+    content, content_key = await asyncio.to_thread(
+        _extract_with_disk_cache, resp.body, _store_late(page_key, resp, requested_at)
+    )
+    if content is None:
+        return None
+    entry = _CacheEntry(
+        fetched_at=time.monotonic(),
+        content=content,
+        etag=resp.etag,
+        last_modified=resp.last_modified,
+        content_key=content_key,
+    )
+    await asyncio.to_thread(_save_page, page_key, entry)
+    return entry
+
+
+def _save_page(page_key: str, entry: _CacheEntry) -> None:
+    """Record ``entry`` as the last-known-good content of a page on disk.
+
+    Also done after a 304, so the record's age (and validators) stay current
+    for restarts and for processes reloading pages from the disk cache.
+
+    @param page_key: Key in ``PAGE_TO_URL`` the entry belongs to.
+    @param entry: Entry just fetched or revalidated.
+    """
+    if _DISK_CACHE is None or entry.content_key is None:
+        return
+    _DISK_CACHE.save_page(
+        page_key,
+        entry.content_key,
+        EXTRACTOR_VERSION,
+        etag=entry.etag,
+        last_modified=entry.last_modified,
+    )
+
+
+def _store_late(
+    page_key: str, resp: HttpResponse, requested_at: float
+) -> Callable[[str, Optional[str]], None]:
+    """Build the callback that caches an extraction finishing after its timeout.
+
+    @param page_key: Key in ``PAGE_TO_URL`` the response belongs to.
+    @param resp: The response that was being extracted, for its validators.
+    @param requested_at: ``time.monotonic()`` when it was requested; a page
+    cached after that (by a newer fetch or from disk) is not replaced.
+    @return: Callback taking the extracted HTML and its disk cache key.
+    @rtype: Callable[[str, Optional[str]], None]
+    """
+
+    def on_late(content: str, content_key: Optional[str]) -> None:
+        with _CACHE_LOCK:
+            cached = _CACHE.get(page_key)
+        if cached is not None and cached.fetched_at >= requested_at:
+            return
+        entry = _CacheEntry(
+            fetched_at=time.monotonic(),
+            content=content,
+            etag=resp.etag,
+            last_modified=resp.last_modified,
+            content_key=content_key,
+        )
+        _store(page_key, entry)
+        _save_page(page_key, entry)
+
+    return on_late
+
+
+def _extract_with_disk_cache(
+    html_str: str, on_late: Optional[Callable[[str, Optional[str]], None]] = None
+) -> Tuple[Optional[str], Optional[str]]:
+    """Extract ``html_str``, reusing a persisted result for identical HTML.
+
+    @param html_str: Raw HTML document string.
+    @param on_late: Called with the extracted HTML and its disk cache key
+    when the extraction pool timed out but finished later.
+    @return: Extracted HTML (``None`` when the pool timed out) and its disk
+    cache key (``None`` when disabled).
+    @rtype: Tuple[Optional[str], Optional[str]]
+    """
+    content_key: Optional[str] = None
+    if _DISK_CACHE is not None:
+        content_key = ExtractionCache.content_key(html_str, EXTRACTOR_VERSION)
+        content = _DISK_CACHE.get(content_key)
+        CACHE_LOOKUPS.inc(cache="extraction", result="miss" if content is None else "hit")
+        if content is not None:
+            return content, content_key
+
+    def put_late(late: str) -> None:
+        if content_key is not None:
+            _DISK_CACHE.put(content_key, late)
+        if on_late is not None:
+            on_late(late, content_key)
+
+    with STAGE_SECONDS.time(stage="extraction"):
+        content = _extract(html_str, put_late)
+    if content is not None and content_key is not None:
+        _DISK_CACHE.put(content_key, content)
+    return content, content_key
+
+
+def _extract(html_str: str, on_late: Optional[Callable[[str], None]] = None) -> Optional[str]:
+    """Run ``_extract_text_from_html`` in the process pool, if enabled.
+
+    Falls back to extracting in the calling thread when the pool is disabled
+    or has broken (e.g. a worker was killed). When the pool does not answer
+    within ``EXTRACTION_TIMEOUT_SECONDS`` the page is not extracted again
+    in-thread (the worker keeps running it anyway): ``None`` is returned and
+    the result goes to ``on_late`` once it arrives. Errors raised by the
+    extraction itself propagate as before.
+
+    @param html_str: Raw HTML document string.
+    @param on_late: Called with the extracted HTML after a timeout.
+    @return: Sanitized, minimal HTML string, or ``None`` after a timeout.
+    @rtype: Optional[str]
+    """
+    pool = _get_extraction_pool()
+    if pool is None:
+        return _extract_text_from_html(html_str)
+    try:
+        future = pool.submit(_extract_text_from_html, html_str)
+    except (BrokenProcessPool, RuntimeError) as e:
+        logging.warning(f"Extraction pool unavailable, extracting in-thread: {e}")
+        _reset_extraction_pool(pool)
+        return _extract_text_from_html(html_str)
+    try:
+        return future.result(timeout=EXTRACTION_TIMEOUT_SECONDS)
+    except FuturesTimeoutError:
+        logging.warning(
+            f"Extraction pool timed out after {EXTRACTION_TIMEOUT_SECONDS}s;"
+            " serving cached or bundled content until it finishes"
+        )
+        future.add_done_callback(lambda done: _deliver_late(done, on_late))
+        return None
+    except BrokenProcessPool as e:
+        logging.warning(f"Extraction pool broke, extracting in-thread: {e}")
+        _reset_extraction_pool(pool)
+    return _extract_text_from_html(html_str)
+
+
+def _deliver_late(future: Future, on_late: Optional[Callable[[str], None]]) -> None:
+    """Hand the result of a timed-out extraction to ``on_late``, if it succeeded.
+
+    @param future: The finished extraction.
+    @param on_late: Receives the extracted HTML.
+    """
+    if on_late is None or future.cancelled():
+        return
+    try:
+        on_late(future.result())
+    except Exception as e:
+        logging.exception(f"Error finishing a late extraction: {e}")
+
+
+def _get_extraction_pool() -> Optional[ProcessPoolExecutor]:
+    """Return the shared extraction pool, creating it on first use.
+
+    @return: The pool, or ``None`` when ``EXTRACTION_WORKERS`` is not positive.
+    @rtype: Optional[ProcessPoolExecutor]
+    """
+    global _EXTRACTION_POOL
+    if EXTRACTION_WORKERS <= 0:
         return None
-    text = _extract_text_from_html(html_str)
-    return text
+    with _EXTRACTION_POOL_LOCK:
+        if _EXTRACTION_POOL is None:
+            # spawn: forking a process that already runs Slack/HTTP threads is unsafe
+            _EXTRACTION_POOL = ProcessPoolExecutor(
+                max_workers=EXTRACTION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _EXTRACTION_POOL
+
+
+def _reset_extraction_pool(pool: ProcessPoolExecutor) -> None:
+    """Discard a broken pool so the next extraction starts a fresh one.
+
+    @param pool: The pool that failed; ignored if it was already replaced.
+    """
+    global _EXTRACTION_POOL
+    with _EXTRACTION_POOL_LOCK:
+        if _EXTRACTION_POOL is pool:
+            _EXTRACTION_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_extraction_pool() -> None:
+    """Stop the extraction worker processes, if any were started.
+
+    Waits for them (and a page one may be extracting) to exit: without
+    waiting, exiting right after can close the pool's queue before the stop
+    requests are sent, leaving the workers, and a parent joining them, hanging.
+    """
+    global _EXTRACTION_POOL
+    with _EXTRACTION_POOL_LOCK:
+        pool, _EXTRACTION_POOL = _EXTRACTION_POOL, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
 
 
 def _resolve_url(page_key: str) -> Optional[str]:
@@ -73,98 +755,102 @@ def _resolve_url(page_key: str) -> Optional[str]:
     return urljoin(WEBSITE_BASE_URL.rstrip("/") + "/", target.lstrip("/"))
 
 
-def _http_get(url: str) -> Optional[str]:
-    """Perform a simple HTTP GET using a custom User-Agent.
+def _client_options() -> dict:
+    """Settings shared by the sync and async HTTP clients."""
+    import httpx
+
+    return {
+        "timeout": WEB_FETCH_TIMEOUT_SECONDS,
+        "follow_redirects": True,
+        "limits": httpx.Limits(max_keepalive_connections=WEB_FETCH_POOL_SIZE),
+        "headers": {"User-Agent": USER_AGENT},
+    }
+
+
+def _conditional_headers(etag: Optional[str], last_modified: Optional[str]) -> Dict[str, str]:
+    """Request headers that let the server answer ``304`` for an unchanged page."""
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def _to_response(
+    resp: "httpx.Response", etag: Optional[str], last_modified: Optional[str]
+) -> HttpResponse:
+    """Convert an ``httpx`` response, keeping the old validators on a 304.
+
+    @param resp: Response to a (conditional) GET.
+    @param etag: Validator that was sent as ``If-None-Match``.
+    @param last_modified: Validator that was sent as ``If-Modified-Since``.
+    @return: Status, decoded body (``None`` on 304) and the validators for the next request.
+    @rtype: HttpResponse
+    """
+    not_modified = resp.status_code == 304
+    return HttpResponse(
+        status=resp.status_code,
+        body=None if not_modified else resp.content.decode("utf-8", errors="ignore"),
+        etag=resp.headers.get("etag") or (etag if not_modified else None),
+        last_modified=resp.headers.get("last-modified")
+        or (last_modified if not_modified else None),
+    )
+
+
+def _http_get(
+    url: str, etag: Optional[str] = None, last_modified: Optional[str] = None
+) -> Optional[HttpResponse]:
+    """Perform a (conditional) HTTP GET with the shared ``httpx.Client``.
 
     @param url: Absolute URL to request.
-    @return: Response body decoded as UTF-8, or ``None`` on error.
-    @rtype: Optional[str]
+    @param etag: Validator sent as ``If-None-Match``.
+    @param last_modified: Validator sent as ``If-Modified-Since``.
+    @return: The response (body ``None`` on 304), or ``None`` on error.
+    @rtype: Optional[HttpResponse]
     """
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            import httpx
+
+            _CLIENT = httpx.Client(**_client_options())
+        client = _CLIENT
     try:
-        req = request.Request(url, headers={"User-Agent": "conduction-content-bot"})
-        with request.urlopen(req, timeout=15) as resp:
-            return resp.read().decode("utf-8", errors="ignore")
+        resp = client.get(url, headers=_conditional_headers(etag, last_modified))
     except Exception as e:
         logging.exception(f"Error fetching page {url}: {e}")
         return None
+    return _to_response(resp, etag, last_modified)
 
 
-def _extract_text_from_html(html_str: str) -> str:
-    """Extract readable content from HTML and normalize to basic tags.
-
-    Enriches the extracted HTML with header text (title, paragraphs, primary
-    links) from the original page when available, then keeps only basic
-    content tags and minimal attributes.
+async def _async_http_get(
+    url: str, etag: Optional[str] = None, last_modified: Optional[str] = None
+) -> Optional[HttpResponse]:
+    """Perform a (conditional) HTTP GET with the shared ``httpx.AsyncClient``.
 
-    @param html_str: Raw HTML document string.
-    @return: Sanitized, minimal HTML string.
-    @rtype: str
+    @param url: Absolute URL to request.
+    @param etag: Validator sent as ``If-None-Match``.
+    @param last_modified: Validator sent as ``If-Modified-Since``.
+    @return: The response (body ``None`` on 304), or ``None`` on error.
+    @rtype: Optional[HttpResponse]
     """
-    # extract main article HTML
-    extracted = trafilatura.extract(
-        html_str,
-        output_format="html",
-        favor_precision=True,
-        include_tables=False,
-        include_comments=False,
-    )
-    # If nothing was extracted, continue so we can append the header text from the original HTML.
-    if not extracted:
-        extracted = ""
-
-    # Build a soup from the extracted content
-    soup = BeautifulSoup(extracted, "html.parser")
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        import httpx
 
-    # add the header text to the content
+        _ASYNC_CLIENT = httpx.AsyncClient(**_client_options())
     try:
-        original = BeautifulSoup(html_str, "html.parser")
-        hero = original.select_one(
-            "header.hero, .heroBanner_qdFl, .hero, .heroContainer_i2aB, [class*='hero'], header"
-        )
-        if hero:
-            header_tag = soup.new_tag("header")
-
-            title_node = hero.find(["h1", "h2", "h3"])
-            if title_node and title_node.get_text(strip=True):
-                title_tag = soup.new_tag("h1")
-                title_tag.string = title_node.get_text(strip=True)
-                header_tag.append(title_tag)
-            for p_node in hero.find_all("p"):
-                text = p_node.get_text(strip=True)
-                if text:
-                    p_tag = soup.new_tag("p")
-                    p_tag.string = text
-                    header_tag.append(p_tag)
-            for a_node in hero.select(".buttons_AeoN a, a.primaryHeroLink_NsbJ"):
-                link_text = a_node.get_text(strip=True)
-                if link_text:
-                    a_tag = soup.new_tag("a")
-                    href_val = a_node.get("href")
-                    if href_val:
-                        a_tag["href"] = href_val
-                    a_tag.string = link_text
-                    header_tag.append(a_tag)
-            if header_tag.contents:
-                # Insert header children directly at the top without the <header> wrapper
-                children = list(header_tag.contents)
-                for child in children:
-                    child.extract()
-                for child in reversed(children):
-                    soup.insert(0, child)
-        else:
-            # Fallback: if no hero found, include the first heading on the page
-            fallback_heading = original.find(["h1", "h2", "h3"])
-            if fallback_heading and fallback_heading.get_text(strip=True):
-                title_tag = soup.new_tag("h1")
-                title_tag.string = fallback_heading.get_text(strip=True)
-                soup.insert(0, title_tag)
+        resp = await _ASYNC_CLIENT.get(url, headers=_conditional_headers(etag, last_modified))
+    except Exception as e:
+        logging.exception(f"Error fetching page {url}: {e}")
+        return None
+    return _to_response(resp, etag, last_modified)
 
-    except Exception:
-        # Best-effort enrichment; ignore failures and fall back to extracted content only
-        pass
 
-    # keep just basic content tags
-    allowed = {
+# Tags kept in the extracted output; everything else is unwrapped (children kept)
+_ALLOWED_TAGS = frozenset(
+    {
         "header",
         "p",
         "h1",
@@ -184,27 +870,292 @@ def _extract_text_from_html(html_str: str) -> str:
         "code",
         "br",
     }
-    for tag in list(soup.find_all(True)):
-        if tag.name not in allowed:
-            tag.unwrap()
-        else:
-            tag.attrs = (
-                {"href": tag.get("href")} if tag.name == "a" and tag.has_attr("href") else {}
-            )
+)
+# Elements that never have content (closed as soon as they open)
+_VOID_TAGS = frozenset(
+    {
+        "area",
+        "base",
+        "basefont",
+        "bgsound",
+        "br",
+        "col",
+        "command",
+        "embed",
+        "frame",
+        "hr",
+        "image",
+        "img",
+        "input",
+        "isindex",
+        "keygen",
+        "link",
+        "menuitem",
+        "meta",
+        "nextid",
+        "param",
+        "source",
+        "spacer",
+        "track",
+        "wbr",
+    }
+)
+# Inside these, whitespace-only text is kept verbatim instead of collapsed
+_PRESERVE_WHITESPACE_TAGS = frozenset({"pre", "textarea"})
+_RAW_TEXT_TAGS = frozenset({"script", "style"})
+_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
 
-    # Remove everything from the Contact section onward (this is our footer)
+_HERO_XPATH = "//*[self::header or contains(@class, 'hero')]"
+_HERO_LINKS_XPATH = (
+    ".//*[contains(concat(' ', normalize-space(@class), ' '), ' buttons_AeoN ')]//a"
+    " | .//a[contains(concat(' ', normalize-space(@class), ' '), ' primaryHeroLink_NsbJ ')]"
+)
+
+
+def _extract_text_from_html(html_str: str) -> str:
+    """Extract readable content from HTML and normalize to basic tags.
+
+    Enriches the extracted HTML with header text (title, paragraphs, primary
+    links) from the original page when available, then keeps only basic
+    content tags and minimal attributes.
+
+    The page is parsed once with lxml; the hero is read from that tree before
+    the same tree is handed to trafilatura. trafilatura's (small) output is
+    then sanitised and cut at the Contact footer in a single streaming pass.
+
+    @param html_str: Raw HTML document string.
+    @return: Sanitized, minimal HTML string.
+    @rtype: str
+    """
+    tree = _parse_document(html_str)
+
+    # Read the header text first: trafilatura prunes the tree it is given
+    header_html = ""
     try:
-        contact_header = soup.find(
-            lambda t: t.name == "h2" and t.get_text(strip=True).lower() == "contact"
-        )
-        if contact_header:
-            # remove all siblings after the Contact header at the same level
-            for sibling in list(contact_header.next_siblings):
-                sibling.extract()
-            # remove the Contact header itself
-            contact_header.extract()
+        header_tree = tree if tree is not None else lxml_html.document_fromstring(html_str)
+        header_html = _render_header(header_tree)
     except Exception:
-        # Be permissive on failures; better to return content than crash
+        # Best-effort enrichment; ignore failures and fall back to extracted content only
         pass
 
-    return str(soup)
+    import trafilatura
+
+    # extract main article HTML
+    extracted = trafilatura.extract(
+        tree if tree is not None else html_str,
+        output_format="html",
+        favor_precision=True,
+        include_tables=False,
+        include_comments=False,
+    )
+    # If nothing was extracted, continue so we can prepend the header text from the original HTML.
+    if not extracted:
+        extracted = ""
+
+    sanitizer = _Sanitizer()
+    sanitizer.feed(extracted)
+    sanitizer.close()
+    return header_html + sanitizer.result()
+
+
+def _parse_document(html_str: str) -> Optional[HtmlElement]:
+    """Parse a document with lxml the same way trafilatura would.
+
+    @param html_str: Raw HTML document string.
+    @return: Parsed tree, or ``None`` if trafilatura would reject the input.
+    @rtype: Optional[HtmlElement]
+    """
+    from trafilatura.utils import load_html
+
+    try:
+        return load_html(html_str)
+    except Exception:
+        return None
+
+
+def _render_header(tree: HtmlElement) -> str:
+    """Render the hero title, paragraphs and primary links as minimal HTML.
+
+    Falls back to the first heading of the page when there is no hero.
+
+    @param tree: Parsed document.
+    @return: HTML for the header elements, or an empty string.
+    @rtype: str
+    """
+    heroes = tree.xpath(_HERO_XPATH)
+    if not heroes:
+        fallback_heading = next(tree.iter("h1", "h2", "h3"), None)
+        title = _stripped_text(fallback_heading) if fallback_heading is not None else ""
+        return f"<h1>{_escape_text(title)}</h1>" if title else ""
+
+    hero = heroes[0]
+    parts: List[str] = []
+    title_node = next(hero.iterdescendants("h1", "h2", "h3"), None)
+    if title_node is not None:
+        title = _stripped_text(title_node)
+        if title:
+            parts.append(f"<h1>{_escape_text(title)}</h1>")
+    for p_node in hero.iterdescendants("p"):
+        text = _stripped_text(p_node)
+        if text:
+            parts.append(f"<p>{_escape_text(text)}</p>")
+    for a_node in hero.xpath(_HERO_LINKS_XPATH):
+        link_text = _stripped_text(a_node)
+        if link_text:
+            href_val = a_node.get("href")
+            href_attr = f" href={_quote_attr(href_val)}" if href_val else ""
+            parts.append(f"<a{href_attr}>{_escape_text(link_text)}</a>")
+    return "".join(parts)
+
+
+def _stripped_text(node: HtmlElement) -> str:
+    """Concatenate the stripped text runs below ``node``, skipping scripts/styles.
+
+    @param node: Element to collect text from.
+    @return: Joined text.
+    @rtype: str
+    """
+    texts = node.xpath("descendant-or-self::*[not(self::script or self::style)]/text()")
+    return "".join(text.strip() for text in texts)
+
+
+def _escape_text(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _quote_attr(value: str) -> str:
+    value = _escape_text(value)
+    if '"' in value:
+        if "'" in value:
+            return '"' + value.replace('"', "&quot;") + '"'
+        return f"'{value}'"
+    return f'"{value}"'
+
+
+class _Sanitizer(HTMLParser):
+    """Single-pass allow-list filter and footer cut over extracted HTML.
+
+    Tags outside ``_ALLOWED_TAGS`` are dropped while their content is kept,
+    allowed tags lose all attributes except ``href`` on links, and whitespace
+    only text collapses to one newline or space (except inside ``<pre>``).
+    The first ``<h2>Contact</h2>`` and everything after it up to the end of
+    its enclosing allowed element is removed (that is our site footer).
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self._out: List[str] = []
+        self._data: List[str] = []
+        # open elements as (tag, allowed), outermost first
+        self._stack: List[Tuple[str, bool]] = []
+        self._preserve_depth = 0
+        # open allowed <h2>s as (stack index, output index, text runs)
+        self._h2s: List[Tuple[int, int, List[str]]] = []
+        self._cut_done = False
+        # while cutting, index of the allowed element whose remainder is dropped (-1 = root)
+        self._skip_until: Optional[int] = None
+
+    def result(self) -> str:
+        return "".join(self._out)
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        self._flush_data()
+        allowed = tag in _ALLOWED_TAGS
+        if allowed and self._skip_until is None:
+            href = None
+            if tag == "a":
+                for name, value in attrs:
+                    if name == "href":
+                        href = value or ""
+            self._out.append(
+                f"<{tag} href={_quote_attr(href)}>" if href is not None else f"<{tag}>"
+            )
+        if tag in _VOID_TAGS:
+            if allowed and self._skip_until is None:
+                # void elements serialize as <br/>: rewrite the opening tag
+                self._out[-1] = self._out[-1][:-1] + "/>"
+            return
+        self._stack.append((tag, allowed))
+        if tag in _PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth += 1
+        if allowed and tag == "h2" and not self._cut_done and self._skip_until is None:
+            self._h2s.append((len(self._stack) - 1, len(self._out) - 1, []))
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        self._flush_data()
+        match = None
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index][0] == tag:
+                match = index
+                break
+        if match is None:
+            return
+        while len(self._stack) > match:
+            self._pop()
+
+    def handle_data(self, data: str) -> None:
+        self._data.append(data)
+
+    def handle_comment(self, data: str) -> None:
+        self._flush_data()
+        if self._skip_until is None:
+            self._out.append(f"<!--{data}-->")
+
+    def handle_decl(self, decl: str) -> None:
+        self._flush_data()
+        if self._skip_until is None:
+            self._out.append(f"<!{decl}>")
+
+    def handle_pi(self, data: str) -> None:
+        self._flush_data()
+        if self._skip_until is None:
+            self._out.append(f"<?{data}>")
+
+    def close(self) -> None:
+        super().close()
+        self._flush_data()
+        while self._stack:
+            self._pop()
+
+    def _pop(self) -> None:
+        index = len(self._stack) - 1
+        tag, allowed = self._stack.pop()
+        if tag in _PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth -= 1
+        if self._skip_until is not None and index <= self._skip_until:
+            self._skip_until = None
+        if self._skip_until is not None or not allowed:
+            return
+        self._out.append(f"</{tag}>")
+        if self._h2s and self._h2s[-1][0] == index:
+            _, out_index, texts = self._h2s.pop()
+            if "".join(texts).lower() == "contact":
+                # Remove the Contact header and every following sibling
+                del self._out[out_index:]
+                self._h2s.clear()
+                self._cut_done = True
+                self._skip_until = next(
+                    (i for i in range(index - 1, -1, -1) if self._stack[i][1]),
+                    -1,
+                )
+
+    def _flush_data(self) -> None:
+        if not self._data:
+            return
+        data = "".join(self._data)
+        self._data = []
+        if self._skip_until is not None:
+            return
+        if not data.strip(_ASCII_SPACES) and not self._preserve_depth:
+            data = "\n" if "\n" in data else " "
+        for _, _, texts in self._h2s:
+            texts.append(data.strip())
+        if self._stack and self._stack[-1][0] in _RAW_TEXT_TAGS:
+            self._out.append(data)
+        else:
+            self._out.append(_escape_text(data))
@@ -0,0 +1,515 @@
+"""Persistent conversation stores shared between processes and replicas.
+
+Both stores expose the same ``pin``/``unpin``/``get``/``put``/``metrics``
+interface as the in-memory ``ConversationStore``; ``create_conversation_store``
+picks one from a URL:
+
+- empty or ``memory://`` -- in-process ``ConversationStore``
+- ``sqlite:///path/to/conversations.db`` -- SQLite in WAL mode, for replicas
+  or worker processes sharing a volume
+- ``redis://[[user]:password@]host[:port][/db]`` (or ``rediss://``) -- any
+  Redis-protocol server, through redis-py (the ``redis`` extra)
+
+State is stored as JSON. The lock returned by ``pin`` is held across processes
+(a lease row in SQLite, ``SET NX PX`` in Redis) and is reentrant within a
+thread. ``put`` calls made while holding it are buffered and written in one go
+when the outermost ``with`` block exits, before the lock is released.
+"""
+
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from threading import Lock, RLock, get_ident, local
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Union
+from urllib.parse import urlsplit
+
+from .conversation_store import ConversationStore
+
+if TYPE_CHECKING:
+    import redis
+
+# Compare-and-delete, so a lock whose lease expired and was taken over by
+# another process is not released by its previous owner
+_REDIS_RELEASE_SCRIPT = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then"
+    " return redis.call('del', KEYS[1]) else return 0 end"
+)
+
+
+class ConversationLock:
+    """Reentrant lock on one conversation, held across processes.
+
+    A local ``RLock`` serialises threads of this process; the outermost
+    acquisition additionally takes the store's distributed lock, and the
+    outermost release flushes buffered writes before giving it up.
+    """
+
+    def __init__(self, store: "_PersistentConversationStore", conversation_id: str) -> None:
+        self._store = store
+        self._conversation_id = conversation_id
+        self._local = RLock()
+        self._depth = 0
+        self._owner: Optional[int] = None
+        self._token: Optional[str] = None
+
+    def __enter__(self) -> "ConversationLock":
+        self._local.acquire()
+        if self._depth == 0:
+            try:
+                self._token = self._store._acquire_remote(self._conversation_id)
+            except BaseException:
+                self._local.release()
+                raise
+            self._owner = get_ident()
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._depth -= 1
+        try:
+            if self._depth == 0:
+                self._owner = None
+                try:
+                    self._store._flush(self._conversation_id)
+                finally:
+                    self._store._release_remote(self._conversation_id, self._token or "")
+                    self._token = None
+        finally:
+            self._local.release()
+
+    def held_by_current_thread(self) -> bool:
+        return self._owner == get_ident()
+
+
+class _PersistentConversationStore(ABC):
+    """Shared plumbing: locks, pins, write buffering and JSON (de)serialisation.
+
+    Subclasses implement ``_load``, ``_store``, ``_try_acquire`` and
+    ``_release_remote``.
+
+    @param lock_lease_seconds: A distributed lock expires after this long, so
+    a crashed process cannot block a conversation forever.
+    @param lock_timeout_seconds: Give up waiting for a lock after this long.
+    """
+
+    def __init__(self, lock_lease_seconds: float = 30, lock_timeout_seconds: float = 10) -> None:
+        self.lock_lease_seconds = lock_lease_seconds
+        self.lock_timeout_seconds = lock_timeout_seconds
+        self._lock = Lock()
+        self._locks: Dict[str, ConversationLock] = {}
+        self._pins: Dict[str, int] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._counters = {"writes": 0, "lock_waits": 0, "lock_timeouts": 0}
+
+    def pin(self, conversation_id: str, factory: Callable[[], Dict[str, Any]]) -> ConversationLock:
+        """Return the lock for a conversation; pair with ``unpin``.
+
+        @param conversation_id: Slack thread timestamp identifying the conversation.
+        @param factory: Unused; state is created lazily by ``get``.
+        @return: The cross-process lock guarding this conversation's state.
+        @rtype: ConversationLock
+        """
+        with self._lock:
+            lock = self._locks.get(conversation_id)
+            if lock is None:
+                lock = ConversationLock(self, conversation_id)
+                self._locks[conversation_id] = lock
+            self._pins[conversation_id] = self._pins.get(conversation_id, 0) + 1
+            return lock
+
+    def unpin(self, conversation_id: str) -> None:
+        """Release a ``pin``; the local lock is dropped with the last one.
+
+        @param conversation_id: Conversation passed to ``pin``.
+        """
+        with self._lock:
+            pins = self._pins.get(conversation_id, 0) - 1
+            if pins > 0:
+                self._pins[conversation_id] = pins
+                return
+            self._pins.pop(conversation_id, None)
+            self._locks.pop(conversation_id, None)
+
+    def get(self, conversation_id: str, factory: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the state of a conversation, or a new one from ``factory``.
+
+        @param conversation_id: Slack thread timestamp identifying the conversation.
+        @param factory: Builds the initial state for a new conversation.
+        @return: The state dict; changes must be saved with ``put``.
+        @rtype: Dict[str, Any]
+        """
+        with self._lock:
+            pending = self._pending.get(conversation_id)
+        if pending is not None:
+            return pending
+        raw = self._load(conversation_id)
+        if raw is None:
+            return factory()
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            logging.warning(f"Discarding unreadable state of conversation {conversation_id}: {e}")
+            return factory()
+
+    def put(self, conversation_id: str, state: Dict[str, Any]) -> None:
+        """Save a conversation's state (buffered while its lock is held).
+
+        @param conversation_id: Slack thread timestamp identifying the conversation.
+        @param state: The state dict; must be JSON serialisable.
+        """
+        with self._lock:
+            lock = self._locks.get(conversation_id)
+            if lock is not None and lock.held_by_current_thread():
+                self._pending[conversation_id] = state
+                return
+        self._write(conversation_id, state)
+
+    def metrics(self) -> Dict[str, int]:
+        """Return pinned conversations and write/lock counters.
+
+        @return: Counters keyed ``pinned``, ``writes``, ``lock_waits`` and
+        ``lock_timeouts``.
+        @rtype: Dict[str, int]
+        """
+        with self._lock:
+            return {"pinned": len(self._pins), **self._counters}
+
+    def _flush(self, conversation_id: str) -> None:
+        with self._lock:
+            state = self._pending.pop(conversation_id, None)
+        if state is not None:
+            self._write(conversation_id, state)
+
+    def _write(self, conversation_id: str, state: Dict[str, Any]) -> None:
+        self._store(conversation_id, json.dumps(state))
+        with self._lock:
+            self._counters["writes"] += 1
+
+    def _acquire_remote(self, conversation_id: str) -> str:
+        """Take the distributed lock, polling with backoff until the timeout.
+
+        @param conversation_id: Conversation to lock.
+        @return: Owner token to release the lock with.
+        @rtype: str
+        @raises: TimeoutError if the lock is not obtained in time.
+        """
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout_seconds
+        delay = 0.005
+        waited = False
+        while not self._try_acquire(conversation_id, token):
+            if time.monotonic() >= deadline:
+                with self._lock:
+                    self._counters["lock_timeouts"] += 1
+                raise TimeoutError(f"Timed out waiting for lock on conversation {conversation_id}")
+            if not waited:
+                waited = True
+                with self._lock:
+                    self._counters["lock_waits"] += 1
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        return token
+
+    @abstractmethod
+    def _load(self, conversation_id: str) -> Optional[Union[str, bytes]]:
+        """Return the stored JSON state of a conversation, or ``None``."""
+
+    @abstractmethod
+    def _store(self, conversation_id: str, state: str) -> None:
+        """Save the JSON state of a conversation."""
+
+    @abstractmethod
+    def _try_acquire(self, conversation_id: str, token: str) -> bool:
+        """Take the distributed lock for ``token`` if it is free or its lease expired."""
+
+    @abstractmethod
+    def _release_remote(self, conversation_id: str, token: str) -> None:
+        """Release the distributed lock, only if ``token`` still owns it."""
+
+
+class SQLiteConversationStore(_PersistentConversationStore):
+    """Conversation store in a SQLite database (WAL mode).
+
+    @param path: Database file; share it between processes on the same host
+    or volume.
+    @param max_entries: Maximum number of conversations kept.
+    @param idle_ttl_seconds: Conversations untouched this long are deleted;
+    non-positive disables idle eviction.
+    @param lock_lease_seconds: See ``_PersistentConversationStore``.
+    @param lock_timeout_seconds: See ``_PersistentConversationStore``.
+    """
+
+    # Run eviction at most this often, piggybacking on writes
+    PRUNE_INTERVAL_SECONDS = 60.0
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 1000,
+        idle_ttl_seconds: float = 86400,
+        lock_lease_seconds: float = 30,
+        lock_timeout_seconds: float = 10,
+    ) -> None:
+        super().__init__(lock_lease_seconds, lock_timeout_seconds)
+        self.path = path
+        self.max_entries = max_entries
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._local_conn = local()
+        self._last_prune = 0.0
+        self._counters.update(evictions_idle=0, evictions_capacity=0)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            " conversation_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_locks ("
+            " conversation_id TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def metrics(self) -> Dict[str, int]:
+        """Return stored conversations and bytes plus write/lock/eviction counters.
+
+        @return: ``conversations`` and ``approx_bytes`` (size of the stored
+        JSON) next to the counters of the base class and evictions.
+        @rtype: Dict[str, int]
+        """
+        count, size = (
+            self._conn()
+            .execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(state)), 0) FROM conversations")
+            .fetchone()
+        )
+        return {"conversations": count, "approx_bytes": size, **super().metrics()}
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; autocommit, with an explicit transaction around
+        # a write and the eviction that piggybacks on it
+        conn = getattr(self._local_conn, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local_conn.conn = conn
+        return conn
+
+    def _load(self, conversation_id: str) -> Optional[str]:
+        row = (
+            self._conn()
+            .execute(
+                "SELECT state FROM conversations WHERE conversation_id = ?", (conversation_id,)
+            )
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def _store(self, conversation_id: str, state: str) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO conversations (conversation_id, state, updated_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(conversation_id) DO UPDATE"
+                " SET state = excluded.state, updated_at = excluded.updated_at",
+                (conversation_id, state, now),
+            )
+            if now - self._last_prune >= self.PRUNE_INTERVAL_SECONDS:
+                self._last_prune = now
+                self._prune(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        """Delete idle conversations and the oldest ones beyond ``max_entries``."""
+        idle = 0
+        if self.idle_ttl_seconds > 0:
+            idle = conn.execute(
+                "DELETE FROM conversations WHERE updated_at < ?", (now - self.idle_ttl_seconds,)
+            ).rowcount
+        capacity = conn.execute(
+            "DELETE FROM conversations WHERE conversation_id IN ("
+            " SELECT conversation_id FROM conversations"
+            " ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (max(self.max_entries, 0),),
+        ).rowcount
+        conn.execute("DELETE FROM conversation_locks WHERE expires_at < ?", (now,))
+        if idle or capacity:
+            with self._lock:
+                self._counters["evictions_idle"] += idle
+                self._counters["evictions_capacity"] += capacity
+            logging.info(f"Evicted {idle + capacity} conversation(s) from {self.path}")
+
+    def _try_acquire(self, conversation_id: str, token: str) -> bool:
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO conversation_locks (conversation_id, owner, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(conversation_id) DO UPDATE"
+            " SET owner = excluded.owner, expires_at = excluded.expires_at"
+            " WHERE conversation_locks.expires_at < ?",
+            (conversation_id, token, now + self.lock_lease_seconds, now),
+        )
+        return cursor.rowcount == 1
+
+    def _release_remote(self, conversation_id: str, token: str) -> None:
+        self._conn().execute(
+            "DELETE FROM conversation_locks WHERE conversation_id = ? AND owner = ?",
+            (conversation_id, token),
+        )
+
+
+class RedisConversationStore(_PersistentConversationStore):
+    """Conversation store on a Redis-protocol server.
+
+    Idle conversations expire through key TTLs. Every write also records the
+    conversation in a sorted set by time, and at most once per
+    ``PRUNE_INTERVAL_SECONDS`` the least recently written conversations beyond
+    ``max_entries`` are deleted (not atomically: a conversation written by
+    another process at that moment may be dropped too, like any old one).
+
+    @param client: redis-py client for the server.
+    @param max_entries: Maximum number of conversations kept.
+    @param idle_ttl_seconds: Key TTL, refreshed on every write; non-positive
+    keeps conversations until evicted by the cap.
+    @param key_prefix: Prefix for all keys written by the store.
+    @param lock_lease_seconds: See ``_PersistentConversationStore``.
+    @param lock_timeout_seconds: See ``_PersistentConversationStore``.
+    """
+
+    # Run eviction at most this often, piggybacking on writes
+    PRUNE_INTERVAL_SECONDS = 60.0
+
+    def __init__(
+        self,
+        client: "redis.Redis",
+        max_entries: int = 1000,
+        idle_ttl_seconds: float = 86400,
+        key_prefix: str = "content-bot:",
+        lock_lease_seconds: float = 30,
+        lock_timeout_seconds: float = 10,
+    ) -> None:
+        super().__init__(lock_lease_seconds, lock_timeout_seconds)
+        self.client = client
+        self.max_entries = max_entries
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.key_prefix = key_prefix
+        # Sorted set of conversation ids, scored by their last write (epoch seconds)
+        self._index = f"{key_prefix}conversations"
+        self._last_prune = 0.0
+        self._counters.update(evictions_idle=0, evictions_capacity=0)
+
+    def metrics(self) -> Dict[str, int]:
+        """Return stored conversations plus write/lock/eviction counters.
+
+        @return: ``conversations`` (entries in the index, including idle ones
+        not pruned yet) next to the counters of the base class and evictions.
+        @rtype: Dict[str, int]
+        """
+        return {"conversations": self.client.zcard(self._index), **super().metrics()}
+
+    def _key(self, conversation_id: str) -> str:
+        return f"{self.key_prefix}conversation:{conversation_id}"
+
+    def _load(self, conversation_id: str) -> Optional[bytes]:
+        return self.client.get(self._key(conversation_id))
+
+    def _store(self, conversation_id: str, state: str) -> None:
+        now = time.time()
+        ttl_ms = int(self.idle_ttl_seconds * 1000) if self.idle_ttl_seconds > 0 else None
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(self._key(conversation_id), state, px=ttl_ms)
+        pipe.zadd(self._index, {conversation_id: now})
+        pipe.execute()
+        if now - self._last_prune >= self.PRUNE_INTERVAL_SECONDS:
+            self._last_prune = now
+            try:
+                self._prune(now)
+            except Exception as e:
+                logging.exception(f"Error evicting conversations from Redis: {e}")
+
+    def _prune(self, now: float) -> None:
+        """Forget expired conversations and delete the oldest ones beyond ``max_entries``."""
+        idle = 0
+        if self.idle_ttl_seconds > 0:
+            # Their keys already expired; only the index still lists them
+            idle = self.client.zremrangebyscore(self._index, "-inf", now - self.idle_ttl_seconds)
+        excess = self.client.zcard(self._index) - max(self.max_entries, 0)
+        capacity = 0
+        if excess > 0:
+            oldest = [
+                member.decode("utf-8") if isinstance(member, bytes) else member
+                for member in self.client.zrange(self._index, 0, excess - 1)
+            ]
+            if oldest:
+                pipe = self.client.pipeline(transaction=False)
+                pipe.delete(*[self._key(conversation_id) for conversation_id in oldest])
+                pipe.zrem(self._index, *oldest)
+                pipe.execute()
+                capacity = len(oldest)
+        if idle or capacity:
+            with self._lock:
+                self._counters["evictions_idle"] += idle
+                self._counters["evictions_capacity"] += capacity
+            logging.info(f"Evicted {idle + capacity} conversation(s) from Redis")
+
+    def _try_acquire(self, conversation_id: str, token: str) -> bool:
+        return bool(
+            self.client.set(
+                f"{self.key_prefix}lock:{conversation_id}",
+                token,
+                nx=True,
+                px=int(self.lock_lease_seconds * 1000),
+            )
+        )
+
+    def _release_remote(self, conversation_id: str, token: str) -> None:
+        self.client.eval(
+            _REDIS_RELEASE_SCRIPT, 1, f"{self.key_prefix}lock:{conversation_id}", token
+        )
+
+
+def create_conversation_store(
+    url: str,
+    max_entries: int = 1000,
+    idle_ttl_seconds: float = 86400,
+    max_bytes: int = 0,
+) -> Union[ConversationStore, SQLiteConversationStore, RedisConversationStore]:
+    """Create the conversation store configured by ``url``.
+
+    @param url: Empty or ``memory://``, ``sqlite:///path`` or ``redis://...``
+    (``rediss://`` for TLS).
+    @param max_entries: Entry cap (all stores).
+    @param idle_ttl_seconds: Idle eviction TTL (all stores).
+    @param max_bytes: Approximate byte cap (in-memory only).
+    @return: The store.
+    @raises: ValueError for an unsupported URL scheme; ImportError for a
+    Redis URL without redis-py installed.
+    """
+    scheme = urlsplit(url).scheme if url else "memory"
+    if scheme == "memory":
+        return ConversationStore(
+            max_entries=max_entries, idle_ttl_seconds=idle_ttl_seconds, max_bytes=max_bytes
+        )
+    if scheme == "sqlite":
+        return SQLiteConversationStore(
+            url[len("sqlite://") :], max_entries=max_entries, idle_ttl_seconds=idle_ttl_seconds
+        )
+    if scheme in ("redis", "rediss"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError(
+                "A redis:// CONVERSATION_STORE_URL needs redis-py:"
+                " pip install 'conduction-content-bot[redis]'"
+            ) from e
+        return RedisConversationStore(
+            redis.Redis.from_url(url), max_entries=max_entries, idle_ttl_seconds=idle_ttl_seconds
+        )
+    raise ValueError(f"Unsupported conversation store URL: {url}")
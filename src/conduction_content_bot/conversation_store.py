@@ -0,0 +1,176 @@
+"""Bounded in-memory store for per-thread conversation state.
+
+Each conversation (Slack ``thread_ts``) owns a state dict and the lock that
+guards it. Entries are kept in least-recently-used order and evicted when they
+have been idle longer than ``idle_ttl_seconds`` or when the store exceeds its
+entry or (approximate) byte cap. State and lock are dropped together, and an
+entry is never evicted while a handler has it pinned, so two handlers can
+never end up with different locks for the same conversation.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock, RLock
+from typing import Any, Callable, Dict
+
+
+class _Entry:
+    __slots__ = ("state", "lock", "last_access", "approx_bytes", "pins")
+
+    def __init__(self, state: Dict[str, Any]) -> None:
+        self.state = state
+        self.lock = RLock()
+        self.last_access = time.monotonic()
+        self.approx_bytes = approx_state_bytes(state)
+        self.pins = 0
+
+
+def approx_state_bytes(value: Any) -> int:
+    """Roughly estimate the memory held by a conversation state.
+
+    Counts string lengths inside nested dicts/lists; enough to compare
+    conversations and enforce a cap, not an exact ``sys.getsizeof`` total.
+
+    @param value: State dict (or any nested value within it).
+    @return: Approximate size in bytes.
+    @rtype: int
+    """
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(approx_state_bytes(k) + approx_state_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(approx_state_bytes(v) for v in value)
+    return 8
+
+
+class ConversationStore:
+    """LRU + idle-TTL store of conversation state and per-conversation locks.
+
+    @param max_entries: Maximum number of conversations kept.
+    @param idle_ttl_seconds: Conversations untouched this long are evicted;
+    non-positive disables idle eviction.
+    @param max_bytes: Cap on the summed ``approx_state_bytes``; non-positive
+    disables the cap.
+    """
+
+    def __init__(
+        self, max_entries: int = 1000, idle_ttl_seconds: float = 86400, max_bytes: int = 0
+    ) -> None:
+        self.max_entries = max_entries
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = Lock()
+        self._bytes = 0
+        self._evictions = {"idle": 0, "capacity": 0}
+
+    def pin(self, conversation_id: str, factory: Callable[[], Dict[str, Any]]) -> RLock:
+        """Mark a conversation in use (creating it if needed) and return its lock.
+
+        Every ``pin`` must be paired with an ``unpin`` once the handler is done.
+
+        @param conversation_id: Slack thread timestamp identifying the conversation.
+        @param factory: Builds the initial state for a new conversation.
+        @return: The lock guarding this conversation's state.
+        @rtype: RLock
+        """
+        with self._lock:
+            entry = self._touch(conversation_id, factory)
+            entry.pins += 1
+            self._evict()
+            return entry.lock
+
+    def unpin(self, conversation_id: str) -> None:
+        """Release a ``pin``; the conversation becomes evictable again.
+
+        @param conversation_id: Conversation passed to ``pin``.
+        """
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None and entry.pins > 0:
+                entry.pins -= 1
+            self._evict()
+
+    def get(self, conversation_id: str, factory: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the state of a conversation, creating it if needed.
+
+        @param conversation_id: Slack thread timestamp identifying the conversation.
+        @param factory: Builds the initial state for a new conversation.
+        @return: The (mutable) state dict.
+        @rtype: Dict[str, Any]
+        """
+        with self._lock:
+            entry = self._touch(conversation_id, factory)
+            self._evict()
+            return entry.state
+
+    def put(self, conversation_id: str, state: Dict[str, Any]) -> None:
+        """Store (or re-measure after in-place changes) a conversation's state.
+
+        @param conversation_id: Slack thread timestamp identifying the conversation.
+        @param state: The state dict.
+        """
+        with self._lock:
+            entry = self._touch(conversation_id, lambda: state)
+            entry.state = state
+            new_bytes = approx_state_bytes(state)
+            self._bytes += new_bytes - entry.approx_bytes
+            entry.approx_bytes = new_bytes
+            self._evict()
+
+    def metrics(self) -> Dict[str, int]:
+        """Return live conversation count, approximate bytes held and evictions.
+
+        @return: Counters keyed ``conversations``, ``approx_bytes``,
+        ``pinned``, ``evictions_idle`` and ``evictions_capacity``.
+        @rtype: Dict[str, int]
+        """
+        with self._lock:
+            return {
+                "conversations": len(self._entries),
+                "approx_bytes": self._bytes,
+                "pinned": sum(1 for entry in self._entries.values() if entry.pins),
+                "evictions_idle": self._evictions["idle"],
+                "evictions_capacity": self._evictions["capacity"],
+            }
+
+    def _touch(self, conversation_id: str, factory: Callable[[], Dict[str, Any]]) -> _Entry:
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            entry = _Entry(factory())
+            self._entries[conversation_id] = entry
+            self._bytes += entry.approx_bytes
+        else:
+            self._entries.move_to_end(conversation_id)
+        entry.last_access = time.monotonic()
+        return entry
+
+    def _evict(self) -> None:
+        """Drop idle and over-capacity entries, least recently used first."""
+        now = time.monotonic()
+        evicted = 0
+        for conversation_id in list(self._entries.keys()):
+            entry = self._entries[conversation_id]
+            idle = self.idle_ttl_seconds > 0 and now - entry.last_access > self.idle_ttl_seconds
+            over_capacity = len(self._entries) > self.max_entries or (
+                self.max_bytes > 0 and self._bytes > self.max_bytes
+            )
+            if not idle and not over_capacity:
+                break
+            if entry.pins:
+                continue
+            del self._entries[conversation_id]
+            self._bytes -= entry.approx_bytes
+            self._evictions["idle" if idle else "capacity"] += 1
+            evicted += 1
+        if evicted:
+            logging.info(
+                f"Evicted {evicted} conversation(s); {len(self._entries)} live,"
+                f" ~{self._bytes} bytes held"
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
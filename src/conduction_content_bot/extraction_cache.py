@@ -0,0 +1,187 @@
+"""Flat-file cache of extracted page content that survives restarts.
+
+Extraction results are stored under ``<directory>/extracted/`` keyed by a
+hash of the raw HTML and the extractor version, so an unchanged page is never
+extracted twice, also not by other replicas sharing the volume. Next to that,
+``<directory>/pages/`` holds the last-known-good record per page key (content
+hash plus HTTP validators) so a fresh process can serve content immediately.
+
+All writes go through a temporary file and ``os.replace`` so readers never see
+partial files.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional, Set
+
+
+class ExtractionCache:
+    """On-disk store for extracted HTML and per-page last-known-good records.
+
+    @param directory: Root directory of the cache; created on first write.
+    @param max_files: Maximum number of extracted entries kept; the oldest are
+    pruned when exceeded, except those a page record still points to.
+    """
+
+    def __init__(self, directory: str, max_files: int = 256) -> None:
+        self.directory = directory
+        self.max_files = max_files
+        self._extracted_dir = os.path.join(directory, "extracted")
+        self._pages_dir = os.path.join(directory, "pages")
+
+    @staticmethod
+    def content_key(html_str: str, extractor_version: str) -> str:
+        """Return the cache key for a raw HTML document.
+
+        @param html_str: Raw HTML as fetched.
+        @param extractor_version: Version of the extraction code; bumping it
+        invalidates all entries.
+        @return: Hex SHA-256 digest.
+        @rtype: str
+        """
+        digest = hashlib.sha256()
+        digest.update(extractor_version.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(html_str.encode("utf-8", errors="ignore"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the extracted content stored under ``key``, if any.
+
+        @param key: Key from ``content_key``.
+        @return: Extracted HTML, or ``None`` when missing or unreadable.
+        @rtype: Optional[str]
+        """
+        path = os.path.join(self._extracted_dir, f"{key}.html")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logging.warning(f"Error reading extraction cache {path}: {e}")
+            return None
+
+    def put(self, key: str, content: str) -> None:
+        """Store extracted content under ``key`` and prune old entries.
+
+        @param key: Key from ``content_key``.
+        @param content: Extracted HTML.
+        """
+        path = os.path.join(self._extracted_dir, f"{key}.html")
+        if self._write_atomic(path, content):
+            self._prune()
+
+    def load_page(self, page_key: str) -> Optional[Dict[str, Any]]:
+        """Return the last-known-good record for a page, including its content.
+
+        @param page_key: Page key the record was saved under.
+        @return: Dict with ``content``, ``content_key``, ``extractor_version``,
+        ``etag``, ``last_modified`` and ``saved_at`` (epoch seconds), or ``None``.
+        @rtype: Optional[Dict[str, Any]]
+        """
+        path = os.path.join(self._pages_dir, f"{page_key}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Error reading page record {path}: {e}")
+            return None
+        if not isinstance(record, dict) or not record.get("content_key"):
+            return None
+        content = self.get(str(record["content_key"]))
+        if content is None:
+            return None
+        record["content"] = content
+        return record
+
+    def save_page(
+        self,
+        page_key: str,
+        content_key: str,
+        extractor_version: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        """Record ``content_key`` as the last-known-good content of a page.
+
+        @param page_key: Page key to save the record under.
+        @param content_key: Key of the extracted entry (must already be stored).
+        @param extractor_version: Version of the extraction code that produced it.
+        @param etag: ``ETag`` of the response the content came from.
+        @param last_modified: ``Last-Modified`` of that response.
+        """
+        record = {
+            "content_key": content_key,
+            "extractor_version": extractor_version,
+            "etag": etag,
+            "last_modified": last_modified,
+            "saved_at": time.time(),
+        }
+        path = os.path.join(self._pages_dir, f"{page_key}.json")
+        self._write_atomic(path, json.dumps(record))
+
+    def _write_atomic(self, path: str, data: str) -> bool:
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            return True
+        except OSError as e:
+            logging.warning(f"Error writing extraction cache {path}: {e}")
+            return False
+
+    def _referenced_keys(self) -> Set[str]:
+        """Return the content keys the last-known-good page records point to."""
+        keys: Set[str] = set()
+        try:
+            paths = [entry.path for entry in os.scandir(self._pages_dir) if entry.is_file()]
+        except FileNotFoundError:
+            return keys
+        for path in paths:
+            if not path.endswith(".json"):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if isinstance(record, dict) and record.get("content_key"):
+                keys.add(str(record["content_key"]))
+        return keys
+
+    def _prune(self) -> None:
+        """Delete the oldest unreferenced extracted entries beyond ``max_files``."""
+        try:
+            entries = [
+                entry
+                for entry in os.scandir(self._extracted_dir)
+                if entry.is_file() and entry.name.endswith(".html")
+            ]
+            excess = len(entries) - self.max_files
+            if excess <= 0:
+                return
+            referenced = self._referenced_keys()
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries:
+                if excess <= 0:
+                    break
+                if entry.name[: -len(".html")] in referenced:
+                    continue
+                os.unlink(entry.path)
+                excess -= 1
+        except OSError as e:
+            logging.warning(f"Error pruning extraction cache: {e}")
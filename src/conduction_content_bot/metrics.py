@@ -0,0 +1,460 @@
+"""Prometheus-style metrics without extra dependencies.
+
+Modules create their instruments on the shared ``REGISTRY`` at import time
+and update them on the hot path; that only takes a short lock, so it is done
+whether or not anything scrapes. ``start_http_server`` (``METRICS_PORT``)
+serves ``REGISTRY.render()`` in the Prometheus text format from a daemon
+thread.
+
+Besides counters, gauges and histograms that are updated directly, a
+``callback`` metric reads its value(s) when scraped, which is how the bots
+export the statistics their components already keep (``metrics()`` of the
+conversation store, scheduler, coalescer, retry policy and router).
+
+``Registry.add_remote`` merges the metrics another process serves (a worker
+in sharded mode) into ``render()``, labelled with the process, so one
+scrape covers them all.
+"""
+
+import logging
+import math
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+# Seconds; spans a lock wait (ms) up to a slow model call with retries (minutes)
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+CallbackResult = Union[float, Dict[LabelValues, float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _sample(name: str, labelnames: Sequence[str], values: Sequence[str], value: float) -> str:
+    if not labelnames:
+        return f"{name} {_format_value(value)}"
+    labels = ",".join(f'{key}="{_escape(str(val))}"' for key, val in zip(labelnames, values))
+    return f"{name}{{{labels}}} {_format_value(value)}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return lines + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """A value that only goes up (requests, retries, cache hits)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def by_labels(self) -> Dict[LabelValues, float]:
+        """Return a copy of every series, keyed by its label values."""
+        with self._lock:
+            return dict(self._values)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [_sample(self.name, self.labelnames, key, value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down (calls in flight)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [_sample(self.name, self.labelnames, key, value) for key, value in items]
+
+
+class Histogram(_Metric):
+    """Durations in cumulative buckets, with their sum and count.
+
+    @param buckets: Upper bounds in seconds, ascending; ``+Inf`` is added.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> (per-bucket counts, sum)
+        self._series: Dict[LabelValues, Tuple[List[int], float]] = {}
+
+    def observe(self, seconds: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._series.get(key) or ([0] * len(self.buckets), 0.0)
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[index] += 1
+                    break
+            self._series[key] = (counts, total + seconds)
+
+    def time(self, **labels: Any) -> "_Timer":
+        """Context manager that observes the duration of its block."""
+        return _Timer(self, labels)
+
+    def totals(self, **labels: Any) -> Tuple[int, float]:
+        """Return the number and sum of observations for ``labels``.
+
+        @rtype: Tuple[int, float]
+        """
+        with self._lock:
+            counts, total = self._series.get(self._key(labels)) or ([], 0.0)
+            return sum(counts), total
+
+    def quantile(self, fraction: float, **labels: Any) -> Optional[float]:
+        """Estimate a quantile from the buckets, like PromQL's ``histogram_quantile``.
+
+        @param fraction: E.g. 0.99.
+        @return: Seconds (interpolated within a bucket), or ``None`` without observations.
+        @rtype: Optional[float]
+        """
+        with self._lock:
+            counts = list((self._series.get(self._key(labels)) or ([], 0.0))[0])
+        rank = fraction * sum(counts)
+        if not counts or rank <= 0:
+            return None
+        cumulative, lower = 0, 0.0
+        for bound, count in zip(self.buckets, counts):
+            if count and cumulative + count >= rank:
+                if math.isinf(bound):
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound if not math.isinf(bound) else lower
+        return lower
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = sorted(
+                (key, list(counts), total) for key, (counts, total) in self._series.items()
+            )
+        lines: List[str] = []
+        bucket_labels = self.labelnames + ("le",)
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = "+Inf" if math.isinf(bound) else _format_value(bound)
+                lines.append(_sample(f"{self.name}_bucket", bucket_labels, key + (le,), cumulative))
+            lines.append(_sample(f"{self.name}_sum", self.labelnames, key, total))
+            lines.append(_sample(f"{self.name}_count", self.labelnames, key, cumulative))
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, Any]) -> None:
+        self._histogram = histogram
+        self._labels = labels
+        self._started = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._histogram.observe(time.perf_counter() - self._started, **self._labels)
+
+
+class _Callback(_Metric):
+    """Values read from ``function`` on every scrape."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        function: Callable[[], CallbackResult],
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.function = function
+
+    def _samples(self) -> List[str]:
+        try:
+            result = self.function()
+        except Exception as e:
+            logging.exception(f"Error collecting metric {self.name}: {e}")
+            return []
+        items = sorted(result.items()) if isinstance(result, dict) else [((), result)]
+        return [_sample(self.name, self.labelnames, key, value) for key, value in items]
+
+
+class Registry:
+    """The metrics of this process, rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._remotes: List[Tuple[str, str, str]] = []
+        self._lock = Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        function: Callable[[], CallbackResult],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ) -> None:
+        """Export values another component keeps, read on each scrape.
+
+        @param function: Returns the value, or a dict of label values -> value.
+        @param kind: ``"gauge"`` or ``"counter"`` (for totals since start).
+        """
+        self._register(_Callback(name, documentation, kind, function, labelnames))
+
+    def add_remote(self, url: str, labelname: str, labelvalue: str) -> None:
+        """Include the metrics served at ``url`` in ``render()``.
+
+        Their samples get the extra label ``labelname="labelvalue"``; a
+        remote that does not answer is left out of that scrape.
+
+        @param url: Metrics endpoint of the other process.
+        @param labelname: Label telling the processes apart, e.g. ``worker``.
+        @param labelvalue: Its value for this process.
+        """
+        with self._lock:
+            self._remotes.append((url, labelname, labelvalue))
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format.
+
+        @rtype: str
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            remotes = list(self._remotes)
+        text = "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+        if not remotes:
+            return text
+        # Samples of one metric must stay together, so merge per metric family
+        families = _families(text)
+        for url, labelname, labelvalue in remotes:
+            remote = _scrape(url)
+            if remote is None:
+                continue
+            for name, (header, samples) in _families(remote).items():
+                family = families.setdefault(name, (header, []))
+                family[1].extend(_add_label(sample, labelname, labelvalue) for sample in samples)
+        lines = [line for header, samples in families.values() for line in header + samples]
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: Any) -> Any:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+
+def _families(text: str) -> "OrderedDict[str, Tuple[List[str], List[str]]]":
+    """Split an exposition into ``name -> (HELP/TYPE lines, samples)``, in order."""
+    families: "OrderedDict[str, Tuple[List[str], List[str]]]" = OrderedDict()
+    name = ""
+    for line in text.splitlines():
+        if line.startswith("# "):
+            parts = line.split(" ", 3)
+            if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                name = parts[2]
+                families.setdefault(name, ([], []))[0].append(line)
+        elif line:
+            families.setdefault(name, ([], []))[1].append(line)
+    return families
+
+
+def _add_label(sample: str, labelname: str, labelvalue: str) -> str:
+    label = f'{labelname}="{_escape(labelvalue)}"'
+    brace, space = sample.find("{"), sample.find(" ")
+    if brace != -1 and brace < space:
+        return f"{sample[:brace + 1]}{label},{sample[brace + 1:]}"
+    return f"{sample[:space]}{{{label}}}{sample[space:]}"
+
+
+def _scrape(url: str) -> Optional[str]:
+    from urllib.error import URLError
+    from urllib.request import urlopen
+
+    try:
+        with urlopen(url, timeout=2) as resp:
+            return resp.read().decode("utf-8")
+    except (URLError, OSError) as e:
+        # A worker that is restarting; its samples return with the next scrape
+        logging.debug(f"Error scraping metrics from {url}: {e}")
+        return None
+
+
+class TimedLock:
+    """Wraps a conversation lock and records how long each ``with`` waited for it.
+
+    @param lock: The lock (any context manager).
+    @param histogram: Where the wait is observed.
+    @param labels: Labels for the observation.
+    """
+
+    def __init__(self, lock: Any, histogram: Histogram, **labels: Any) -> None:
+        self._lock = lock
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self) -> Any:
+        started = time.perf_counter()
+        result = self._lock.__enter__()
+        self._histogram.observe(time.perf_counter() - started, **self._labels)
+        return result
+
+    def __exit__(self, *exc_info: Any) -> Optional[bool]:
+        return self._lock.__exit__(*exc_info)
+
+
+REGISTRY = Registry()
+
+# Shared by the bots and content_fetcher
+STAGE_SECONDS = REGISTRY.histogram(
+    "content_bot_stage_seconds",
+    "Time spent per stage of handling a message (lock_wait, prompt_fetch, extraction, handler)",
+    ["stage"],
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "content_bot_cache_lookups_total",
+    "Cache lookups by cache (page, extraction, response) and result",
+    ["cache", "result"],
+)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Scrapes every few seconds would flood the log
+        pass
+
+
+def start_http_server(
+    port: int, registry: Registry = REGISTRY, addr: str = "0.0.0.0"
+) -> ThreadingHTTPServer:
+    """Serve ``registry`` on ``http://addr:port/metrics`` from a daemon thread.
+
+    @param port: TCP port (0 picks a free one; see ``server.server_port``).
+    @param registry: Metrics to serve.
+    @param addr: Interface to listen on.
+    @return: The running server.
+    @rtype: ThreadingHTTPServer
+    """
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    server = ThreadingHTTPServer((addr, port), handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"Serving metrics on {addr}:{server.server_port}/metrics")
+    return server
@@ -0,0 +1,187 @@
+"""Shared, versioned system prompts referenced by conversations.
+
+Conversations do not keep their own copy of the (multi-KB) system prompt.
+They store ``(page_key, version)``, where the version is a hash of the page's
+reference content, plus the reference sections chosen for them. The reference
+is interned here once per version, split into sections and indexed for
+retrieval at the same time, and the rendered prompt is cached so every thread
+on that version shares one string. The prompt always holds the full page, so
+it is a prefix shared by all those threads that the provider's prompt cache
+can serve; the sections chosen for a thread are named in a separate, later
+message (see ``section_headings``). A thread keeps the version it started
+with, so refreshed site content only reaches it when it is moved to a newer
+version on purpose.
+"""
+
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .retrieval import BM25Index, Section, split_sections
+
+
+class PageReference(NamedTuple):
+    """One version of a page's reference content, split and indexed."""
+
+    version: str
+    reference: str
+    sections: List[Section]
+    index: BM25Index
+
+
+class PromptRegistry:
+    """Interned page references and rendered prompts, keyed by content version.
+
+    @param loader: Returns the current reference content of a page key
+    (``None`` when it cannot be loaded).
+    @param renderer: Builds the system prompt from a page key and its reference content.
+    @param max_versions_per_page: Number of versions kept per page; older ones
+    are dropped and their threads move to the current version when next used.
+    @param max_rendered: Number of rendered prompts cached.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Optional[str]],
+        renderer: Callable[[str, str], str],
+        max_versions_per_page: int = 4,
+        max_rendered: int = 128,
+    ) -> None:
+        self.loader = loader
+        self.renderer = renderer
+        self.max_versions_per_page = max_versions_per_page
+        self.max_rendered = max_rendered
+        self._versions: Dict[str, "OrderedDict[str, PageReference]"] = {}
+        self._rendered: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def version_of(reference: str) -> str:
+        """Return the content version of a reference text.
+
+        @param reference: Reference content.
+        @return: Short hex digest of the text.
+        @rtype: str
+        """
+        return hashlib.sha256(reference.encode("utf-8")).hexdigest()[:16]
+
+    def resolve(self, page_key: str) -> Optional[str]:
+        """Load the current reference of a page and intern it.
+
+        @param page_key: Canonical page identifier.
+        @return: The current version, or ``None`` if it could not be loaded.
+        @rtype: Optional[str]
+        """
+        reference = self.loader(page_key)
+        if reference is None:
+            return None
+        version = self.version_of(reference)
+        with self._lock:
+            versions = self._versions.setdefault(page_key, OrderedDict())
+            if version in versions:
+                versions.move_to_end(version)
+                return version
+        sections = split_sections(reference)
+        index = BM25Index([section.content for section in sections])
+        entry = PageReference(version, reference, sections, index)
+        with self._lock:
+            versions.setdefault(version, entry)
+            versions.move_to_end(version)
+            while len(versions) > self.max_versions_per_page:
+                versions.popitem(last=False)
+        return version
+
+    def get(self, page_key: str, version: str) -> Optional[PageReference]:
+        """Return a specific version of a page's reference.
+
+        @param page_key: Canonical page identifier.
+        @param version: Version returned by ``resolve``.
+        @return: The interned reference, or ``None`` if that version is not
+        (or no longer) known, e.g. after a restart.
+        @rtype: Optional[PageReference]
+        """
+        with self._lock:
+            return self._versions.get(page_key, {}).get(version)
+
+    def select_sections(
+        self, page_key: str, version: str, query: str, k: int
+    ) -> Optional[List[int]]:
+        """Pick the title/hero section plus the ``k`` sections most relevant to ``query``.
+
+        @param page_key: Canonical page identifier.
+        @param version: Version returned by ``resolve``.
+        @param query: The user's description of the content they need.
+        @param k: Number of sections next to the hero; non-positive selects all.
+        @return: Section indices in document order, or ``None`` for the full
+        reference (retrieval disabled, nothing matched, or unknown version).
+        @rtype: Optional[List[int]]
+        """
+        entry = self.get(page_key, version)
+        if entry is None or k <= 0 or len(entry.sections) <= k + 1:
+            return None
+        best = entry.index.top_k(query, k, exclude=(0,))
+        if not best:
+            return None
+        return sorted([0] + best)
+
+    def render(self, page_key: str, version: str) -> Optional[str]:
+        """Return the system prompt of a version, with the full reference.
+
+        @param page_key: Canonical page identifier.
+        @param version: Version returned by ``resolve``.
+        @return: The (cached) prompt, or ``None`` if the version is unknown.
+        @rtype: Optional[str]
+        """
+        key = (page_key, version)
+        with self._lock:
+            prompt = self._rendered.get(key)
+            if prompt is not None:
+                self._rendered.move_to_end(key)
+                return prompt
+        entry = self.get(page_key, version)
+        if entry is None:
+            return None
+        prompt = self.renderer(page_key, entry.reference)
+        with self._lock:
+            prompt = self._rendered.setdefault(key, prompt)
+            while len(self._rendered) > self.max_rendered:
+                self._rendered.popitem(last=False)
+        return prompt
+
+    def section_headings(
+        self, page_key: str, version: str, sections: Optional[Sequence[int]]
+    ) -> List[str]:
+        """Return the headings of a section selection, without the title/hero section.
+
+        @param page_key: Canonical page identifier.
+        @param version: Version returned by ``resolve``.
+        @param sections: Section indices from ``select_sections``; ``None``
+        for the full reference.
+        @return: Non-empty headings in document order; empty for the full
+        reference or an unknown version.
+        @rtype: List[str]
+        """
+        entry = self.get(page_key, version)
+        if entry is None or sections is None:
+            return []
+        return [
+            entry.sections[i].heading
+            for i in sections
+            if 0 < i < len(entry.sections) and entry.sections[i].heading
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of interned versions and rendered prompts, and their size.
+
+        @return: Counters keyed ``versions``, ``rendered`` and ``bytes``.
+        @rtype: Dict[str, int]
+        """
+        with self._lock:
+            references = [e.reference for v in self._versions.values() for e in v.values()]
+            rendered = list(self._rendered.values())
+        return {
+            "versions": len(references),
+            "rendered": len(rendered),
+            "bytes": sum(len(text) for text in references + rendered),
+        }
@@ -1,12 +1,18 @@
 import json
 import logging
 import os
+import re
+import unicodedata
+from functools import lru_cache
 from typing import Dict, List, Optional
 
 from .content_fetcher import get_reference_content
+from .metrics import STAGE_SECONDS
 
 
-# Reference content per page is stored in an external JSON file.
+# Reference content per page is stored in an external JSON file, read on first
+# use (it is only needed when the live page is not available).
+@lru_cache(maxsize=1)
 def _load_reference_content() -> Dict[str, str]:
     try:
         json_path = os.path.join(os.path.dirname(__file__), "reference_content.json")
@@ -20,45 +26,97 @@ def _load_reference_content() -> Dict[str, str]:
     return {}
 
 
-REFERENCE_CONTENT: Dict[str, str] = _load_reference_content()
-
-
-def build_system_prompt(page_key: str) -> Optional[str]:
+def load_reference(page_key: str) -> Optional[str]:
     """
-    Return a system prompt tailored to a specific page, including reference content.
+    Return the reference content for a page: live-site content, falling back
+    to the bundled reference strings.
 
     @param page_key: Canonical page identifier (e.g., 'OVER_ONS', 'LINKEDIN').
-    @returns: Prompt string for the language model.
+    @returns: Reference text/HTML, or None if fetching failed unexpectedly.
     """
     # Prefer live-site content; fallback to local reference strings
     try:
-        live_reference = get_reference_content(page_key)
+        with STAGE_SECONDS.time(stage="prompt_fetch"):
+            live_reference = get_reference_content(page_key)
     except Exception as e:
         logging.exception(f"Error fetching reference content: {e}")
         return None
 
-    reference = (
-        live_reference or REFERENCE_CONTENT.get(page_key) or REFERENCE_CONTENT.get("HOME", "")
+    if live_reference:
+        return canonicalize_reference(live_reference)
+    reference_content = _load_reference_content()
+    return canonicalize_reference(
+        reference_content.get(page_key) or reference_content.get("HOME", "")
     )
+
+
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+_ZERO_WIDTH_RE = re.compile("[\u200b\u200c\u200d\u2060\ufeff]")
+
+
+def canonicalize_reference(reference: str) -> str:
+    """
+    Normalise reference content so cosmetic changes to the site (whitespace,
+    comments, zero-width characters, Unicode composition) do not change the
+    prompt bytes, its version or the provider's prompt cache key.
+
+    @param reference: Extracted HTML or plain-text reference.
+    @returns: NFC text without comments or zero-width characters, with runs
+    of whitespace collapsed to one space and empty lines removed.
+    """
+    text = unicodedata.normalize("NFC", reference)
+    text = _COMMENT_RE.sub("", text)
+    text = _ZERO_WIDTH_RE.sub("", text)
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+# Static instructions come first and the (canonical) reference last, so every
+# request for the same page version starts with the same bytes and can reuse
+# the provider's prompt cache.
+_LINKEDIN_INSTRUCTIONS = (
+    "Schrijf een korte LinkedIn-post in het Nederlands, menselijk en to-the-point. "
+    "Vermijd buzzwords, eindig met een natuurlijke call-to-action of vraag. "
+    "Match de tone-of-voice met de referenties hieronder."
+)
+# Unified instructions for all website pagina's (niet-LinkedIn)
+_PAGE_INSTRUCTIONS = (
+    "Schrijf een compacte paragraaf (Markdown) die past bij de gekozen"
+    " website-pagina. "
+    "Schrijf aanvullend op de bestaande inhoud: voeg nieuwe, relevante"
+    " informatie toe die logisch in de huidige context past. "
+    "Vermijd herhaling van informatie die al op de pagina staat. "
+    "Tone-of-voice: helder, nuchter, professioneel maar menselijk. "
+    "Geef de output in Markdown. LET OP: de voorbeeldtekst is in html maar"
+    " de output moet in markdown zijn."
+)
+
+
+def render_system_prompt(page_key: str, reference: str) -> str:
+    """
+    Return a system prompt tailored to a specific page around its full
+    reference content.
+
+    @param page_key: Canonical page identifier (e.g., 'OVER_ONS', 'LINKEDIN').
+    @param reference: Reference content to include.
+    @returns: Prompt string for the language model.
+    """
     if page_key == "LINKEDIN":
-        return (
-            "Schrijf een korte LinkedIn-post in het Nederlands, menselijk en to-the-point. "
-            "Vermijd buzzwords, eindig met een natuurlijke call-to-action of vraag. "
-            "Match de tone-of-voice met de referenties hieronder.\n\n"
-            f"Referentie (LinkedIn):\n{reference}"
-        )
-    # Unified prompt for all website pagina's (niet-LinkedIn)
-    return (
-        "Schrijf een compacte paragraaf (Markdown) die past bij de gekozen"
-        " website-pagina. "
-        "Schrijf aanvullend op de bestaande inhoud: voeg nieuwe, relevante"
-        " informatie toe die logisch in de huidige context past. "
-        "Vermijd herhaling van informatie die al op de pagina staat. "
-        "Tone-of-voice: helder, nuchter, professioneel maar menselijk. "
-        "Geef de output in Markdown. LET OP: de voorbeeldtekst is in html maar"
-        " de output moet in markdown zijn.\n\n"
-        f"Referentie:\n{reference}"
-    )
+        return f"{_LINKEDIN_INSTRUCTIONS}\n\nReferentie (LinkedIn):\n{reference}"
+    return f"{_PAGE_INSTRUCTIONS}\n\nReferentie:\n{reference}"
+
+
+def render_focus_prompt(headings: List[str]) -> str:
+    """
+    Return the per-thread message naming the reference sections that match
+    the user's description. It is sent after the system prompt, so the
+    system prompt stays the same for every thread on a page version.
+
+    @param headings: Headings of the selected sections, in document order.
+    @returns: Prompt string for the language model.
+    """
+    lines = "\n".join(f"- {heading}" for heading in headings)
+    return f"Sluit vooral aan bij deze onderdelen van de referentie:\n{lines}"
 
 
 # Map van herkenbare keywords naar page keys.
@@ -80,6 +138,9 @@ KEYWORD_TO_PAGE: Dict[str, str] = {
     "home": "HOME",
 }
 
+# Optioneel JSON-bestand met extra synoniemen, bijv. {"opleidingen": "TRAININGEN"}
+KEYWORD_SYNONYMS_FILE = os.getenv("KEYWORD_SYNONYMS_FILE", "")
+
 
 # Representative, "mooiste" display-key per unieke page key.
 # De volgorde hieronder bepaalt de weergavevolgorde in help/reset-berichten.
@@ -94,19 +155,74 @@ PAGE_TO_DISPLAY_KEY: Dict[str, str] = {
 }
 
 
+def _load_keyword_synonyms(path: str) -> Dict[str, str]:
+    """
+    Load extra keyword -> page key mappings from a JSON file.
+
+    @param path: Path to a JSON object of keyword/page key pairs; empty to skip.
+    @returns: Lower-cased keywords mapped to known page keys.
+    """
+    if not path:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        logging.exception(f"Error loading keyword synonyms from {path}: {e}")
+        return {}
+    if not isinstance(data, dict):
+        logging.error(f"Keyword synonyms in {path} must be a JSON object")
+        return {}
+    synonyms: Dict[str, str] = {}
+    for keyword, page_key in data.items():
+        keyword = " ".join(str(keyword).lower().split())
+        if keyword and page_key in PAGE_TO_DISPLAY_KEY:
+            synonyms[keyword] = page_key
+        else:
+            logging.warning(f"Ignoring keyword synonym {keyword!r} -> {page_key!r}")
+    return synonyms
+
+
+def _compile_keyword_pattern(keywords: Dict[str, str]) -> "re.Pattern[str]":
+    """
+    Compile all keywords into one regex matching whole words only.
+
+    Langere keywords staan eerst in de alternatie, zodat op elke positie de
+    langste match wint ('linkedin post' boven 'linkedin'). Spaties in een
+    keyword matchen op willekeurige witruimte.
+
+    @param keywords: Keyword -> page key mapping.
+    @returns: Compiled pattern.
+    """
+    alternatives = [
+        r"\s+".join(re.escape(part) for part in keyword.split())
+        for keyword in sorted(keywords, key=lambda k: (-len(k), k))
+    ]
+    return re.compile(r"(?<!\w)(?:" + "|".join(alternatives) + r")(?!\w)")
+
+
+KEYWORD_TO_PAGE.update(_load_keyword_synonyms(KEYWORD_SYNONYMS_FILE))
+_KEYWORD_PATTERN = _compile_keyword_pattern(KEYWORD_TO_PAGE)
+
+
 def detect_page_key(user_text: str) -> Optional[str]:
     """
     Detect the canonical page key from user-provided text.
 
+    Keywords only match as whole words ('post' matcht niet in 'postcode');
+    bij meerdere keywords wint de langste (bij gelijke lengte de eerste).
+
     @param user_text: Raw user text possibly containing a known keyword.
     @returns: Matching page key or None if not found.
     """
     text = (user_text or "").strip().lower()
     if not text:
         return None
-    # Zoek naar de langste match (zodat 'linkedin post' boven 'linkedin' gaat)
-    candidates: List[str] = sorted(KEYWORD_TO_PAGE.keys(), key=lambda k: -len(k))
-    for keyword in candidates:
-        if keyword in text:
-            return KEYWORD_TO_PAGE[keyword]
-    return None
+    best: Optional[str] = None
+    for match in _KEYWORD_PATTERN.finditer(text):
+        keyword = match.group(0)
+        if best is None or len(keyword) > len(best):
+            best = keyword
+    if best is None:
+        return None
+    return KEYWORD_TO_PAGE[" ".join(best.split())]
@@ -0,0 +1,395 @@
+"""Shared retry policy for model calls: server-provided delays, a retry budget
+and a circuit breaker.
+
+Every conversation used to retry on its own with blind exponential backoff,
+so an OpenAI incident multiplied the load. ``RetryPolicy`` decides for all of
+them:
+
+- how long to wait: ``Retry-After`` / ``retry-after-ms`` or the
+  ``x-ratelimit-reset-*`` header of the exhausted limit when the server sends
+  them, exponential backoff with jitter otherwise;
+- whether to retry at all: retries are limited to a fraction of the requests
+  made in the last minute (``RetryBudget``), plus a small reserve so a quiet
+  bot can still retry;
+- whether to call at all: after consecutive provider failures (5xx,
+  timeouts, dropped connections) an endpoint's ``CircuitBreaker`` opens and
+  calls to it fail fast with ``CircuitOpenError``; after a cool-down one probe
+  call is let through (half-open) and its outcome closes or re-opens the
+  circuit.
+
+Rate-limit responses (429) are retried after the server's delay but do not
+count as provider failures.
+"""
+
+import logging
+import random
+import re
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from typing import Any, Deque, Dict, Mapping, Optional
+
+# "1s", "6m0s", "20ms", "1m30.5s", "2h" (OpenAI's x-ratelimit-reset-* format)
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the circuit is open.
+
+    @param retry_in: Seconds until a probe call will be let through.
+    """
+
+    def __init__(self, retry_in: float) -> None:
+        super().__init__(f"LLM provider unavailable; retrying in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parse an ``x-ratelimit-reset-*`` duration such as ``"6m0s"`` or ``"20ms"``.
+
+    @param value: Header value; a bare number is taken as seconds.
+    @return: Seconds, or ``None`` if it cannot be parsed.
+    @rtype: Optional[float]
+    """
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts or "".join(n + u for n, u in parts) != value:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def server_delay(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Return the delay the server asked for in a (rate-limit) response.
+
+    Prefers ``retry-after-ms`` and ``Retry-After`` (seconds or an HTTP
+    date); otherwise uses the ``x-ratelimit-reset-*`` header of the limit
+    that is exhausted (or the soonest reset if none is reported exhausted).
+
+    @param headers: Response headers (case-insensitive mapping).
+    @return: Seconds to wait, or ``None`` if the server gave no hint.
+    @rtype: Optional[float]
+    """
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(float(retry_after_ms) / 1000.0, 0.0)
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    resets: Dict[str, float] = {}
+    for limit in ("requests", "tokens"):
+        raw = headers.get(f"x-ratelimit-reset-{limit}")
+        seconds = parse_duration(raw) if raw else None
+        if seconds is not None:
+            resets[limit] = seconds
+    if not resets:
+        return None
+    exhausted = [
+        seconds
+        for limit, seconds in resets.items()
+        if headers.get(f"x-ratelimit-remaining-{limit}", "").strip() == "0"
+    ]
+    return max(exhausted) if exhausted else min(resets.values())
+
+
+class RetryBudget:
+    """Caps retries at a fraction of recent requests, process-wide.
+
+    @param ratio: Retries allowed per request made in the window (0.1 = 10%).
+    @param min_retries: Retries always allowed per window, for quiet periods.
+    @param window_seconds: Length of the rolling window.
+    """
+
+    def __init__(
+        self, ratio: float = 0.1, min_retries: int = 3, window_seconds: float = 60.0
+    ) -> None:
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+        self._lock = Lock()
+        self.rejected = 0
+
+    def record_request(self) -> None:
+        """Count a first attempt."""
+        with self._lock:
+            self._requests.append(time.monotonic())
+
+    def try_retry(self) -> bool:
+        """Spend one retry if the budget allows it.
+
+        @return: ``True`` if the retry may go ahead.
+        @rtype: bool
+        """
+        with self._lock:
+            now = time.monotonic()
+            for events in (self._requests, self._retries):
+                while events and events[0] < now - self.window_seconds:
+                    events.popleft()
+            allowed = max(self.min_retries, self.ratio * len(self._requests))
+            if len(self._retries) >= allowed:
+                self.rejected += 1
+                return False
+            self._retries.append(now)
+            return True
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over consecutive provider failures.
+
+    @param failure_threshold: Consecutive failures that open the circuit.
+    @param recovery_seconds: Time the circuit stays open before a probe.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_seconds: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self._lock = Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def check(self) -> None:
+        """Let a call through, or fail fast while the circuit is open.
+
+        In the half-open state only one probe call is in flight at a time;
+        its outcome must be reported with ``record_success`` or
+        ``record_failure``.
+
+        @raises: CircuitOpenError while open (or while a probe is running).
+        """
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            now = time.monotonic()
+            retry_in = self._opened_at + self.recovery_seconds - now
+            if self._state == self.OPEN and retry_in <= 0:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+                logging.warning("LLM circuit half-open; probing the provider")
+            # A probe that never reported back (e.g. a cancelled task) is replaced
+            if self._state == self.HALF_OPEN and (
+                not self._probe_in_flight or now - self._probe_started > self.recovery_seconds
+            ):
+                self._probe_in_flight = True
+                self._probe_started = now
+                return
+            raise CircuitOpenError(max(retry_in, 1.0))
+
+    def available(self) -> bool:
+        """Whether ``check`` would let a call through now (without starting a probe).
+
+        @rtype: bool
+        """
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.OPEN:
+                return now >= self._opened_at + self.recovery_seconds
+            if self._state == self.HALF_OPEN:
+                return (
+                    not self._probe_in_flight or now - self._probe_started > self.recovery_seconds
+                )
+            return True
+
+    def record_success(self) -> None:
+        """Report that the provider answered (closes a half-open circuit)."""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logging.warning("LLM circuit closed; provider recovered")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Report a provider failure (opens the circuit at the threshold)."""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                logging.warning(
+                    f"LLM circuit open after {self._failures} consecutive failures;"
+                    f" failing fast for {self.recovery_seconds:.0f}s"
+                )
+
+
+class RetryPolicy:
+    """Retry decisions shared by every model call in the process.
+
+    Circuit breakers are kept per key (the endpoint a call goes to), so one
+    failing endpoint does not stop calls to the others.
+
+    @param max_retries: Retries per call on top of the first attempt.
+    @param backoff_base_seconds: First backoff delay when the server gives none.
+    @param backoff_max_seconds: Cap on the exponential backoff.
+    @param retry_after_max_seconds: Give up instead of waiting when the server
+    asks for a longer delay than this.
+    @param budget: Process-wide retry budget.
+    @param failure_threshold: Consecutive failures that open a circuit (0 = off).
+    @param recovery_seconds: Time a circuit stays open before a probe.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_base_seconds: float = 1.0,
+        backoff_max_seconds: float = 15.0,
+        retry_after_max_seconds: float = 60.0,
+        budget: Optional[RetryBudget] = None,
+        failure_threshold: int = 5,
+        recovery_seconds: float = 30.0,
+    ) -> None:
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.retry_after_max_seconds = retry_after_max_seconds
+        self.budget = budget or RetryBudget()
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = Lock()
+
+    def breaker(self, key: str = "") -> CircuitBreaker:
+        """Return the circuit breaker for ``key``, creating it on first use.
+
+        @rtype: CircuitBreaker
+        """
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.recovery_seconds)
+                self._breakers[key] = breaker
+            return breaker
+
+    def available(self, key: str = "") -> bool:
+        """Whether calls to ``key`` are let through now.
+
+        @rtype: bool
+        """
+        return self.breaker(key).available()
+
+    def before_attempt(self, attempt_index: int, key: str = "") -> None:
+        """Call before every attempt.
+
+        @param attempt_index: Zero-based attempt number.
+        @param key: Endpoint the attempt goes to.
+        @raises: CircuitOpenError while the endpoint is considered down.
+        """
+        self.breaker(key).check()
+        if attempt_index == 0:
+            self.budget.record_request()
+
+    def on_success(self, key: str = "") -> None:
+        """Call when an attempt to ``key`` succeeded."""
+        self.breaker(key).record_success()
+
+    def retry_delay(self, err: BaseException, attempt_index: int, key: str = "") -> Optional[float]:
+        """Record a failed attempt and decide whether to retry it.
+
+        @param err: The error the attempt raised.
+        @param attempt_index: Zero-based attempt number.
+        @param key: Endpoint the attempt went to.
+        @return: Seconds to wait before the next attempt, or ``None`` to give
+        up (re-raise ``err``).
+        @rtype: Optional[float]
+        """
+        if is_provider_failure(err):
+            self.breaker(key).record_failure()
+        else:
+            # The provider answered (or the caller gave up): it is reachable
+            self.breaker(key).record_success()
+        if not is_retryable(err) or attempt_index >= self.max_retries:
+            return None
+        delay = server_delay(_headers_of(err))
+        if delay is not None and delay > self.retry_after_max_seconds:
+            logging.warning(f"Provider asked to wait {delay:.0f}s; not retrying")
+            return None
+        if not self.budget.try_retry():
+            logging.warning(f"LLM retry budget exhausted; not retrying: {err}")
+            return None
+        if delay is None:
+            delay = min(
+                self.backoff_base_seconds * (2**attempt_index) + random.uniform(0, 0.5),
+                self.backoff_max_seconds,
+            )
+        return delay
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return the circuit state per key and the number of retries refused
+        by the budget.
+
+        @rtype: Dict[str, Any]
+        """
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {
+            "circuits": {key: breaker.state for key, breaker in breakers.items()},
+            "retries_refused": self.budget.rejected,
+        }
+
+
+def is_retryable(err: BaseException) -> bool:
+    """Whether ``err`` is worth retrying: rate limits, timeouts, connection
+    errors (also mid-stream) and 5xx responses.
+
+    @rtype: bool
+    """
+    # Imported here: the errors only exist once a call was made, and the SDKs are slow to import
+    import httpx
+    from openai import APIConnectionError, APIStatusError, RateLimitError
+
+    if isinstance(err, (RateLimitError, APIConnectionError, httpx.TransportError)):
+        return True
+    return isinstance(err, APIStatusError) and 500 <= err.status_code < 600
+
+
+def is_provider_failure(err: BaseException) -> bool:
+    """Whether ``err`` counts against the provider's health (not rate limits).
+
+    @rtype: bool
+    """
+    from openai import RateLimitError
+
+    return is_retryable(err) and not isinstance(err, RateLimitError)
+
+
+def _headers_of(err: BaseException) -> Optional[Mapping[str, str]]:
+    response = getattr(err, "response", None)
+    return getattr(response, "headers", None)
@@ -0,0 +1,130 @@
+"""Exact-match cache of first-turn drafts.
+
+Colleagues often open a thread with the same request for the same page (the
+standard LinkedIn event announcement, say). Such a first turn is fully
+determined by the messages sent to the model: the thread's system prompt
+version plus one user message. The cache maps a hash of those messages and
+the configured models to the draft they produced, so a repeat is answered
+without a model call. Entries are kept in least-recently-used order and
+expire after ``ttl_seconds``.
+
+Follow-up turns, variant requests and regenerations are never looked up: they
+depend on an earlier draft or ask for a new one on purpose.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """Fold case and whitespace, so "Post over  Hosting " matches "post over hosting".
+
+    @param text: A user message.
+    @return: The normalised text.
+    @rtype: str
+    """
+    return " ".join(text.split()).casefold()
+
+
+def first_turn_key(messages: List[dict], models: List[str]) -> Optional[str]:
+    """Return the cache key for a first-turn request, or ``None`` for any other request.
+
+    A first turn is the thread's system prompt followed by one user message
+    (no summary, no earlier drafts).
+
+    @param messages: The materialised messages of the request.
+    @param models: Labels of the configured models, best first.
+    @return: A sha256 hex digest, or ``None`` if the request must not be cached.
+    @rtype: Optional[str]
+    """
+    roles = [message.get("role") for message in messages]
+    if roles != ["system", "user"]:
+        return None
+    system, user = messages
+    payload = json.dumps(
+        [models, system.get("content", ""), normalize_text(user.get("content", ""))],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL map from request keys to drafts.
+
+    @param max_entries: Maximum number of drafts kept; non-positive disables the cache.
+    @param ttl_seconds: Drafts older than this are not served; non-positive
+    keeps them until evicted.
+    """
+
+    def __init__(self, max_entries: int = 0, ttl_seconds: float = 3600) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached draft for ``key`` and count a hit or miss.
+
+        @param key: From ``first_turn_key``.
+        @return: The draft, or ``None`` if absent or expired.
+        @rtype: Optional[str]
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._entries[key]
+                self._stats["evictions"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key: str, draft: str) -> None:
+        """Store (or replace) the draft for ``key``, evicting the least recently used.
+
+        @param key: From ``first_turn_key``.
+        @param draft: The generated draft.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), draft)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def hit_rate(self) -> float:
+        """Share of lookups answered from the cache since start.
+
+        @rtype: float
+        """
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return self._stats["hits"] / lookups if lookups else 0.0
+
+    def metrics(self) -> Dict[str, float]:
+        """Return entry count, hit/miss/eviction counters and the hit rate.
+
+        @rtype: Dict[str, float]
+        """
+        hit_rate = self.hit_rate()
+        with self._lock:
+            return {"entries": len(self._entries), **self._stats, "hit_rate": round(hit_rate, 3)}
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.monotonic() - stored_at > self.ttl_seconds
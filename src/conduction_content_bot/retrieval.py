@@ -0,0 +1,147 @@
+"""Split reference content into sections and rank them with BM25.
+
+Extracted pages are HTML and split before every ``<h1>``..``<h6>``; the
+bundled plain-text references are split on short heading-like lines. The
+first section is the page's hero/title and is always included by callers;
+the rest are ranked against the user's description with Okapi BM25 in pure
+Python (a page has tens of sections, so no vector library is needed).
+"""
+
+import html
+import math
+import re
+from collections import Counter
+from typing import List, NamedTuple, Sequence
+
+_HEADING_SPLIT_RE = re.compile(r"(?=<h[1-6][\s>])", re.IGNORECASE)
+_HEADING_RE = re.compile(r"<h[1-6][^>]*>(.*?)</h[1-6]>", re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"\w+")
+# Plain-text heading: a short line without sentence punctuation at the end
+_MAX_PLAIN_HEADING_CHARS = 60
+
+# Frequent Dutch (and some English) words that carry no topical signal
+_STOPWORDS = frozenset("""
+    de het een en van in op te dat die voor met is zijn aan als ook er bij om
+    of naar door over dan tot uit je jij we wij ons onze u uw ze zij hun hij
+    niet maar nog wel al wat hoe wordt worden kan kunnen moet moeten meer
+    deze dit zo waar wie geen heel graag even iets toe per via
+    the a an and of to for with on is are be this that it
+    """.split())
+
+
+class Section(NamedTuple):
+    """One chunk of reference content: its heading and its raw text/HTML."""
+
+    heading: str
+    content: str
+
+
+def split_sections(reference: str) -> List[Section]:
+    """Split reference content into sections, each starting at a heading.
+
+    @param reference: Extracted page HTML or plain-text reference.
+    @return: Sections in document order; the first holds the title/hero.
+    @rtype: List[Section]
+    """
+    if _HEADING_SPLIT_RE.search(reference):
+        chunks = [c for c in _HEADING_SPLIT_RE.split(reference) if c.strip()]
+        return [Section(_html_heading(c), c) for c in chunks]
+
+    sections: List[Section] = []
+    current: List[str] = []
+    for line in reference.splitlines():
+        stripped = line.strip()
+        if current and _looks_like_heading(stripped):
+            sections.append(Section(current[0].strip(), "\n".join(current)))
+            current = []
+        current.append(line)
+    if current:
+        sections.append(Section(current[0].strip(), "\n".join(current)))
+    return sections
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case words of ``text`` without markup and stopwords.
+
+    @param text: Plain text or HTML.
+    @return: Index terms.
+    @rtype: List[str]
+    """
+    return [
+        word
+        for word in _WORD_RE.findall(_plain_text(text).lower())
+        if len(word) > 1 and word not in _STOPWORDS
+    ]
+
+
+class BM25Index:
+    """Okapi BM25 over a small, fixed set of documents.
+
+    @param documents: Texts to index (HTML is stripped).
+    @param k1: Term-frequency saturation.
+    @param b: Document-length normalisation.
+    """
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._term_freqs = [Counter(tokenize(doc)) for doc in documents]
+        self._lengths = [sum(tf.values()) for tf in self._term_freqs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        doc_freqs: Counter = Counter()
+        for tf in self._term_freqs:
+            doc_freqs.update(tf.keys())
+        n = len(self._term_freqs)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        """Return the BM25 score of every document for ``query``.
+
+        @param query: Free text.
+        @return: One score per document, in index order.
+        @rtype: List[float]
+        """
+        terms = [t for t in set(tokenize(query)) if t in self._idf]
+        result = []
+        for tf, length in zip(self._term_freqs, self._lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self._avg_length or 1.0))
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            result.append(score)
+        return result
+
+    def top_k(self, query: str, k: int, exclude: Sequence[int] = ()) -> List[int]:
+        """Return the indices of the ``k`` best-matching documents.
+
+        Documents that do not match any query term are never returned.
+
+        @param query: Free text.
+        @param k: Maximum number of results.
+        @param exclude: Indices to leave out (e.g. the always-included hero).
+        @return: Indices, best match first.
+        @rtype: List[int]
+        """
+        ranked = sorted(
+            ((score, i) for i, score in enumerate(self.scores(query)) if i not in exclude),
+            key=lambda item: (-item[0], item[1]),
+        )
+        return [i for score, i in ranked[:k] if score > 0]
+
+
+def _plain_text(text: str) -> str:
+    return html.unescape(_TAG_RE.sub(" ", text))
+
+
+def _html_heading(chunk: str) -> str:
+    match = _HEADING_RE.search(chunk)
+    return " ".join(_plain_text(match.group(1)).split()) if match else ""
+
+
+def _looks_like_heading(line: str) -> bool:
+    return 0 < len(line) <= _MAX_PLAIN_HEADING_CHARS and line[-1] not in ".!?:;,"
@@ -0,0 +1,271 @@
+"""Latency-aware routing of model calls over an ordered list of endpoints.
+
+``LLM_MODELS`` lists the models to use, best first; an entry may name its own
+OpenAI-compatible endpoint as ``model@base_url`` (otherwise the default
+client, i.e. ``OPENAI_BASE_URL``, is used). For every endpoint the router
+keeps a rolling window of recent calls and derives p50/p95 latency and the
+error rate from it.
+
+- Order: endpoints are tried in the configured order, except that an endpoint
+  whose recent error rate is above ``max_error_rate`` moves to the back and
+  one whose circuit is open (see resilience.py) is skipped.
+- Fallback: attempt *n* of a call (first try, then retries) goes to the *n*-th
+  endpoint in that order, so a retry lands on the next model.
+- Several completions (``n``): endpoints that ignore ``n`` are remembered so
+  callers can send parallel requests instead.
+- Hedging: when a completion takes longer than its endpoint's p95 (at least
+  ``hedge_min_delay_seconds``), a second request is sent to the next
+  endpoint and the first answer wins. Hedges are capped at ``hedge_ratio`` of
+  recent calls, which bounds the extra cost; 0 disables hedging.
+
+The router only decides and keeps statistics; the bots own the clients and
+run the requests.
+"""
+
+import logging
+import time
+from collections import deque
+from threading import Lock
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .resilience import RetryBudget, is_retryable
+
+# Kinds of latency samples: whole completions and time to first streamed token
+COMPLETION = "completion"
+FIRST_TOKEN = "first_token"
+
+
+class Endpoint(NamedTuple):
+    """A model on an OpenAI-compatible endpoint (``base_url`` None = default client)."""
+
+    model: str
+    base_url: Optional[str] = None
+
+    @property
+    def label(self) -> str:
+        return f"{self.model}@{self.base_url}" if self.base_url else self.model
+
+
+def parse_endpoints(spec: str, default_model: str) -> List[Endpoint]:
+    """Parse ``LLM_MODELS``, e.g. ``"gpt-5-mini,llama3@http://localhost:8000/v1"``.
+
+    @param spec: Comma-separated ``model`` or ``model@base_url`` entries.
+    @param default_model: Used when ``spec`` is empty.
+    @return: Endpoints in order of preference, without duplicates.
+    @rtype: List[Endpoint]
+    """
+    endpoints: List[Endpoint] = []
+    for entry in spec.split(","):
+        model, _, base_url = entry.strip().partition("@")
+        endpoint = Endpoint(model.strip(), base_url.strip().rstrip("/") or None)
+        if endpoint.model and endpoint not in endpoints:
+            endpoints.append(endpoint)
+    return endpoints or [Endpoint(default_model)]
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class _Window:
+    """Recent outcomes of one endpoint: ``(time, seconds or None, ok)``."""
+
+    def __init__(self, max_samples: int, max_age_seconds: float) -> None:
+        self.max_age_seconds = max_age_seconds
+        self.samples: Deque[Tuple[float, Optional[float], bool]] = deque(maxlen=max_samples)
+
+    def add(self, seconds: Optional[float], ok: bool) -> None:
+        self.samples.append((time.monotonic(), seconds, ok))
+
+    def recent(self) -> List[Tuple[float, Optional[float], bool]]:
+        cutoff = time.monotonic() - self.max_age_seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        return list(self.samples)
+
+
+class ModelRouter:
+    """Orders endpoints by health and decides when to hedge.
+
+    @param endpoints: Endpoints in order of preference (at least one).
+    @param hedge_ratio: Hedged calls allowed per call in the last minute; 0 disables.
+    @param hedge_min_delay_seconds: Never hedge sooner than this.
+    @param window_samples: Calls remembered per endpoint and kind.
+    @param window_seconds: Calls older than this are forgotten, so an endpoint
+    that recovered is trusted again.
+    @param min_samples: Calls needed before p95 or error rate are used.
+    @param max_error_rate: Endpoints failing more often than this go to the back.
+    @param is_available: Whether an endpoint may be called now (e.g. its circuit
+    is not open); unavailable endpoints are skipped unless all are.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        hedge_ratio: float = 0.0,
+        hedge_min_delay_seconds: float = 2.0,
+        window_samples: int = 200,
+        window_seconds: float = 300.0,
+        min_samples: int = 20,
+        max_error_rate: float = 0.5,
+        is_available: Callable[[Endpoint], bool] = lambda endpoint: True,
+    ) -> None:
+        if not endpoints:
+            raise ValueError("ModelRouter needs at least one endpoint")
+        self.endpoints = list(endpoints)
+        self.hedge_ratio = hedge_ratio
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.is_available = is_available
+        self._windows: Dict[Tuple[Endpoint, str], _Window] = {
+            (endpoint, kind): _Window(window_samples, window_seconds)
+            for endpoint in self.endpoints
+            for kind in (COMPLETION, FIRST_TOKEN)
+        }
+        self._hedges = RetryBudget(hedge_ratio, min_retries=0)
+        # Endpoints that answered a request for n completions with fewer
+        self._without_n: Set[Endpoint] = set()
+        self._stats = {"hedged": 0, "hedge_wins": 0}
+        self._lock = Lock()
+
+    def order(self) -> List[Endpoint]:
+        """Return the endpoints in the order to try them now.
+
+        @rtype: List[Endpoint]
+        """
+        with self._lock:
+            failing = [
+                endpoint
+                for endpoint in self.endpoints
+                if (self._error_rate(endpoint) or 0.0) > self.max_error_rate
+            ]
+        return [e for e in self.endpoints if e not in failing] + failing
+
+    def endpoint_for(self, attempt_index: int) -> Endpoint:
+        """Return the endpoint for attempt ``attempt_index`` of a call (fallback order).
+
+        @rtype: Endpoint
+        """
+        if attempt_index == 0:
+            self._hedges.record_request()
+        candidates = self._candidates()
+        return candidates[attempt_index % len(candidates)]
+
+    def hedge_delay(self, endpoint: Endpoint) -> Optional[float]:
+        """Return how long to wait for ``endpoint`` before hedging, or ``None``
+        if the call should not be hedged (hedging off or too few samples).
+
+        @rtype: Optional[float]
+        """
+        if self.hedge_ratio <= 0:
+            return None
+        with self._lock:
+            latencies = self._latencies(endpoint, COMPLETION)
+        if len(latencies) < self.min_samples:
+            return None
+        return max(_percentile(latencies, 0.95), self.hedge_min_delay_seconds)
+
+    def start_hedge(self, endpoint: Endpoint) -> Optional[Endpoint]:
+        """Spend hedge budget for a slow call to ``endpoint``.
+
+        @return: The endpoint to send the hedge to (the next one in order, or
+        the same one if there is only one), or ``None`` if over budget.
+        @rtype: Optional[Endpoint]
+        """
+        if not self._hedges.try_retry():
+            return None
+        with self._lock:
+            self._stats["hedged"] += 1
+        others = [e for e in self._candidates() if e != endpoint]
+        return others[0] if others else endpoint
+
+    def record_hedge_win(self) -> None:
+        """Count a hedge that answered before the original request."""
+        with self._lock:
+            self._stats["hedge_wins"] += 1
+
+    def supports_n(self, endpoint: Endpoint) -> bool:
+        """Whether ``endpoint`` is assumed to honour ``n`` (several completions per request).
+
+        @rtype: bool
+        """
+        with self._lock:
+            return endpoint not in self._without_n
+
+    def record_without_n(self, endpoint: Endpoint) -> None:
+        """Remember that ``endpoint`` ignores ``n``; later calls send parallel requests."""
+        with self._lock:
+            if endpoint not in self._without_n:
+                logging.info(f"{endpoint.label} ignores n; using parallel requests for variants")
+            self._without_n.add(endpoint)
+
+    def record(self, endpoint: Endpoint, seconds: Optional[float], ok: bool, kind: str) -> None:
+        """Record the outcome of one request.
+
+        @param endpoint: Where the request went.
+        @param seconds: Latency (``None`` for failures).
+        @param ok: Whether it succeeded.
+        @param kind: ``COMPLETION`` or ``FIRST_TOKEN``.
+        """
+        window = self._windows.get((endpoint, kind))
+        if window is not None:
+            with self._lock:
+                window.add(seconds, ok)
+
+    def record_error(self, endpoint: Endpoint, err: BaseException, kind: str) -> None:
+        """Record a failed request; errors that say nothing about the endpoint's
+        health (a 400, a superseded draft) are ignored.
+
+        @param endpoint: Where the request went.
+        @param err: The error it raised.
+        @param kind: ``COMPLETION`` or ``FIRST_TOKEN``.
+        """
+        if is_retryable(err):
+            self.record(endpoint, None, False, kind)
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """Return per-endpoint p50/p95 latency, error rate and sample counts,
+        plus hedge counters under ``"hedging"``.
+
+        @rtype: Dict[str, Dict[str, float]]
+        """
+        result: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for endpoint in self.endpoints:
+                stats: Dict[str, float] = {}
+                for kind in (COMPLETION, FIRST_TOKEN):
+                    latencies = self._latencies(endpoint, kind)
+                    if latencies:
+                        stats[f"{kind}_p50"] = round(_percentile(latencies, 0.5), 3)
+                        stats[f"{kind}_p95"] = round(_percentile(latencies, 0.95), 3)
+                outcomes = self._outcomes(endpoint)
+                stats["requests"] = len(outcomes)
+                stats["error_rate"] = round(
+                    outcomes.count(False) / len(outcomes) if outcomes else 0.0, 3
+                )
+                result[endpoint.label] = stats
+            result["hedging"] = dict(self._stats)
+        return result
+
+    def _candidates(self) -> List[Endpoint]:
+        ordered = self.order()
+        return [e for e in ordered if self.is_available(e)] or ordered
+
+    def _latencies(self, endpoint: Endpoint, kind: str) -> List[float]:
+        window = self._windows[(endpoint, kind)]
+        return [seconds for _, seconds, ok in window.recent() if ok and seconds is not None]
+
+    def _outcomes(self, endpoint: Endpoint) -> List[bool]:
+        return [
+            ok
+            for kind in (COMPLETION, FIRST_TOKEN)
+            for _, _, ok in self._windows[(endpoint, kind)].recent()
+        ]
+
+    def _error_rate(self, endpoint: Endpoint) -> Optional[float]:
+        outcomes = self._outcomes(endpoint)
+        if len(outcomes) < self.min_samples:
+            return None
+        return outcomes.count(False) / len(outcomes)
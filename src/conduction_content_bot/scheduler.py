@@ -0,0 +1,344 @@
+"""Admission control and per-user fair queueing for LLM calls.
+
+Every model call asks the scheduler for a slot first. A call is admitted when
+fewer than ``max_concurrency`` calls are running and the request and token
+buckets (refilled continuously at the organisation's RPM/TPM limits) have
+room for it; otherwise it waits in a queue. Waiting calls are admitted
+round-robin per user, so one user with many requests cannot starve the
+others. The queue is bounded: beyond ``max_queue`` waiting calls new ones are
+rejected with ``SchedulerBusy`` instead of piling up, and a call that waits
+longer than ``queue_timeout_seconds`` gives up with ``SchedulerTimeout``.
+
+Token costs are estimated up front and corrected with the actual usage when
+the call finishes; retries are charged again, so a burst of rate-limit errors
+slows admission down instead of multiplying the load.
+
+Both blocking (threaded bot) and asyncio (async bot) callers are supported;
+they share one queue.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from threading import Event, Lock, Timer
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator, Optional
+
+
+class SchedulerBusy(Exception):
+    """Raised when the wait queue is full."""
+
+
+class SchedulerTimeout(SchedulerBusy, TimeoutError):
+    """Raised when a call waited longer than the queue timeout."""
+
+
+class _TokenBucket:
+    """Continuously refilled bucket; it may go into debt when usage is corrected.
+
+    @param per_minute: Refill rate and capacity; non-positive means unlimited.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated_at = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` can be taken (0 when it can be taken now)."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        if not self.unlimited:
+            self._refill(now)
+            self.level -= amount
+
+
+class Ticket:
+    """A caller's place in the scheduler, from queueing until ``release``."""
+
+    def __init__(self, user_id: str, tokens: int) -> None:
+        self.user_id = user_id
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.admitted = False
+        self.released = False
+        # Set by the caller once the call's actual usage is known
+        self.used_tokens: Optional[int] = None
+        self._wake: Callable[[], None] = lambda: None
+
+
+class LLMScheduler:
+    """Global concurrency limit, RPM/TPM token buckets and a fair wait queue.
+
+    @param max_concurrency: Calls running at the same time; non-positive for no limit.
+    @param requests_per_minute: Request budget; non-positive for no limit.
+    @param tokens_per_minute: Token budget (prompt + completion); non-positive for no limit.
+    @param max_queue: Calls allowed to wait; more are rejected with ``SchedulerBusy``
+    (non-positive for no limit).
+    @param queue_timeout_seconds: Longest a call waits before ``SchedulerTimeout``.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_queue: int = 50,
+        queue_timeout_seconds: float = 120.0,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._requests = _TokenBucket(requests_per_minute)
+        self._tokens = _TokenBucket(tokens_per_minute)
+        # user -> waiting tickets; the first user is served next (round-robin)
+        self._queues: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()
+        self._waiting = 0
+        self._active = 0
+        self._timer: Optional[Timer] = None
+        self._lock = Lock()
+        self._stats = {"admitted": 0, "queued": 0, "rejected": 0, "timeouts": 0}
+        self._wait_seconds = 0.0
+
+    @contextmanager
+    def slot(
+        self,
+        user_id: str,
+        tokens: int,
+        on_queued: Optional[Callable[[int], None]] = None,
+    ) -> Iterator[Ticket]:
+        """``acquire`` and ``release`` around a block; see ``acquire``."""
+        ticket = self.acquire(user_id, tokens, on_queued)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def slot_async(
+        self,
+        user_id: str,
+        tokens: int,
+        on_queued: Optional[Callable[[int], object]] = None,
+    ) -> AsyncIterator[Ticket]:
+        """``acquire_async`` and ``release`` around a block; see ``acquire``."""
+        ticket = await self.acquire_async(user_id, tokens, on_queued)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def acquire(
+        self,
+        user_id: str,
+        tokens: int,
+        on_queued: Optional[Callable[[int], None]] = None,
+    ) -> Ticket:
+        """Wait for a slot (blocking).
+
+        @param user_id: Whose call this is; waiting calls are served round-robin per user.
+        @param tokens: Estimated tokens of the call (prompt + completion).
+        @param on_queued: Called once with the 1-based queue position if the
+        call has to wait.
+        @return: The admitted ticket; pass it to ``release`` when done.
+        @rtype: Ticket
+        @raises: SchedulerBusy when the queue is full; SchedulerTimeout after
+        ``queue_timeout_seconds``.
+        """
+        ticket = Ticket(user_id, tokens)
+        admitted = Event()
+        ticket._wake = admitted.set
+        position = self._enqueue(ticket)
+        if position:
+            if on_queued is not None:
+                try:
+                    on_queued(position)
+                except Exception as e:
+                    logging.warning(f"Error reporting queue position: {e}")
+            if not admitted.wait(self.queue_timeout_seconds):
+                self._abandon(ticket)
+        return ticket
+
+    async def acquire_async(
+        self,
+        user_id: str,
+        tokens: int,
+        on_queued: Optional[Callable[[int], object]] = None,
+    ) -> Ticket:
+        """Wait for a slot without blocking the event loop; see ``acquire``.
+
+        ``on_queued`` may be a coroutine function.
+        """
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+        ticket = Ticket(user_id, tokens)
+        ticket._wake = lambda: loop.call_soon_threadsafe(
+            lambda: admitted.done() or admitted.set_result(None)
+        )
+        position = self._enqueue(ticket)
+        if position:
+            try:
+                if on_queued is not None:
+                    try:
+                        result = on_queued(position)
+                        if asyncio.iscoroutine(result):
+                            await result
+                    except Exception as e:
+                        logging.warning(f"Error reporting queue position: {e}")
+                await asyncio.wait_for(admitted, self.queue_timeout_seconds)
+            except asyncio.TimeoutError:
+                self._abandon(ticket)
+            except BaseException:
+                # Cancelled while waiting: give the place (or the slot) back
+                self._abandon(ticket, raise_timeout=False)
+                self.release(ticket)
+                raise
+        return ticket
+
+    def charge(self, ticket: Ticket) -> None:
+        """Charge an admitted call again, e.g. for a retry attempt.
+
+        @param ticket: Ticket returned by ``acquire``.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._requests.take(1, now)
+            self._tokens.take(ticket.tokens, now)
+
+    def release(self, ticket: Ticket) -> None:
+        """Free an admitted call's slot, correcting its token estimate with
+        ``ticket.used_tokens`` when set.
+
+        @param ticket: Ticket returned by ``acquire``.
+        """
+        used_tokens = ticket.used_tokens
+        with self._lock:
+            if not ticket.admitted or ticket.released:
+                return
+            ticket.released = True
+            self._active -= 1
+            if used_tokens is not None:
+                self._tokens.take(used_tokens - ticket.tokens, time.monotonic())
+        self._dispatch()
+
+    def metrics(self) -> Dict[str, float]:
+        """Return the current load and counters since start.
+
+        @return: ``active``, ``waiting``, ``admitted``, ``queued``, ``rejected``,
+        ``timeouts`` and ``wait_seconds`` (total time spent queued).
+        @rtype: Dict[str, float]
+        """
+        with self._lock:
+            return {
+                "active": self._active,
+                "waiting": self._waiting,
+                **self._stats,
+                "wait_seconds": round(self._wait_seconds, 3),
+            }
+
+    def _enqueue(self, ticket: Ticket) -> int:
+        """Queue ``ticket`` and admit what can run; return its position (0 if admitted)."""
+        with self._lock:
+            if 0 < self.max_queue <= self._waiting:
+                self._stats["rejected"] += 1
+                raise SchedulerBusy(f"{self._waiting} LLM calls already waiting")
+            self._queues.setdefault(ticket.user_id, deque()).append(ticket)
+            self._waiting += 1
+        self._dispatch()
+        with self._lock:
+            if ticket.admitted:
+                return 0
+            self._stats["queued"] += 1
+            position = self._position(ticket)
+        logging.info(f"LLM call of {ticket.user_id} queued at position {position}")
+        return position
+
+    def _abandon(self, ticket: Ticket, raise_timeout: bool = True) -> None:
+        """Remove a waiting ticket; raise ``SchedulerTimeout`` unless it got admitted meanwhile."""
+        with self._lock:
+            if ticket.admitted:
+                return
+            queue = self._queues.get(ticket.user_id)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                self._waiting -= 1
+                if not queue:
+                    del self._queues[ticket.user_id]
+            if raise_timeout:
+                self._stats["timeouts"] += 1
+        if raise_timeout:
+            raise SchedulerTimeout(f"LLM call waited more than {self.queue_timeout_seconds}s")
+
+    def _position(self, ticket: Ticket) -> int:
+        """Estimated 1-based place of ``ticket`` in round-robin order (lock held)."""
+        index = self._queues[ticket.user_id].index(ticket)
+        ahead = index
+        for user_id, queue in self._queues.items():
+            if user_id != ticket.user_id:
+                ahead += min(len(queue), index + 1)
+        return ahead + 1
+
+    def _has_free_slot(self) -> bool:
+        return self.max_concurrency <= 0 or self._active < self.max_concurrency
+
+    def _dispatch(self) -> None:
+        """Admit waiting calls round-robin while slots and budget allow."""
+        woken = []
+        with self._lock:
+            while self._queues:
+                user_id, queue = next(iter(self._queues.items()))
+                ticket = queue[0]
+                if not self._has_free_slot():
+                    break
+                now = time.monotonic()
+                delay = max(
+                    self._requests.wait_time(1, now),
+                    self._tokens.wait_time(ticket.tokens, now),
+                )
+                if delay > 0:
+                    self._schedule_dispatch(delay)
+                    break
+                queue.popleft()
+                self._waiting -= 1
+                # Served: this user goes to the back of the round
+                del self._queues[user_id]
+                if queue:
+                    self._queues[user_id] = queue
+                self._requests.take(1, now)
+                self._tokens.take(ticket.tokens, now)
+                self._active += 1
+                ticket.admitted = True
+                self._stats["admitted"] += 1
+                self._wait_seconds += now - ticket.enqueued_at
+                woken.append(ticket)
+        for ticket in woken:
+            ticket._wake()
+
+    def _schedule_dispatch(self, delay: float) -> None:
+        """Retry dispatching once the buckets have refilled (lock held)."""
+        if self._timer is not None:
+            return
+        self._timer = Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        """Timer callback: clear the timer first so ``_dispatch`` can arm the next one."""
+        with self._lock:
+            self._timer = None
+        self._dispatch()
@@ -0,0 +1,195 @@
+"""Token counting and prompt-budget bookkeeping for conversation history.
+
+Token counts are computed once per message and stored on it under
+``"tokens"``, so enforcing the budget is a sum of ints instead of a
+re-tokenisation of the whole history every turn. ``strip_token_counts``
+removes them again before messages are sent to the model.
+
+Counting uses ``tiktoken`` (a dependency; imported on first count, and the
+image ships its encodings) and falls back to a character heuristic that errs
+on the high side for Dutch prose if it is missing or its encoding cannot be
+loaded.
+"""
+
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Tokens added per message by the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Characters per token for the fallback heuristic
+_CHARS_PER_TOKEN = 3.5
+
+
+@lru_cache(maxsize=16)
+def _encoding_for(model: str) -> Optional[Any]:
+    try:
+        import tiktoken
+    except ImportError:
+        logging.warning("tiktoken is not installed, estimating tokens")
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logging.warning(f"Could not load tokenizer for {model}, estimating tokens: {e}")
+        return None
+
+
+def load_tokenizers(models: List[str]) -> None:
+    """Import ``tiktoken`` and load the encodings of ``models`` before the first count.
+
+    @param models: Model names.
+    """
+    for model in models:
+        _encoding_for(model)
+
+
+@lru_cache(maxsize=64)
+def count_tokens(text: str, model: str) -> int:
+    """Return the number of tokens in ``text`` for ``model``.
+
+    Cached, so counting the same (interned) system prompt again is free.
+
+    @param text: Text to count.
+    @param model: Model name used to pick the tokenizer.
+    @return: Token count (estimated when ``tiktoken`` is unavailable).
+    @rtype: int
+    """
+    encoding = _encoding_for(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return int(len(text) / _CHARS_PER_TOKEN) + 1
+
+
+def counted_message(role: str, content: str, model: str) -> Dict[str, Any]:
+    """Build a chat message carrying its own token count.
+
+    @param role: ``user``, ``assistant`` or ``system``.
+    @param content: Message text.
+    @param model: Model name used to pick the tokenizer.
+    @return: Message dict with ``role``, ``content`` and ``tokens``.
+    @rtype: Dict[str, Any]
+    """
+    return {
+        "role": role,
+        "content": content,
+        "tokens": count_tokens(content, model) + MESSAGE_OVERHEAD_TOKENS,
+    }
+
+
+def message_tokens(message: Dict[str, Any], model: str) -> int:
+    """Return the stored token count of a message, counting it if missing.
+
+    @param message: Chat message, with or without ``tokens``.
+    @param model: Model name used to pick the tokenizer.
+    @return: Token count including per-message overhead.
+    @rtype: int
+    """
+    tokens = message.get("tokens")
+    if isinstance(tokens, int):
+        return tokens
+    return count_tokens(message.get("content") or "", model) + MESSAGE_OVERHEAD_TOKENS
+
+
+def strip_token_counts(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return the messages without bookkeeping fields, ready for the API.
+
+    @param messages: Chat messages that may carry ``tokens``.
+    @return: Messages with only ``role`` and ``content``.
+    @rtype: List[Dict[str, Any]]
+    """
+    return [{"role": m["role"], "content": m["content"]} for m in messages]
+
+
+def parse_budgets(raw: str) -> Dict[str, int]:
+    """Parse a JSON object of per-model prompt-token budgets.
+
+    @param raw: JSON like ``{"gpt-5-mini": 16000}``; empty for none.
+    @return: Budget per model name.
+    @rtype: Dict[str, int]
+    """
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+        return {str(k): int(v) for k, v in data.items()}
+    except (ValueError, TypeError, AttributeError) as e:
+        logging.exception(f"Error parsing prompt token budgets {raw!r}: {e}")
+        return {}
+
+
+def split_for_compaction(
+    turns: List[Dict[str, Any]],
+    fixed_tokens: int,
+    budget: int,
+    model: str,
+    keep_last: int = 2,
+    max_turns: int = 0,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split history into older turns to summarise and recent turns to keep.
+
+    Recent turns are kept newest-first while they fit in ``budget`` next to
+    ``fixed_tokens`` (system prompt and summary); at least ``keep_last`` turns
+    are always kept, even when they alone exceed the budget. The cut falls on
+    a user turn, so the kept turns never open with an answer whose question
+    was summarised: an assistant turn at the cut is summarised too, or kept
+    with its user turn when ``keep_last`` requires it.
+
+    @param turns: User/assistant messages, oldest first.
+    @param fixed_tokens: Tokens of the messages that are always sent.
+    @param budget: Prompt-token budget; non-positive disables the token check.
+    @param model: Model name used to pick the tokenizer.
+    @param keep_last: Minimum number of most recent turns kept verbatim.
+    @param max_turns: Maximum number of turns kept verbatim; 0 for no cap.
+    @return: ``(older, recent)``; ``older`` is empty when everything fits.
+    @rtype: Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]
+    """
+    total = fixed_tokens
+    keep = 0
+    for message in reversed(turns):
+        tokens = message_tokens(message, model)
+        over_budget = budget > 0 and total + tokens > budget
+        over_count = max_turns > 0 and keep >= max_turns
+        if keep >= keep_last and (over_budget or over_count):
+            break
+        total += tokens
+        keep += 1
+    split = len(turns) - keep
+    if split < len(turns) and turns[split]["role"] != "user":
+        forward = split
+        while forward < len(turns) and turns[forward]["role"] != "user":
+            forward += 1
+        if len(turns) - forward >= keep_last:
+            split = forward
+        else:
+            while split > 0 and turns[split]["role"] != "user":
+                split -= 1
+    return turns[:split], turns[split:]
+
+
+def summary_request(previous_summary: str, turns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Build the model request that folds older turns into a rolling summary.
+
+    @param previous_summary: Summary so far (may be empty).
+    @param turns: Turns to fold in, oldest first.
+    @return: Messages whose completion is the updated summary.
+    @rtype: List[Dict[str, Any]]
+    """
+    transcript = "\n\n".join(
+        f"{'Gebruiker' if m['role'] == 'user' else 'Assistent'}: {m['content']}" for m in turns
+    )
+    instructions = (
+        "Vat het onderstaande deel van een gesprek over het schrijven van content"
+        " samen in maximaal 150 woorden, in het Nederlands. Bewaar de wensen van de"
+        " gebruiker (doelgroep, doel, toon, lengte, verplichte punten), gemaakte"
+        " keuzes en feedback op eerdere versies. Laat volledige teksten weg."
+    )
+    if previous_summary:
+        transcript = f"Eerdere samenvatting:\n{previous_summary}\n\nVervolg:\n{transcript}"
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": transcript},
+    ]
@@ -0,0 +1,108 @@
+"""Recognise requests for several variants of a draft and picks of one of them.
+
+"geef 3 varianten" is answered with one model call asking for three
+completions (``n=3``) instead of one completion that writes three variants in
+a row. The variants are posted as numbered replies and stored with the
+assistant turn; a later "neem variant 2 en maak korter" keeps only variant 2
+of that turn in the history.
+
+Both are only recognised as commands: at the start of the message (or of a
+line or sentence in it), so "schrijf een post over onze 2 nieuwe versies"
+stays an ordinary request and "combineer variant 1 en 2" keeps all variants.
+"""
+
+import re
+from typing import Dict, List, Optional
+
+_NUMBER_WORDS: Dict[str, int] = {
+    "twee": 2,
+    "drie": 3,
+    "vier": 4,
+    "vijf": 5,
+    "two": 2,
+    "three": 3,
+    "four": 4,
+    "five": 5,
+}
+_COUNT = r"(\d+|" + "|".join(_NUMBER_WORDS) + r")"
+_NOUNS = r"(?:varianten|variaties|versies|opties|alternatieven|variants|versions|options)"
+# Start of the message, or of a line or sentence in it
+_LEAD = r"(?:^|[.!?]\s+)\s*"
+_REQUEST_VERBS = r"(?:geef|maak|schrijf|genereer|bedenk|give|write|make|generate|create)"
+# "geef 3 varianten", "maak er nog drie korte versies van", "give me 3 options with
+# different openers", or a message starting with "3 varianten" (followed by
+# nothing, punctuation or "met ...", not by "van onze nieuwe release")
+_REQUEST_RE = re.compile(
+    rf"{_LEAD}(?:{_REQUEST_VERBS}\s+(?:(?:me|mij|ons|us|er)\s+)?(?:nog\s+)?"
+    rf"{_COUNT}\s+(?:\w+\s+)?{_NOUNS}\b"
+    rf"|{_COUNT}\s+(?:\w+\s+)?{_NOUNS}(?=\s*(?:$|[,:;.!?]|(?:met|with|graag|please)\b)))",
+    re.IGNORECASE | re.MULTILINE,
+)
+# "variant 2", "versie nr. 3", "option #1"
+_REFERENCE = (
+    r"(?:variant|variatie|versie|optie|version|option)\s*(?:nr\.?\s*|nummer\s*|#\s*)?(\d+)\b"
+)
+_REFERENCE_RE = re.compile(_REFERENCE, re.IGNORECASE)
+_SELECTION_VERBS = r"(?:neem|kies|pak|gebruik|ga\s+voor|take|pick|choose|use|go\s+with)"
+# "neem variant 2 en maak korter", "variant 2 maar korter" or just "variant 2",
+# but not "neem variant 1 en 2" or "variant 2 is mooi"
+_SELECTION_RE = re.compile(
+    rf"{_LEAD}(?:{_SELECTION_VERBS}\s+(?:(?:de|het|the)\s+)?{_REFERENCE}"
+    rf"|{_REFERENCE}(?=\s*(?:$|[,:;.!?]|(?:maar|en|but|and)\b)))"
+    r"(?!\s*(?:en|and|of|or|[,&+/-])\s*\d)",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+# Sent after the user's message on a variant request, so each completion is one variant
+VARIANT_INSTRUCTION = (
+    "Schrijf precies één variant. De andere varianten worden los hiervan"
+    " gegenereerd; nummer de variant niet en noem geen andere varianten."
+)
+
+
+def _to_int(token: str) -> int:
+    return int(token) if token.isdigit() else _NUMBER_WORDS[token.lower()]
+
+
+def parse_variant_request(text: str, max_variants: int) -> int:
+    """Return how many variants the message asks for.
+
+    @param text: The user's message.
+    @param max_variants: Upper bound on the number returned.
+    @return: The number of variants (at least 2), or 1 for an ordinary request.
+    @rtype: int
+    """
+    match = _REQUEST_RE.search(text or "")
+    if not match:
+        return 1
+    count = _to_int(match.group(1) or match.group(2))
+    return min(count, max_variants) if count > 1 else 1
+
+
+def parse_variant_selection(text: str) -> Optional[int]:
+    """Return the variant number a follow-up picks ("neem variant 2").
+
+    Messages that mention more than one variant ("combineer variant 1 en 2")
+    pick none, so the history keeps all of them.
+
+    @param text: The user's message.
+    @return: 1-based variant number, or ``None``.
+    @rtype: Optional[int]
+    """
+    text = text or ""
+    if len(set(_REFERENCE_RE.findall(text))) > 1:
+        return None
+    match = _SELECTION_RE.search(text)
+    if not match:
+        return None
+    return int(match.group(1) or match.group(2))
+
+
+def format_variants(variants: List[str]) -> str:
+    """Join variants into one assistant turn, as the model sees them later.
+
+    @param variants: The variant texts in order.
+    @return: ``"Variant 1:\\n...\\n\\nVariant 2:\\n..."``
+    @rtype: str
+    """
+    return "\n\n".join(f"Variant {i}:\n{text}" for i, text in enumerate(variants, 1))
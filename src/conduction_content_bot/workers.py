@@ -0,0 +1,354 @@
+"""Sharded mode: one Socket Mode connection, conversations spread over worker processes.
+
+Selected with ``WORKER_PROCESSES`` > 0. One process is the bottleneck: page
+extraction and the JSON/HTTP work of every event share its GIL, so more
+handler threads do not help. In sharded mode the main process only holds the
+Socket Mode connection (slack_bolt acks each event right away) and hands
+every message to a worker process. Messages are sharded by conversation (the
+thread ts), so a thread is always handled by the same worker: its messages
+stay in order and the in-memory conversation state, coalescer and caches it
+needs are local to that process.
+
+Backpressure: each worker has a bounded queue and only takes the next event
+when one of its ``threads`` handler threads is free. When a worker's queue
+stays full for ``queue_timeout_seconds`` the message is turned away (the
+caller answers with the busy reply) instead of piling up in the main process.
+
+Crashes: a monitor thread restarts a worker that exits, waiting longer each
+time one keeps exiting soon after starting. Messages still queued for it are
+handed to the new process; those it was handling are passed to ``on_lost`` so
+the user can be told to try again. Each worker reports back over its own
+pipe, so a worker killed halfway through a report cannot garble another's. Unless conversations live
+in a shared store (``CONVERSATION_STORE_URL``), threads of a crashed worker
+start afresh.
+"""
+
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Semaphore, Thread
+from typing import Any, Callable, Dict, List, Optional, Set
+
+# Seconds between liveness checks of the workers (and of the parent, in a worker)
+_POLL_SECONDS = 1.0
+# A worker that exits within this many seconds of starting is restarted after a
+# delay that doubles each time, up to the maximum
+_HEALTHY_SECONDS = 60.0
+_MAX_RESTART_DELAY_SECONDS = 60.0
+
+
+def shard_for(key: str, shards: int) -> int:
+    """Return the shard of ``key``; stable across processes and restarts.
+
+    @param key: Conversation id (thread ts).
+    @param shards: Number of workers.
+    @return: Index in ``range(shards)``.
+    @rtype: int
+    """
+    return zlib.crc32(key.encode("utf-8")) % shards
+
+
+def event_id(event: Dict[str, Any]) -> str:
+    """Identify a Slack message event by channel and ts.
+
+    @rtype: str
+    """
+    return f"{event.get('channel')}:{event.get('ts')}"
+
+
+def serve_worker(
+    index: int,
+    events: Any,
+    done: Any,
+    threads: int,
+    handle: Callable[[Dict[str, Any]], None],
+) -> None:
+    """Worker process loop: handle events from ``events`` on ``threads`` threads.
+
+    Sends ``("ready", None)`` once started and ``("done", event_id)`` after
+    each event on ``done``. Returns on a ``None`` event or when the main
+    process is gone.
+
+    @param index: This worker's shard.
+    @param events: Queue of events for this shard.
+    @param done: Sending end of this worker's pipe to the main process.
+    @param threads: Events handled at once.
+    @param handle: Handles one event (exceptions are logged).
+    """
+    parent = os.getppid()
+    free = Semaphore(threads)
+    sending = Lock()
+
+    def report(kind: str, payload: Optional[str]) -> None:
+        with sending:
+            done.send((kind, payload))
+
+    def run(event: Dict[str, Any]) -> None:
+        try:
+            handle(event)
+        except Exception as e:
+            logging.exception(f"Error handling event in worker {index}: {e}")
+        finally:
+            free.release()
+            report("done", event_id(event))
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"worker{index}") as pool:
+        report("ready", None)
+        while True:
+            # Only take an event when a thread is free, so the backlog stays in the bounded queue
+            free.acquire()
+            event = _next_event(events, parent)
+            if event is None:
+                return
+            pool.submit(run, event)
+
+
+def _next_event(events: Any, parent: int) -> Optional[Dict[str, Any]]:
+    while True:
+        try:
+            return events.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            if os.getppid() != parent:
+                logging.warning("Main process is gone; stopping worker")
+                return None
+
+
+class _Worker:
+    def __init__(self, index: int, process: Any, events: Any, results: Any) -> None:
+        self.index = index
+        self.process = process
+        self.events = events
+        self.results = results
+        self.started = time.monotonic()
+        # Set by the collector once everything the process sent has been read
+        self.drained = Event()
+        # Ids of the queued events a restart moved to the replacing worker
+        self.moved: Set[str] = set()
+
+
+class WorkerPool:
+    """Worker processes, each fed from its own bounded queue.
+
+    @param processes: Number of workers (shards).
+    @param target: Worker entry point, ``target(index, events, done)``; must be
+    importable (workers are spawned) and call ``serve_worker``.
+    @param queue_size: Events queued per worker.
+    @param queue_timeout_seconds: How long ``submit`` waits for room in a full queue.
+    @param on_lost: Called (in the main process) with each event a crashed
+    worker was handling.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        target: Callable[[int, Any, Any], None],
+        queue_size: int = 100,
+        queue_timeout_seconds: float = 5.0,
+        on_lost: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> None:
+        self.processes = processes
+        self.target = target
+        self.queue_size = queue_size
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.on_lost = on_lost
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers: List[_Worker] = []
+        # Events handed to each shard and not reported done yet, by event_id
+        self._pending: List[Dict[str, Dict[str, Any]]] = [{} for _ in range(processes)]
+        # Ids of the events ``submit`` is still putting on a queue; a restart leaves them to it
+        self._submitting: Set[str] = set()
+        self._lock = Lock()
+        self._ready: set = set()
+        self._all_ready = Event()
+        self._stopping = Event()
+        self._stats = {"dispatched": 0, "rejected": 0, "lost": 0, "restarts": 0}
+        self._restart_delay = [0.0] * processes
+        self._restart_at: List[Optional[float]] = [None] * processes
+
+    def start(self) -> None:
+        """Spawn the workers and the threads that follow them."""
+        self._workers = [self._spawn(index) for index in range(self.processes)]
+        Thread(target=self._collect, name="worker-results", daemon=True).start()
+        Thread(target=self._monitor, name="worker-monitor", daemon=True).start()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every worker has started once.
+
+        @param timeout: Seconds to wait; ``None`` waits indefinitely.
+        @return: Whether all workers are ready.
+        @rtype: bool
+        """
+        return self._all_ready.wait(timeout)
+
+    def submit(self, key: str, event: Dict[str, Any]) -> bool:
+        """Queue ``event`` for the worker of ``key``.
+
+        @param key: Conversation id; all events of a conversation go to one worker.
+        @param event: Slack event payload (must be picklable).
+        @return: ``False`` if the worker's queue stayed full for ``queue_timeout_seconds``.
+        @rtype: bool
+        """
+        index = shard_for(key, self.processes)
+        pending_key = event_id(event)
+        deadline = time.monotonic() + self.queue_timeout_seconds
+        with self._lock:
+            self._pending[index][pending_key] = event
+            self._submitting.add(pending_key)
+        try:
+            while True:
+                with self._lock:
+                    worker = self._workers[index]
+                try:
+                    worker.events.put(event, timeout=max(deadline - time.monotonic(), 0))
+                except queue.Full:
+                    with self._lock:
+                        self._pending[index].pop(pending_key, None)
+                        self._stats["rejected"] += 1
+                    return False
+                with self._lock:
+                    if self._workers[index] is worker or pending_key in worker.moved:
+                        self._stats["dispatched"] += 1
+                        return True
+                # A restart drained the queue before the event reached it; use the new worker
+        finally:
+            with self._lock:
+                self._submitting.discard(pending_key)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Ask the workers to finish their current events and wait for them to exit.
+
+        @param timeout: Seconds to wait per worker before terminating it.
+        """
+        self._stopping.set()
+        for worker in self._workers:
+            try:
+                worker.events.put_nowait(None)
+            except queue.Full:
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return event counters, restarts and per-worker queue depth and pending events.
+
+        @return: ``dispatched``, ``rejected``, ``lost``, ``restarts``, and
+        ``queued`` / ``pending`` lists indexed by worker (queue depth is -1
+        where the platform cannot report it).
+        @rtype: Dict[str, Any]
+        """
+        with self._lock:
+            workers = list(self._workers)
+            pending = [len(events) for events in self._pending]
+            stats = dict(self._stats)
+        return {**stats, "queued": [_qsize(w.events) for w in workers], "pending": pending}
+
+    def _spawn(self, index: int) -> _Worker:
+        events = self._ctx.Queue(maxsize=self.queue_size)
+        results, sender = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=self.target, args=(index, events, sender), name=f"content-bot-worker-{index}"
+        )
+        process.start()
+        # Only the worker writes; closing our copy lets the pipe report EOF when it exits
+        sender.close()
+        return _Worker(index, process, events, results)
+
+    def _collect(self) -> None:
+        while not self._stopping.is_set():
+            with self._lock:
+                # By worker object, not index: a restart may replace the worker meanwhile
+                open_pipes = {w.results: w for w in self._workers if not w.drained.is_set()}
+            for results in multiprocessing.connection.wait(list(open_pipes), _POLL_SECONDS):
+                worker = open_pipes[results]
+                index = worker.index
+                try:
+                    kind, payload = results.recv()
+                except (EOFError, OSError):
+                    # The worker exited; the monitor restarts it
+                    results.close()
+                    worker.drained.set()
+                    continue
+                if kind == "done":
+                    with self._lock:
+                        self._pending[index].pop(payload, None)
+                elif kind == "ready":
+                    self._ready.add(index)
+                    if len(self._ready) == self.processes:
+                        self._all_ready.set()
+
+    def _monitor(self) -> None:
+        while not self._stopping.wait(_POLL_SECONDS):
+            for index in range(self.processes):
+                worker = self._workers[index]
+                if worker.process.is_alive() or self._stopping.is_set():
+                    continue
+                now = time.monotonic()
+                if self._restart_at[index] is None:
+                    lived = now - worker.started
+                    logging.error(
+                        f"Worker {index} exited with code {worker.process.exitcode}"
+                        f" after {lived:.0f}s; restarting it"
+                    )
+                    if lived < _HEALTHY_SECONDS:
+                        delay = self._restart_delay[index] * 2 or _POLL_SECONDS
+                        self._restart_delay[index] = min(delay, _MAX_RESTART_DELAY_SECONDS)
+                    else:
+                        self._restart_delay[index] = 0.0
+                    self._restart_at[index] = now + self._restart_delay[index]
+                if now >= self._restart_at[index]:
+                    self._restart_at[index] = None
+                    self._restart(index)
+
+    def _restart(self, index: int) -> None:
+        old = self._workers[index]
+        # Count what the worker finished before it exited as done, not lost
+        old.drained.wait(_POLL_SECONDS * 5)
+        worker = self._spawn(index)
+        with self._lock:
+            # The old queue may be unusable if the worker died reading it; move what is left
+            queued: List[Dict[str, Any]] = []
+            while True:
+                try:
+                    event = old.events.get(timeout=0.1)
+                except (queue.Empty, OSError, EOFError):
+                    break
+                if event is not None:
+                    queued.append(event)
+            old.events.cancel_join_thread()
+            for event in queued:
+                worker.events.put(event)
+            old.moved = {event_id(event) for event in queued}
+            self._workers[index] = worker
+            lost = [
+                e
+                for key, e in self._pending[index].items()
+                if key not in old.moved and key not in self._submitting
+            ]
+            for event in lost:
+                del self._pending[index][event_id(event)]
+            self._stats["restarts"] += 1
+            self._stats["lost"] += len(lost)
+        if lost:
+            logging.warning(f"Worker {index} was handling {len(lost)} messages; they were lost")
+        for event in lost:
+            if self.on_lost is None:
+                continue
+            try:
+                self.on_lost(event)
+            except Exception as e:
+                logging.exception(f"Error reporting a lost message: {e}")
+
+
+def _qsize(events: Any) -> int:
+    try:
+        return events.qsize()
+    except NotImplementedError:
+        # macOS has no sem_getvalue
+        return -1
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from threading import Thread
+
+from conduction_content_bot.coalescer import MessageCoalescer
+
+
+def test_latest_message_takes_over_the_thread():
+    coalescer = MessageCoalescer(window_seconds=0)
+    first = coalescer.add("t1", "korter")
+    second = coalescer.add("t1", "en voeg een CTA toe")
+    other = coalescer.add("t2", "iets anders")
+    assert first < second < other
+    assert not coalescer.is_current("t1", first)
+    assert coalescer.is_current("t1", second)
+    assert coalescer.is_current("t2", other)
+    assert coalescer.texts("t1") == ["korter", "en voeg een CTA toe"]
+
+
+def test_wait_lets_only_the_latest_handler_generate():
+    coalescer = MessageCoalescer(window_seconds=0.05)
+    first = coalescer.add("t1", "korter")
+    second = coalescer.add("t1", "formeler")
+    started = time.monotonic()
+    assert not coalescer.wait("t1", first)
+    assert coalescer.wait("t1", second)
+    assert time.monotonic() - started >= 0.04
+
+
+def test_wait_returns_as_soon_as_a_newer_message_arrives():
+    coalescer = MessageCoalescer(window_seconds=5)
+    seq = coalescer.add("t1", "korter")
+    Thread(target=lambda: (time.sleep(0.05), coalescer.add("t1", "formeler"))).start()
+    started = time.monotonic()
+    assert not coalescer.wait("t1", seq)
+    assert time.monotonic() - started < 2
+
+
+def test_wait_async():
+    coalescer = MessageCoalescer(window_seconds=0.05)
+    first = coalescer.add("t1", "korter")
+    second = coalescer.add("t1", "formeler")
+
+    async def run():
+        return await asyncio.gather(
+            coalescer.wait_async("t1", first), coalescer.wait_async("t1", second)
+        )
+
+    assert asyncio.run(run()) == [False, True]
+
+
+def test_commit_clears_the_answered_messages():
+    coalescer = MessageCoalescer(window_seconds=0)
+    coalescer.add("t1", "korter")
+    seq = coalescer.add("t1", "formeler")
+    assert coalescer.commit("t1", seq, 2)
+    assert coalescer.texts("t1") == []
+    assert coalescer.metrics() == {"messages": 2, "coalesced": 1, "superseded": 0, "pending": 0}
+
+
+def test_superseded_draft_is_not_committed_and_keeps_the_messages():
+    coalescer = MessageCoalescer(window_seconds=0)
+    first = coalescer.add("t1", "korter")
+    # Arrives while the draft for the first message is being generated
+    second = coalescer.add("t1", "formeler")
+    assert not coalescer.commit("t1", first, 1)
+    coalescer.record_superseded()
+    assert coalescer.texts("t1") == ["korter", "formeler"]
+    assert coalescer.commit("t1", second, 2)
+    assert coalescer.metrics()["superseded"] == 1
+
+
+def test_commit_clears_only_the_messages_the_draft_answered():
+    coalescer = MessageCoalescer(window_seconds=0)
+    seq = coalescer.add("t1", "korter")
+    assert coalescer.commit("t1", seq, 1)
+    assert not coalescer.is_current("t1", seq)
+    coalescer.add("t1", "formeler")
+    latest = coalescer.add("t1", "met CTA")
+    assert coalescer.commit("t1", latest, 1)
+    assert coalescer.texts("t1") == ["met CTA"]
+    assert coalescer.metrics()["pending"] == 1
+
+
+def test_discard_only_clears_for_the_latest_message():
+    coalescer = MessageCoalescer(window_seconds=0)
+    first = coalescer.add("t1", "korter")
+    coalescer.add("t1", "formeler")
+    coalescer.discard("t1", first)
+    assert coalescer.texts("t1") == ["korter", "formeler"]
+    coalescer.discard("t1")
+    assert coalescer.texts("t1") == []
+    assert not coalescer.is_current("t1", first)
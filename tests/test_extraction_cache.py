@@ -0,0 +1,34 @@
+import os
+
+from conduction_content_bot.extraction_cache import ExtractionCache
+
+
+def _put(cache, key, mtime):
+    cache.put(key, f"<p>{key}</p>")
+    os.utime(os.path.join(cache.directory, "extracted", f"{key}.html"), (mtime, mtime))
+
+
+def test_prunes_the_oldest_entries(tmp_path):
+    cache = ExtractionCache(str(tmp_path), max_files=2)
+    for number, key in enumerate(["a", "b", "c"]):
+        _put(cache, key, 1000 + number)
+    cache.put("d", "<p>d</p>")
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.get("c") == "<p>c</p>"
+    assert cache.get("d") == "<p>d</p>"
+
+
+def test_keeps_entries_a_page_record_points_to(tmp_path):
+    cache = ExtractionCache(str(tmp_path), max_files=2)
+    _put(cache, "a", 1000)
+    cache.save_page("HOME", "a", "1", etag='"v1"')
+    _put(cache, "b", 1001)
+    _put(cache, "c", 1002)
+    cache.put("d", "<p>d</p>")
+    record = cache.load_page("HOME")
+    assert record is not None
+    assert record["content"] == "<p>a</p>"
+    assert cache.get("b") is None
+    assert cache.get("c") is None
+    assert cache.get("d") == "<p>d</p>"
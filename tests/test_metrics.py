@@ -0,0 +1,88 @@
+import pytest
+
+from conduction_content_bot.metrics import Registry, start_http_server
+
+
+def test_renders_counters_gauges_and_callbacks():
+    registry = Registry()
+    lookups = registry.counter("lookups_total", "Cache lookups", ["cache", "result"])
+    in_flight = registry.gauge("in_flight", "Calls in flight")
+    registry.callback("conversations", "Live conversations", lambda: 3)
+    lookups.inc(cache="page", result="hit")
+    lookups.inc(2, cache="page", result="miss")
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+    assert registry.render() == (
+        "# HELP lookups_total Cache lookups\n"
+        "# TYPE lookups_total counter\n"
+        'lookups_total{cache="page",result="hit"} 1\n'
+        'lookups_total{cache="page",result="miss"} 2\n'
+        "# HELP in_flight Calls in flight\n"
+        "# TYPE in_flight gauge\n"
+        "in_flight 1\n"
+        "# HELP conversations Live conversations\n"
+        "# TYPE conversations gauge\n"
+        "conversations 3\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    stage = registry.histogram("stage_seconds", "Stage time", ["stage"], buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.5, 5.0):
+        stage.observe(seconds, stage="handler")
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'stage_seconds_bucket{stage="handler",le="0.1"} 1',
+        'stage_seconds_bucket{stage="handler",le="1"} 3',
+        'stage_seconds_bucket{stage="handler",le="+Inf"} 4',
+        'stage_seconds_sum{stage="handler"} 6.05',
+        'stage_seconds_count{stage="handler"} 4',
+    ]
+    assert stage.totals(stage="handler") == (4, pytest.approx(6.05))
+    assert stage.quantile(0.5, stage="handler") == pytest.approx(0.55)
+    assert stage.quantile(0.5, stage="lock_wait") is None
+
+
+def test_escapes_label_values_and_checks_label_names():
+    registry = Registry()
+    errors = registry.counter("errors_total", "Errors", ["reason"])
+    errors.inc(reason='said "no"\n')
+    assert 'errors_total{reason="said \\"no\\"\\n"} 1' in registry.render()
+    with pytest.raises(ValueError):
+        errors.inc(kind="timeout")
+    with pytest.raises(ValueError):
+        registry.counter("errors_total", "Errors again")
+
+
+def test_failing_callback_is_left_out():
+    registry = Registry()
+    registry.callback("broken", "Raises", lambda: 1 / 0)
+    assert registry.render() == "# HELP broken Raises\n# TYPE broken gauge\n"
+
+
+def test_merges_remote_metrics_labelled_by_process():
+    main = Registry()
+    worker = Registry()
+    main.counter("events_total", "Events", ["result"]).inc(result="done")
+    worker.counter("events_total", "Events", ["result"]).inc(4, result="done")
+    worker.gauge("queued", "Queued events").set(2)
+    server = start_http_server(0, worker, "127.0.0.1")
+    try:
+        main.add_remote(f"http://127.0.0.1:{server.server_port}/metrics", "worker", "0")
+        # Nothing listens here: skipped, like a restarting worker
+        main.add_remote("http://127.0.0.1:9/metrics", "worker", "1")
+        text = main.render()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert text == (
+        "# HELP events_total Events\n"
+        "# TYPE events_total counter\n"
+        'events_total{result="done"} 1\n'
+        'events_total{worker="0",result="done"} 4\n'
+        "# HELP queued Queued events\n"
+        "# TYPE queued gauge\n"
+        'queued{worker="0"} 2\n'
+    )
@@ -0,0 +1,204 @@
+import time
+from email.utils import formatdate
+
+import httpx
+import pytest
+from openai import APIConnectionError, BadRequestError, InternalServerError, RateLimitError
+
+from conduction_content_bot.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryBudget,
+    RetryPolicy,
+    parse_duration,
+    server_delay,
+)
+
+_REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def _status_error(cls, status, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=_REQUEST)
+    return cls("error", response=response, body=None)
+
+
+@pytest.mark.parametrize(
+    "value, seconds",
+    [
+        ("1s", 1.0),
+        ("6m0s", 360.0),
+        ("20ms", 0.02),
+        ("1m30.5s", 90.5),
+        ("2h", 7200.0),
+        ("1.5", 1.5),
+        (" 3s ", 3.0),
+    ],
+)
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize("value", ["", "soon", "5x", "1s and more"])
+def test_parse_duration_rejects_other_formats(value):
+    assert parse_duration(value) is None
+
+
+def test_server_delay_without_hints():
+    assert server_delay(None) is None
+    assert server_delay(httpx.Headers({})) is None
+    assert server_delay(httpx.Headers({"retry-after": "whenever"})) is None
+
+
+def test_server_delay_prefers_retry_after_ms():
+    headers = httpx.Headers({"Retry-After-Ms": "250", "Retry-After": "7"})
+    assert server_delay(headers) == pytest.approx(0.25)
+
+
+def test_server_delay_retry_after_seconds_and_date():
+    assert server_delay(httpx.Headers({"Retry-After": "7"})) == 7.0
+    date = formatdate(time.time() + 30, usegmt=True)
+    assert 25 < server_delay(httpx.Headers({"Retry-After": date})) <= 30
+    past = formatdate(time.time() - 30, usegmt=True)
+    assert server_delay(httpx.Headers({"Retry-After": past})) == 0.0
+
+
+def test_server_delay_uses_the_exhausted_limit():
+    headers = httpx.Headers(
+        {
+            "x-ratelimit-reset-requests": "2s",
+            "x-ratelimit-reset-tokens": "1m0s",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-remaining-tokens": "1200",
+        }
+    )
+    assert server_delay(headers) == 2.0
+
+
+def test_server_delay_uses_the_soonest_reset_when_none_is_exhausted():
+    headers = httpx.Headers(
+        {"x-ratelimit-reset-requests": "2s", "x-ratelimit-reset-tokens": "500ms"}
+    )
+    assert server_delay(headers) == 0.5
+
+
+def test_circuit_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, recovery_seconds=60)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.check()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.available()
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.check()
+    assert 0 < excinfo.value.retry_in <= 60
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.available()
+    breaker.check()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.available()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.check()
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_disabled_circuit_never_opens():
+    breaker = CircuitBreaker(failure_threshold=0)
+    for _ in range(10):
+        breaker.record_failure()
+    breaker.check()
+    assert breaker.available()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retry_budget_allows_the_reserve_then_a_ratio_of_requests():
+    budget = RetryBudget(ratio=0.5, min_retries=2)
+    assert budget.try_retry()
+    assert budget.try_retry()
+    assert not budget.try_retry()
+    assert budget.rejected == 1
+    for _ in range(6):
+        budget.record_request()
+    assert budget.try_retry()
+    assert not budget.try_retry()
+    assert budget.rejected == 2
+
+
+def test_rate_limit_waits_as_told_and_keeps_the_circuit_closed():
+    policy = RetryPolicy(failure_threshold=1)
+    err = _status_error(RateLimitError, 429, {"retry-after-ms": "250"})
+    assert policy.retry_delay(err, 0, "primary") == pytest.approx(0.25)
+    assert policy.breaker("primary").state == CircuitBreaker.CLOSED
+
+
+def test_server_error_backs_off_exponentially():
+    policy = RetryPolicy(backoff_base_seconds=1.0, backoff_max_seconds=3.0)
+    err = _status_error(InternalServerError, 500)
+    assert 1.0 <= policy.retry_delay(err, 0) <= 1.5
+    assert 2.0 <= policy.retry_delay(err, 1) <= 2.5
+    assert policy.retry_delay(err, 2) == 3.0
+
+
+def test_gives_up_on_errors_that_are_not_retryable_or_after_the_last_attempt():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.retry_delay(_status_error(BadRequestError, 400), 0) is None
+    assert policy.retry_delay(ValueError("bug"), 0) is None
+    assert policy.retry_delay(APIConnectionError(request=_REQUEST), 2) is None
+
+
+def test_gives_up_when_the_server_asks_for_too_long_a_wait():
+    policy = RetryPolicy(retry_after_max_seconds=10)
+    err = _status_error(RateLimitError, 429, {"retry-after": "30"})
+    assert policy.retry_delay(err, 0) is None
+
+
+def test_gives_up_when_the_retry_budget_is_spent():
+    policy = RetryPolicy(budget=RetryBudget(ratio=0, min_retries=1))
+    err = _status_error(InternalServerError, 500, {"retry-after": "0"})
+    assert policy.retry_delay(err, 0) == 0.0
+    assert policy.retry_delay(err, 0) is None
+    assert policy.metrics()["retries_refused"] == 1
+
+
+def test_provider_failures_open_only_that_endpoints_circuit():
+    policy = RetryPolicy(failure_threshold=2)
+    err = APIConnectionError(request=_REQUEST)
+    policy.before_attempt(0, "primary")
+    policy.retry_delay(err, 0, "primary")
+    policy.retry_delay(err, 1, "primary")
+    with pytest.raises(CircuitOpenError):
+        policy.before_attempt(2, "primary")
+    policy.before_attempt(0, "fallback")
+    assert not policy.available("primary")
+    assert policy.available("fallback")
+    assert policy.metrics()["circuits"] == {
+        "primary": CircuitBreaker.OPEN,
+        "fallback": CircuitBreaker.CLOSED,
+    }
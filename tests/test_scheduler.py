@@ -0,0 +1,149 @@
+import asyncio
+import time
+from threading import Thread
+
+import pytest
+
+from conduction_content_bot.scheduler import LLMScheduler, SchedulerBusy, SchedulerTimeout
+
+
+def test_admits_up_to_the_concurrency_limit_then_queues():
+    scheduler = LLMScheduler(max_concurrency=2)
+    first = scheduler.acquire("a", 100)
+    second = scheduler.acquire("b", 100)
+    assert first.admitted and second.admitted
+    positions = []
+    admitted = []
+    waiter = Thread(target=lambda: admitted.append(scheduler.acquire("c", 100, positions.append)))
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while not positions and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert positions == [1]
+    assert scheduler.metrics()["waiting"] == 1
+    scheduler.release(first)
+    waiter.join(5)
+    assert admitted and admitted[0].admitted
+    assert scheduler.metrics()["active"] == 2
+    assert scheduler.metrics()["queued"] == 1
+
+
+def test_release_is_idempotent():
+    scheduler = LLMScheduler(max_concurrency=1)
+    ticket = scheduler.acquire("a", 100)
+    scheduler.release(ticket)
+    scheduler.release(ticket)
+    assert scheduler.metrics()["active"] == 0
+
+
+def test_waiting_calls_are_served_round_robin_per_user():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=1)
+        held = scheduler.acquire("x", 1)
+        order = []
+
+        async def call(user_id, number):
+            ticket = await scheduler.acquire_async(user_id, 1)
+            order.append(f"{user_id}{number}")
+            scheduler.release(ticket)
+
+        tasks = [asyncio.create_task(call("a", n)) for n in range(3)]
+        tasks.append(asyncio.create_task(call("b", 0)))
+        await asyncio.sleep(0.05)
+        assert scheduler.metrics()["waiting"] == 4
+        scheduler.release(held)
+        await asyncio.wait_for(asyncio.gather(*tasks), 5)
+        return order
+
+    assert asyncio.run(run()) == ["a0", "b0", "a1", "a2"]
+
+
+def test_rejects_calls_beyond_the_queue_limit():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=1, queue_timeout_seconds=5)
+    held = scheduler.acquire("a", 1)
+    waiter = Thread(target=scheduler.acquire, args=("b", 1))
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while scheduler.metrics()["waiting"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(SchedulerBusy):
+        scheduler.acquire("c", 1)
+    assert scheduler.metrics()["rejected"] == 1
+    scheduler.release(held)
+    waiter.join(5)
+
+
+def test_gives_up_after_the_queue_timeout():
+    scheduler = LLMScheduler(max_concurrency=1, queue_timeout_seconds=0.05)
+    scheduler.acquire("a", 1)
+    with pytest.raises(SchedulerTimeout) as excinfo:
+        scheduler.acquire("b", 1)
+    # Answered like a full queue, and still a TimeoutError for other callers
+    assert isinstance(excinfo.value, SchedulerBusy)
+    assert isinstance(excinfo.value, TimeoutError)
+    metrics = scheduler.metrics()
+    assert metrics["timeouts"] == 1
+    assert metrics["waiting"] == 0
+
+
+def test_cancelled_waiter_gives_its_place_back():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=1)
+        held = scheduler.acquire("a", 1)
+        task = asyncio.create_task(scheduler.acquire_async("b", 1))
+        await asyncio.sleep(0.05)
+        assert scheduler.metrics()["waiting"] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert scheduler.metrics()["waiting"] == 0
+        scheduler.release(held)
+        return scheduler.metrics()["active"]
+
+    assert asyncio.run(run()) == 0
+
+
+def test_waits_for_the_token_budget_to_refill():
+    # 1000 tokens per second
+    scheduler = LLMScheduler(max_concurrency=0, tokens_per_minute=60000)
+    scheduler.release(scheduler.acquire("a", 60000))
+    started = time.monotonic()
+    scheduler.acquire("a", 100)
+    assert 0.05 <= time.monotonic() - started < 2
+
+
+def test_release_refunds_an_overestimate():
+    scheduler = LLMScheduler(max_concurrency=0, tokens_per_minute=60000)
+    ticket = scheduler.acquire("a", 60000)
+    ticket.used_tokens = 0
+    scheduler.release(ticket)
+    scheduler.acquire("a", 1000)
+    assert scheduler.metrics()["queued"] == 0
+
+
+def test_timer_rearms_itself_when_the_budget_is_still_short():
+    # 10 tokens per second
+    scheduler = LLMScheduler(max_concurrency=0, tokens_per_minute=600, queue_timeout_seconds=8)
+    first = scheduler.acquire("a", 600)
+    admitted = []
+    errors = []
+
+    def wait():
+        try:
+            admitted.append(scheduler.acquire("b", 10))
+        except Exception as e:
+            errors.append(e)
+
+    waiter = Thread(target=wait)
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while scheduler.metrics()["waiting"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # The call used more than estimated: the bucket goes into debt after the timer was armed
+    first.used_tokens = 620
+    scheduler.release(first)
+    started = time.monotonic()
+    waiter.join(8)
+    assert not errors
+    assert admitted and admitted[0].admitted
+    assert time.monotonic() - started < 6
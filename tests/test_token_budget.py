@@ -0,0 +1,42 @@
+from conduction_content_bot.token_budget import split_for_compaction
+
+
+def _turns(count):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"bericht {i}", "tokens": 10}
+        for i in range(count)
+    ]
+
+
+def test_keeps_everything_that_fits():
+    turns = _turns(4)
+    assert split_for_compaction(turns, 0, 1000, "gpt-5-mini") == ([], turns)
+
+
+def test_keeps_the_newest_turns_within_the_budget():
+    turns = _turns(6)
+    older, recent = split_for_compaction(turns, 0, 45, "gpt-5-mini", keep_last=0)
+    assert older == turns[:2]
+    assert recent == turns[2:]
+
+
+def test_keep_last_holds_the_question_of_the_last_answer():
+    turns = _turns(4)
+    older, recent = split_for_compaction(turns, 0, 1, "gpt-5-mini", keep_last=1)
+    assert older == turns[:2]
+    assert recent == turns[2:]
+    assert recent[0]["role"] == "user"
+
+
+def test_summarises_an_answer_whose_question_does_not_fit():
+    turns = _turns(6)
+    older, recent = split_for_compaction(turns, 0, 35, "gpt-5-mini", keep_last=1)
+    assert older == turns[:4]
+    assert recent == turns[4:]
+
+
+def test_max_turns_cuts_on_a_user_turn():
+    turns = _turns(6)
+    older, recent = split_for_compaction(turns, 0, 0, "gpt-5-mini", keep_last=1, max_turns=3)
+    assert older == turns[:4]
+    assert recent[0]["role"] == "user"
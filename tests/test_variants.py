@@ -0,0 +1,79 @@
+import pytest
+
+from conduction_content_bot.variants import (
+    format_variants,
+    parse_variant_request,
+    parse_variant_selection,
+)
+
+
+@pytest.mark.parametrize(
+    "text, count",
+    [
+        ("geef 3 varianten", 3),
+        ("Maak drie korte versies", 3),
+        ("maak er nog 2 varianten van", 2),
+        ("Give me 3 options with different openers", 3),
+        ("3 varianten", 3),
+        ("3 varianten met een andere opening", 3),
+        ("Twee versies graag", 2),
+        ("Schrijf een post over de release. Geef 4 varianten.", 4),
+        ("over de nieuwe release\nschrijf 2 alternatieven", 2),
+        ("geef 9 varianten", 5),
+    ],
+)
+def test_variant_requests(text, count):
+    assert parse_variant_request(text, max_variants=5) == count
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "schrijf een post over onze 2 nieuwe versies van OpenCatalogi",
+        "2 nieuwe versies van OpenCatalogi zijn uit",
+        "we ondersteunen nu 3 opties voor hosting",
+        "maak het korter, er zijn drie versies van de app",
+        "geef 1 variant",
+        "",
+    ],
+)
+def test_ordinary_requests(text):
+    assert parse_variant_request(text, max_variants=5) == 1
+
+
+@pytest.mark.parametrize(
+    "text, number",
+    [
+        ("variant 2", 2),
+        ("Versie 3.", 3),
+        ("neem variant 2 en maak korter", 2),
+        ("Kies optie nr. 1", 1),
+        ("ga voor de variant #3", 3),
+        ("Mooi! Neem versie 2, maar formeler", 2),
+        ("take option 2", 2),
+        ("variant 2 maar korter", 2),
+    ],
+)
+def test_variant_selections(text, number):
+    assert parse_variant_selection(text) == number
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "combineer variant 1 en 2",
+        "neem variant 1 en 2",
+        "neem variant 1, 3",
+        "variant 1 en 2 samen",
+        "variant 2 is mooi maar variant 3 heeft een betere opening",
+        "vergelijk versie 2 met het origineel",
+        "schrijf over versie 2 van OpenCatalogi",
+        "",
+    ],
+)
+def test_messages_that_pick_no_variant(text):
+    assert parse_variant_selection(text) is None
+
+
+def test_format_variants():
+    assert format_variants(["a", "b"]) == "Variant 1:\na\n\nVariant 2:\nb"